@@ -0,0 +1,236 @@
+import array
+import json
+import math
+import os
+import sys
+import time
+import wave
+from collections import deque
+from typing import Iterable, Iterator, Optional
+import speech_recognition as sr
+import config
+
+FRAME_SECONDS = 0.03  # 30 ms frames
+
+
+def frame_rms(frame: bytes, sample_width: int) -> float:
+    """Root-mean-square amplitude of a PCM frame (same scale as audioop.rms)."""
+    if sample_width == 2:
+        samples = array.array("h")
+        samples.frombytes(frame[:len(frame) - len(frame) % 2])
+        if sys.byteorder == "big":
+            samples.byteswap()
+    elif sample_width == 1:
+        samples = [b - 128 for b in frame]
+    elif sample_width == 4:
+        samples = array.array("i")
+        samples.frombytes(frame[:len(frame) - len(frame) % 4])
+        if sys.byteorder == "big":
+            samples.byteswap()
+    else:
+        raise ValueError(f"Unsupported sample width: {sample_width}")
+    if not samples:
+        return 0.0
+    return math.sqrt(sum(s * s for s in samples) / len(samples))
+
+
+class NoiseFloor:
+    """
+    Continuously tracked background level: an EWMA of frame energies.
+    Quiet frames update it at `alpha`; frames above the threshold barely move it, so
+    speech doesn't inflate the floor. If even the quietest of the last `window`
+    frames is above the threshold, the room got louder and the floor jumps to it.
+    The speech threshold is `ratio` times the floor, never below `min_threshold`.
+    Without a saved state, the first `warmup` frames only calibrate (about a second,
+    once per device rather than per utterance).
+    """
+
+    def __init__(self, alpha: float = None, ratio: float = None, min_threshold: float = None,
+                 path: str = None, key: str = "default", warmup: int = 30, window: int = 100):
+        self.alpha = alpha if alpha is not None else config.NOISE_FLOOR_ALPHA
+        self.ratio = ratio if ratio is not None else config.ENERGY_RATIO
+        self.min_threshold = min_threshold if min_threshold is not None else config.ENERGY_THRESHOLD_MIN
+        self.path = path
+        self.key = key
+        self.floor = self.min_threshold / self.ratio
+        self.frames = 0
+        self.calibrated = False
+        self.warmup = warmup
+        self._recent = deque(maxlen=window)
+        self._saved_at = time.monotonic()
+        self.load()
+
+    @property
+    def threshold(self) -> float:
+        return max(self.floor * self.ratio, self.min_threshold)
+
+    def update(self, energy: float) -> bool:
+        """Feeds one frame's energy; returns True if the frame is above the speech threshold."""
+        self.frames += 1
+        self._recent.append(energy)
+        if not self.calibrated:
+            # Running mean of the first frames
+            self.floor += (energy - self.floor) / self.frames
+            self.calibrated = self.frames >= self.warmup
+            return False
+
+        if len(self._recent) == self._recent.maxlen and min(self._recent) > self.threshold:
+            # No pause in `window` frames is not speech: re-base on the quietest frame
+            self.floor = min(self._recent)
+            self._recent.clear()
+
+        loud = energy > self.threshold
+        alpha = self.alpha * 0.02 if loud else self.alpha
+        self.floor += alpha * (energy - self.floor)
+        return loud
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                state = json.load(f).get(self.key)
+        except (OSError, ValueError):
+            return
+        if state:
+            self.floor = float(state["floor"])
+            self.calibrated = True
+
+    def save(self, min_interval: float = 0):
+        """Persists the floor so the next run starts calibrated (at most every `min_interval` seconds)."""
+        if not self.path or time.monotonic() - self._saved_at < min_interval:
+            return
+        self._saved_at = time.monotonic()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                states = json.load(f)
+        except (OSError, ValueError):
+            states = {}
+        states[self.key] = {"floor": self.floor, "updated": time.time()}
+        try:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump(states, f, indent=2)
+        except OSError:
+            pass
+
+
+class WavFrames:
+    """Frames from a recorded WAV file, for replaying fixtures through the capture path."""
+
+    def __init__(self, path: str, frame_seconds: float = FRAME_SECONDS):
+        self.path = path
+        with wave.open(path, "rb") as wav:
+            if wav.getnchannels() != 1:
+                raise ValueError(f"{path}: only mono WAV files are supported.")
+            self.sample_rate = wav.getframerate()
+            self.sample_width = wav.getsampwidth()
+        self.frame_count = max(int(self.sample_rate * frame_seconds), 1)
+
+    def __iter__(self) -> Iterator[bytes]:
+        with wave.open(self.path, "rb") as wav:
+            while True:
+                frame = wav.readframes(self.frame_count)
+                if not frame:
+                    return
+                yield frame
+
+
+class MicFrames:
+    """
+    Frames from a microphone that stays open for the life of the assistant,
+    instead of re-opening the device (and re-calibrating) for every phrase.
+    """
+
+    def __init__(self, device_index: int = None, frame_seconds: float = FRAME_SECONDS):
+        self.microphone = sr.Microphone(device_index=device_index)
+        self.sample_rate = self.microphone.SAMPLE_RATE
+        self.sample_width = self.microphone.SAMPLE_WIDTH
+        self.frame_count = max(int(self.sample_rate * frame_seconds), 1)
+        self._source = None
+
+    def __iter__(self) -> Iterator[bytes]:
+        if self._source is None:
+            self._source = self.microphone.__enter__()
+        while self._source is not None:
+            yield self._source.stream.read(self.frame_count)
+
+    def close(self):
+        if self._source is not None:
+            self._source = None
+            self.microphone.__exit__(None, None, None)
+
+
+class PhraseDetector:
+    """
+    Push-style endpointer: feed() frames as they arrive and it returns an AudioData
+    once a phrase (speech followed by `pause_threshold` seconds of quiet) is complete.
+    A short pre-roll is kept so phrase onsets aren't clipped.
+    """
+
+    def __init__(self, sample_rate: int, sample_width: int, frame_count: int,
+                 noise_floor: NoiseFloor, pause_threshold: float = None,
+                 phrase_time_limit: float = None, min_phrase: float = 0.25, pre_roll: float = 0.3):
+        self.sample_rate = sample_rate
+        self.sample_width = sample_width
+        self.noise_floor = noise_floor
+        frame_seconds = frame_count / sample_rate
+        self.pause_frames = math.ceil((pause_threshold or config.PAUSE_THRESHOLD) / frame_seconds)
+        self.limit_frames = math.ceil((phrase_time_limit or config.PHRASE_TIME_LIMIT) / frame_seconds)
+        self.min_frames = math.ceil(min_phrase / frame_seconds)
+        self._pre_roll = deque(maxlen=math.ceil(pre_roll / frame_seconds))
+        self._phrase = []
+        self._loud_frames = 0
+        self._quiet_run = 0
+        self.in_phrase = False
+        self.last_energy = 0.0
+
+    def feed(self, frame: bytes) -> Optional[sr.AudioData]:
+        self.last_energy = frame_rms(frame, self.sample_width)
+        loud = self.noise_floor.update(self.last_energy)
+
+        if not self.in_phrase:
+            self._pre_roll.append(frame)
+            if loud:
+                self.in_phrase = True
+                self._phrase = list(self._pre_roll)
+                self._pre_roll.clear()
+                self._loud_frames = 1
+                self._quiet_run = 0
+            return None
+
+        self._phrase.append(frame)
+        if loud:
+            self._loud_frames += 1
+            self._quiet_run = 0
+        else:
+            self._quiet_run += 1
+
+        if self._quiet_run >= self.pause_frames or len(self._phrase) >= self.limit_frames:
+            return self._finish()
+        return None
+
+    def flush(self) -> Optional[sr.AudioData]:
+        """Ends the current phrase early (end of a recording)."""
+        return self._finish() if self.in_phrase else None
+
+    def _finish(self) -> Optional[sr.AudioData]:
+        frames, loud_frames, quiet_run = self._phrase, self._loud_frames, self._quiet_run
+        self._phrase, self._loud_frames, self._quiet_run = [], 0, 0
+        self.in_phrase = False
+        if loud_frames < self.min_frames:
+            return None  # A click or bump, not speech
+        # Drop the trailing silence, keeping about a pre-roll's worth for the recogniser
+        tail = max(quiet_run - self._pre_roll.maxlen, 0)
+        return sr.AudioData(b"".join(frames[:len(frames) - tail]), self.sample_rate, self.sample_width)
+
+
+def phrases(frames: Iterable[bytes], detector: PhraseDetector) -> Iterator[sr.AudioData]:
+    """Runs a frame source (microphone or WAV fixture) through the detector."""
+    for frame in frames:
+        audio = detector.feed(frame)
+        if audio is not None:
+            yield audio
+    audio = detector.flush()
+    if audio is not None:
+        yield audio
@@ -0,0 +1,146 @@
+"""
+Stand-ins for the hardware-bound backends, so the assistant's hot paths can be timed
+on any machine: a TTS engine that "speaks" by sleeping, a microphone that plays
+synthetic voiced bursts in real time, and a recognizer that returns the scripted text.
+"""
+import array
+import math
+import queue
+import random
+import sys
+import threading
+import time
+
+import speech_recognition as sr
+
+
+class FakeSpeechOutput:
+    """
+    Drop-in for speech_output.SpeechOutput. Each sentence takes `seconds_per_word`
+    per word to "speak"; `said` records (timestamp, text) for time-to-first-audio.
+    """
+
+    def __init__(self, seconds_per_word: float = 0.0):
+        self.available = True
+        self.cache = None
+        self.seconds_per_word = seconds_per_word
+        self.said = []
+        self._queue = queue.Queue()
+        self._speaking = threading.Event()
+        self._interrupt = threading.Event()
+        threading.Thread(target=self._run, name="fake-tts", daemon=True).start()
+
+    @property
+    def speaking(self) -> bool:
+        return self._speaking.is_set()
+
+    def say(self, text: str):
+        if text:
+            self.said.append((time.perf_counter(), text))
+            self._queue.put(text)
+
+    def wait(self):
+        self._queue.join()
+
+    def stop(self):
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._queue.task_done()
+        self._interrupt.set()
+
+    def _run(self):
+        while True:
+            text = self._queue.get()
+            self._interrupt.clear()
+            self._speaking.set()
+            try:
+                self._interrupt.wait(len(text.split()) * self.seconds_per_word)
+            finally:
+                self._speaking.clear()
+                self._queue.task_done()
+
+
+class SyntheticMic:
+    """
+    Drop-in for audio_capture.MicFrames. Produces low background noise, and for each
+    speak(text) call a burst of voiced, harmonic "speech" of `phrase_seconds`.
+    Frames are paced in real time so endpointing behaves as with a real device.
+    `spoken` holds (text, time the burst ended) for measuring end-of-speech latency.
+    """
+
+    def __init__(self, device_index: int = None, sample_rate: int = 16000, frame_seconds: float = 0.03,
+                 phrase_seconds: float = 1.0, realtime: bool = True):
+        self.sample_rate = sample_rate
+        self.sample_width = 2
+        self.frame_count = int(sample_rate * frame_seconds)
+        self.phrase_seconds = phrase_seconds
+        self.realtime = realtime
+        self.spoken = []
+        self._pending = queue.Queue()
+        self._closed = False
+        self._t = 0
+
+    def speak(self, text: str):
+        self._pending.put(text)
+
+    def __iter__(self):
+        frame_seconds = self.frame_count / self.sample_rate
+        next_at = time.perf_counter()
+        burst_frames, text = 0, None
+        while not self._closed:
+            if not burst_frames:
+                try:
+                    text = self._pending.get_nowait()
+                    burst_frames = max(int(self.phrase_seconds / frame_seconds), 1)
+                except queue.Empty:
+                    text = None
+            frame = self._frame(voiced=bool(burst_frames))
+            if burst_frames:
+                burst_frames -= 1
+                if not burst_frames:
+                    self.spoken.append((text, time.perf_counter() + frame_seconds))
+            if self.realtime:
+                next_at += frame_seconds
+                time.sleep(max(next_at - time.perf_counter(), 0))
+            yield frame
+
+    def close(self):
+        self._closed = True
+
+    def _frame(self, voiced: bool) -> bytes:
+        samples = array.array("h")
+        for _ in range(self.frame_count):
+            t = self._t / self.sample_rate
+            self._t += 1
+            value = random.gauss(0, 30)
+            if voiced:
+                # 140 Hz voice with two harmonics, syllable-rate amplitude modulation
+                envelope = 0.6 + 0.4 * math.sin(2 * math.pi * 4 * t)
+                value += envelope * (4000 * math.sin(2 * math.pi * 140 * t)
+                                     + 2000 * math.sin(2 * math.pi * 280 * t)
+                                     + 1000 * math.sin(2 * math.pi * 420 * t))
+            samples.append(max(-32768, min(32767, int(value))))
+        if sys.byteorder == "big":
+            samples.byteswap()
+        return samples.tobytes()
+
+
+class FakeRecognizer(sr.Recognizer):
+    """Returns the texts the SyntheticMic spoke, in order, after `latency` seconds (cloud ASR round trip)."""
+
+    def __init__(self, mic: SyntheticMic, latency: float = 0.0):
+        super().__init__()
+        self.mic = mic
+        self.latency = latency
+        self._next = 0
+
+    def recognize_google(self, audio, *args, **kwargs):
+        time.sleep(self.latency)
+        if self._next >= len(self.mic.spoken):
+            raise sr.UnknownValueError()
+        text = self.mic.spoken[self._next][0]
+        self._next += 1
+        return text
@@ -0,0 +1,76 @@
+"""
+Hedging benchmark: intent latency percentiles with and without a hedged backup.
+
+    python benchmarks/hedge_bench.py [--requests 200] [--slow-rate 0.05]
+
+Two mock OpenAI-compatible servers stand in for the providers: a primary that is
+usually fast but occasionally stalls (--slow-rate / --slow-delay), and a steady backup.
+Reports p50/p95/p99 latency and how many requests were hedged.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+os.environ.setdefault("LLM_PROVIDER", "local")
+# llm.request spans are traced; keep them out of the checkout's logs/
+WORKDIR = tempfile.mkdtemp(prefix="rj-hedge-")
+os.environ["TELEMETRY_TRACE_PATH"] = os.path.join(WORKDIR, "traces.jsonl")
+os.environ["TELEMETRY_METRICS_PATH"] = os.path.join(WORKDIR, "metrics.prom")
+
+import config  # noqa: E402
+from llm_providers import LLMRequest, Provider, hedged_complete  # noqa: E402
+from benchmarks.mock_llm_server import MockSettings, start_server  # noqa: E402
+
+
+def percentile(samples, p):
+    samples = sorted(samples)
+    return samples[min(int(round(p / 100 * (len(samples) - 1))), len(samples) - 1)]
+
+
+def run(providers, requests, parse):
+    latencies = []
+    request = LLMRequest("You are a test.", "", "hello")
+    for _ in range(requests):
+        start = time.perf_counter()
+        hedged_complete(providers, request, parse)
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--delay", type=float, default=0.05, help="Primary's usual latency")
+    parser.add_argument("--slow-rate", type=float, default=0.05)
+    parser.add_argument("--slow-delay", type=float, default=1.5)
+    parser.add_argument("--backup-delay", type=float, default=0.15)
+    args = parser.parse_args()
+
+    primary_settings = MockSettings(delay=args.delay, jitter=args.delay / 4,
+                                    slow_rate=args.slow_rate, slow_delay=args.slow_delay)
+    backup_settings = MockSettings(delay=args.backup_delay)
+    _, primary_url = start_server(primary_settings)
+    _, backup_url = start_server(backup_settings)
+    config.LLM_HEDGE_DELAY = args.delay * 4
+
+    for label, hedge in (("single", False), ("hedged", True)):
+        primary = Provider("local", base_url=primary_url)
+        providers = [primary, Provider("local", base_url=backup_url)] if hedge else [primary]
+        before = backup_settings.requests
+        latencies = run(providers, args.requests, json.loads)
+        hedged = backup_settings.requests - before
+        print(f"{label:>7}: p50 {percentile(latencies, 50) * 1000:7.1f} ms   "
+              f"p95 {percentile(latencies, 95) * 1000:7.1f} ms   "
+              f"p99 {percentile(latencies, 99) * 1000:7.1f} ms   "
+              f"mean {statistics.mean(latencies) * 1000:7.1f} ms   backup calls {hedged}")
+    print(f"\nTraces and metrics: {WORKDIR}")
+
+
+if __name__ == "__main__":
+    main()
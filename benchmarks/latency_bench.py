@@ -0,0 +1,285 @@
+"""
+Offline end-to-end latency benchmark: no API keys, microphone or network needed.
+
+    python benchmarks/latency_bench.py [--iterations 5] [--delay 0.3] [--no-streaming]
+                                       [--voice] [--json out.json] [--baseline out.json]
+
+A mock OpenAI-compatible server answers every utterance of the corpus
+(benchmarks/corpus.json: {"text", "intent"} entries) with its canned intent after
+--delay seconds, streamed in chunks every --chunk-delay seconds. TTS is a fake that
+"speaks" instantly (or --seconds-per-word), and the notes store and caches live in a
+temporary directory. Each utterance runs through AI_Assistant.execute_command (text
+mode) and remote_handler.handle_remote_command, then again with the LLM server down.
+
+Reports p50/p95/p99 in ms for:
+    parse_intent / stream_intent, _fallback_parser, registry.invoke (command run as a job),
+    turn (local) and remote_turn, first_audio (turn start -> first sentence to TTS),
+    offline.* (the same with the LLM server down: circuit breaker + fallback parser), and with --voice,
+    voice_turn (end of speech -> first audio) through the capture / ASR pipeline
+    fed by a synthetic microphone.
+
+With --baseline, exits with status 1 when a stage's p95 is more than --tolerance
+(fraction) and --min-delta ms slower than in the baseline JSON written earlier with --json.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.mock_llm_server import DEFAULT_REPLY, MockSettings, start_server  # noqa: E402
+
+CORPUS_PATH = os.path.join(ROOT, "benchmarks", "corpus.json")
+
+samples = defaultdict(list)
+phase = {"prefix": ""}  # Stage-name prefix, so the LLM-down run is reported separately
+
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(int(round(p / 100 * (len(values) - 1))), len(values) - 1)]
+
+
+def summarize():
+    return {stage: {"n": len(values),
+                    "p50": percentile(values, 50) * 1000, "p95": percentile(values, 95) * 1000,
+                    "p99": percentile(values, 99) * 1000, "mean": statistics.mean(values) * 1000}
+            for stage, values in samples.items() if values}
+
+
+def timed(owner, name, stage):
+    """Wraps owner.name so every call's duration is recorded under `stage`."""
+    original = getattr(owner, name)
+
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return original(*args, **kwargs)
+        finally:
+            samples[phase["prefix"] + stage].append(time.perf_counter() - start)
+
+    setattr(owner, name, wrapper)
+
+
+def make_reply(corpus):
+    """Mock server reply: the canned intent of the utterance in the last user message."""
+    intents = {entry["text"].lower(): json.dumps(entry["intent"]) for entry in corpus}
+
+    def reply(body):
+        messages = [m for m in body.get("messages", []) if m.get("role") == "user"]
+        text = str(messages[-1]["content"]).lower().strip() if messages else ""
+        return intents.get(text, DEFAULT_REPLY)
+
+    return reply
+
+
+def configure_environment(args, url, workdir):
+    """Settings read by config.py at import time; everything stateful goes into `workdir`."""
+    os.environ.update({
+        "LLM_PROVIDER": "local",
+        "LOCAL_LLM_URL": url,
+        "LLM_BACKUP_PROVIDERS": "",
+        "LLM_STREAMING": "false" if args.no_streaming else "true",
+        "LLM_MAX_RETRIES": "0",
+        "INTENT_CACHE_ENABLED": "true" if args.cache else "false",
+        "INTENT_CACHE_PATH": os.path.join(workdir, "intent_cache.db"),
+        "NOTES_DB_PATH": os.path.join(workdir, "notes.db"),
+        "NOTES_LEGACY_FILE": os.path.join(workdir, "notes.txt"),
+        "AUDIO_CALIBRATION_PATH": os.path.join(workdir, "audio_calibration.json"),
+        "ALWAYS_ASK_PERMISSION": "false",
+        "VOICE_OUTPUT": "false",  # The real engine is swapped for FakeSpeechOutput after construction
+        "TTS_CACHE_ENABLED": "false",
+        "WAKE_GATE": "off",
+        "DEBUG_LOG_PATH": os.path.join(workdir, "debug.log"),
+        "SKILL_MANIFEST_PATH": os.path.join(workdir, "skill_manifest.json"),
+        "TELEMETRY_TRACE_PATH": os.path.join(workdir, "traces.jsonl"),
+        "TELEMETRY_METRICS_PATH": os.path.join(workdir, "metrics.prom"),
+    })
+
+
+def run_local(assistant, corpus, stage="turn"):
+    fake = assistant.engine
+    for entry in corpus:
+        said_before = len(fake.said)
+        start = time.perf_counter()
+        assistant.execute_command(entry["text"])
+        fake.wait()
+        samples[stage].append(time.perf_counter() - start)
+        if len(fake.said) > said_before and stage == "turn":
+            samples["first_audio"].append(fake.said[said_before][0] - start)
+
+
+def run_remote(handle_remote_command, corpus, stage="remote_turn"):
+    for entry in corpus:
+        start = time.perf_counter()
+        handle_remote_command(entry["text"], session="bench:remote")
+        samples[stage].append(time.perf_counter() - start)
+
+
+def run_voice(assistant, corpus, asr_latency):
+    """Speaks each utterance (with the wake word) into a synthetic mic and times end of speech -> first audio."""
+    import main
+    from audio_capture import NoiseFloor, PhraseDetector
+    from wake_gate import WakeGate
+    from benchmarks.fakes import FakeRecognizer, SyntheticMic
+
+    mic = SyntheticMic()
+    assistant.mic = mic
+    assistant.noise_floor = NoiseFloor(path=os.environ["AUDIO_CALIBRATION_PATH"], key="bench")
+    assistant.detector = PhraseDetector(mic.sample_rate, mic.sample_width, mic.frame_count, assistant.noise_floor)
+    assistant.gate = WakeGate(None)
+    assistant.recognizer = FakeRecognizer(mic, latency=asr_latency)
+
+    turn_done = threading.Event()
+
+    def loop():
+        while assistant.running:
+            text = assistant.listen()
+            if text:
+                assistant.execute_command(text)
+                assistant.engine.wait()
+                turn_done.set()
+
+    assistant.start_pipeline()
+    threading.Thread(target=loop, name="bench-turns", daemon=True).start()
+    time.sleep(1.5)  # Let the noise floor settle
+
+    fake = assistant.engine
+    wake = main.WAKE_WORD.lower()
+    for entry in corpus:
+        said_before = len(fake.said)
+        turn_done.clear()
+        mic.speak(f"{wake} {entry['text']}")
+        if not turn_done.wait(30):
+            print(f"[Bench] Voice turn timed out: {entry['text']!r}", file=sys.stderr)
+            continue
+        ended = mic.spoken[-1][1]
+        if len(fake.said) > said_before:
+            samples["voice_turn"].append(fake.said[said_before][0] - ended)
+    assistant.running = False
+    for thread in threading.enumerate():
+        if thread.name == "capture":
+            thread.join(5)  # It closes the mic on the way out
+    assistant.mic = None  # Back to text mode for the remaining runs
+
+
+def report(results):
+    print(f"\n{'stage':<24}{'n':>6}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'mean ms':>10}")
+    for stage in sorted(results):
+        r = results[stage]
+        print(f"{stage:<24}{r['n']:>6}{r['p50']:>10.1f}{r['p95']:>10.1f}{r['p99']:>10.1f}{r['mean']:>10.1f}")
+
+
+def compare(results, baseline_path, tolerance, min_delta):
+    """
+    Returns the stages whose p95 regressed by more than `tolerance` against the baseline
+    (and by at least `min_delta` ms, so sub-millisecond stages don't flag on noise).
+    """
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = json.load(f)["stages"]
+    regressions = []
+    for stage, r in sorted(results.items()):
+        before = baseline.get(stage)
+        if not before:
+            continue
+        change = (r["p95"] - before["p95"]) / before["p95"] if before["p95"] else 0.0
+        marker = "  REGRESSION" if change > tolerance and r["p95"] - before["p95"] >= min_delta else ""
+        print(f"{stage:<24} p95 {before['p95']:8.1f} -> {r['p95']:8.1f} ms ({change:+.0%}){marker}")
+        if marker:
+            regressions.append(stage)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--corpus", default=CORPUS_PATH)
+    parser.add_argument("--iterations", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1, help="Iterations run before measuring")
+    parser.add_argument("--delay", type=float, default=0.3, help="LLM time to first token (s)")
+    parser.add_argument("--jitter", type=float, default=0.05)
+    parser.add_argument("--chunk-delay", type=float, default=0.01, help="Seconds between streamed chunks")
+    parser.add_argument("--seconds-per-word", type=float, default=0.0, help="Fake TTS speaking rate")
+    parser.add_argument("--no-streaming", action="store_true")
+    parser.add_argument("--cache", action="store_true", help="Enable the intent cache")
+    parser.add_argument("--voice", action="store_true", help="Also run the synthetic-mic voice pipeline (real time)")
+    parser.add_argument("--asr-latency", type=float, default=0.4, help="Simulated cloud ASR time (s)")
+    parser.add_argument("--json", help="Write results to this file")
+    parser.add_argument("--baseline", help="Compare p95s against a previous --json result")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    parser.add_argument("--min-delta", type=float, default=10.0, help="Smallest p95 increase (ms) that counts")
+    parser.add_argument("--verbose", action="store_true", help="Show the assistant's own output")
+    args = parser.parse_args()
+
+    with open(args.corpus, "r", encoding="utf-8") as f:
+        corpus = json.load(f)
+
+    settings = MockSettings(delay=args.delay, jitter=args.jitter, reply=make_reply(corpus),
+                            chunk_delay=args.chunk_delay)
+    _, url = start_server(settings)
+    workdir = tempfile.mkdtemp(prefix="rj-bench-")
+    configure_environment(args, url, workdir)
+
+    import config
+    import main as assistant_main
+    from command_registry import CommandRegistry
+    from llm_engine import LLMEngine
+    from benchmarks.fakes import FakeSpeechOutput
+
+    quiet = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with quiet:
+        assistant = assistant_main.AI_Assistant()
+        assistant.mic = None  # Text mode; --voice attaches the synthetic mic later
+        assistant.engine = FakeSpeechOutput(args.seconds_per_word)
+        config.VOICE_OUTPUT = True
+        from remote_handler import handle_remote_command
+
+        for _ in range(args.warmup):
+            run_local(assistant, corpus, stage="warmup")
+            run_remote(handle_remote_command, corpus, stage="warmup")
+        samples.clear()
+
+        timed(LLMEngine, "parse_intent", "parse_intent")
+        timed(LLMEngine, "stream_intent", "stream_intent")
+        timed(LLMEngine, "_fallback_parser", "_fallback_parser")
+        timed(CommandRegistry, "invoke", "registry.invoke")
+
+        for _ in range(args.iterations):
+            run_local(assistant, corpus)
+            run_remote(handle_remote_command, corpus)
+            for entry in corpus:
+                assistant.llm._fallback_parser(entry["text"])
+
+        if args.voice:
+            phase["prefix"] = "voice."
+            run_voice(assistant, corpus, args.asr_latency)
+
+        settings.down = True
+        phase["prefix"] = "offline."
+        for _ in range(args.iterations):
+            run_local(assistant, corpus, stage="offline.turn")
+
+    results = summarize()
+    report(results)
+    print(f"\nTraces and metrics: {workdir}")
+    print(f"\nLLM requests served: {settings.requests}   corpus: {len(corpus)} utterances x {args.iterations}")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"settings": vars(args), "stages": results}, f, indent=2)
+    if args.baseline:
+        print()
+        if compare(results, args.baseline, args.tolerance, args.min_delta):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,168 @@
+"""
+Local stand-in for an OpenAI-compatible chat completions server (Ollama, LM Studio,
+Groq...), with injectable latency, for exercising the LLM paths without keys or network.
+
+    python benchmarks/mock_llm_server.py --port 8901 --delay 0.2 --slow-rate 0.1 --slow-delay 3
+
+Point the assistant at it with LLM_PROVIDER=local LOCAL_LLM_URL=http://127.0.0.1:8901/v1.
+Every request answers with --reply (a JSON intent) after `delay` seconds, or after
+`slow_delay` seconds for a `slow_rate` fraction of requests. Streaming is supported.
+"""
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+DEFAULT_REPLY = json.dumps({"command": "chat", "args": {"text": "Hello."}, "response": "Hello, Sir."})
+
+
+class MockSettings:
+    def __init__(self, delay: float = 0.0, jitter: float = 0.0, slow_rate: float = 0.0,
+                 slow_delay: float = 0.0, reply: str = DEFAULT_REPLY, chunk_size: int = 8,
+                 chunk_delay: float = 0.0, down: bool = False, structured: bool = True):
+        self.delay = delay
+        self.jitter = jitter
+        self.slow_rate = slow_rate
+        self.slow_delay = slow_delay
+        self.reply = reply
+        self.chunk_size = chunk_size
+        self.chunk_delay = chunk_delay
+        self.down = down  # Drop every connection without answering, like a crashed server
+        self.structured = structured  # False: reject response_format with a 400, like older servers
+        self.last_body = None
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def latency(self) -> float:
+        with self._lock:
+            self.requests += 1
+        if self.slow_rate and random.random() < self.slow_rate:
+            return self.slow_delay
+        return max(self.delay + random.uniform(-self.jitter, self.jitter), 0)
+
+    def reply_for(self, body: dict) -> str:
+        """The reply text; a callable `reply` gets the request body (for per-utterance answers)."""
+        return self.reply(body) if callable(self.reply) else self.reply
+
+
+def make_handler(settings: MockSettings):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if settings.down:
+                self.close_connection = True
+                return
+            if self.path.rstrip("/").endswith("/models"):
+                self._json({"object": "list", "data": [{"id": "mock", "object": "model"}]})
+            else:
+                self.send_error(404)
+
+        def do_POST(self):
+            if settings.down:
+                self.close_connection = True
+                return
+            length = int(self.headers.get("Content-Length", 0))
+            body = json.loads(self.rfile.read(length) or b"{}")
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self.send_error(404)
+                return
+
+            settings.last_body = body
+            if body.get("response_format") and not settings.structured:
+                self._json({"error": {"message": "response_format is not supported", "type": "invalid_request_error"}},
+                           status=400)
+                return
+
+            time.sleep(settings.latency())
+            text = settings.reply_for(body)
+            finish_reason = "stop"
+            # ~4 characters per token, cut off at max_tokens like a real server
+            if body.get("max_tokens") and len(text) > body["max_tokens"] * 4:
+                text = text[:body["max_tokens"] * 4]
+                finish_reason = "length"
+            model = body.get("model", "mock")
+            usage = {"prompt_tokens": sum(len(str(m.get("content", ""))) // 4 for m in body.get("messages", [])),
+                     "completion_tokens": len(text) // 4}
+            usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+
+            if not body.get("stream"):
+                self._json({
+                    "id": "mock", "object": "chat.completion", "created": int(time.time()), "model": model,
+                    "choices": [{"index": 0, "finish_reason": finish_reason,
+                                 "message": {"role": "assistant", "content": text}}],
+                    "usage": usage,
+                })
+                return
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Cache-Control", "no-cache")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            try:
+                for i in range(0, len(text), settings.chunk_size):
+                    self._event({"id": "mock", "object": "chat.completion.chunk", "created": int(time.time()),
+                                 "model": model, "choices": [{"index": 0, "finish_reason": None,
+                                                              "delta": {"content": text[i:i + settings.chunk_size]}}]})
+                    if settings.chunk_delay:
+                        time.sleep(settings.chunk_delay)
+                self._event({"id": "mock", "object": "chat.completion.chunk", "created": int(time.time()),
+                             "model": model, "choices": [{"index": 0, "finish_reason": finish_reason, "delta": {}}],
+                             "usage": usage})
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.wfile.flush()
+            except (BrokenPipeError, ConnectionResetError):
+                pass  # The client cancelled (e.g. a hedged request that lost)
+            self.close_connection = True
+
+        def _event(self, payload: dict):
+            self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        def _json(self, payload: dict, status: int = 200):
+            data = json.dumps(payload).encode("utf-8")
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+    return Handler
+
+
+def start_server(settings: MockSettings, port: int = 0):
+    """Starts the mock server on a background thread; returns (server, base_url)."""
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(settings))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="mock-llm", daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8901)
+    parser.add_argument("--delay", type=float, default=0.2)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--slow-rate", type=float, default=0.0)
+    parser.add_argument("--slow-delay", type=float, default=3.0)
+    parser.add_argument("--reply", default=DEFAULT_REPLY)
+    args = parser.parse_args()
+
+    settings = MockSettings(args.delay, args.jitter, args.slow_rate, args.slow_delay, args.reply)
+    server, url = start_server(settings, args.port)
+    print(f"Mock LLM server on {url} (Ctrl+C to stop)")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Startup benchmark: time and peak RSS to register all skills, eager vs lazy.
+
+    python benchmarks/startup_bench.py [--runs 5] [--target skills|remote]
+
+Each run is a fresh interpreter, so import caches don't leak between modes.
+'skills' registers the voice assistant's skill set; 'remote' imports remote_handler
+the way the Discord/Telegram deployment does.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Lazy runs after the first reuse this manifest, as a warm start would; it stays out of logs/
+WORKDIR = tempfile.mkdtemp(prefix="rj-startup-")
+
+SKILLS = ["skills.browser", "skills.system", "skills.files", "skills.media",
+          "skills.input", "skills.notes", "skills.workflows"]
+
+PROBE = r"""
+import json, sys, time
+start = time.perf_counter()
+if {target!r} == "remote":
+    import remote_handler
+else:
+    from skill_loader import load_skills
+    load_skills({skills!r}, lazy={lazy!r}, prewarm=False)
+elapsed = time.perf_counter() - start
+try:
+    import resource
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    rss_mb = rss / (1024 * 1024) if sys.platform == "darwin" else rss / 1024
+except ImportError:
+    import psutil
+    rss_mb = psutil.Process().memory_info().peak_wset / (1024 * 1024)
+print(json.dumps({{"seconds": elapsed, "rss_mb": rss_mb}}))
+"""
+
+
+def run_once(target: str, lazy: bool) -> dict:
+    env = dict(os.environ, LAZY_SKILLS="true" if lazy else "false", SKILL_PREWARM="false",
+               SKILL_MANIFEST_PATH=os.path.join(WORKDIR, "skill_manifest.json"))
+    code = PROBE.format(target=target, skills=SKILLS, lazy=lazy)
+    out = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env,
+                         capture_output=True, text=True, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--target", choices=["skills", "remote"], default="skills")
+    args = parser.parse_args()
+
+    print(f"Target: {args.target} ({args.runs} runs per mode)")
+    for lazy in (False, True):
+        results = [run_once(args.target, lazy) for _ in range(args.runs)]
+        seconds = statistics.median(r["seconds"] for r in results)
+        rss = statistics.median(r["rss_mb"] for r in results)
+        print(f"  {'lazy ' if lazy else 'eager'}: {seconds * 1000:8.1f} ms   peak RSS {rss:7.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""
+Wake-gate replay: runs recorded WAV fixtures through the same capture path as the
+microphone (noise floor -> phrase detector -> VAD / wake-word gate) and reports how
+many phrases would have been uploaded to cloud ASR.
+
+    python benchmarks/wake_gate_bench.py fixtures/*.wav [--gate auto|template|sphinx|off]
+
+Fixtures must be mono PCM WAV. Directories are searched for *.wav files.
+"""
+import argparse
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from audio_capture import NoiseFloor, PhraseDetector, WavFrames, phrases  # noqa: E402
+from wake_gate import WakeGate, make_spotter  # noqa: E402
+
+
+def expand(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.lower().endswith(".wav"):
+                    yield os.path.join(path, name)
+        else:
+            yield path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="+")
+    parser.add_argument("--gate", default=None, help="Override WAKE_GATE")
+    args = parser.parse_args()
+
+    gate = WakeGate(make_spotter(args.gate))
+    print(f"Spotter: {type(gate.spotter).__name__ if gate.spotter else 'none (VAD only)'}")
+
+    audio_seconds = gate_seconds = 0.0
+    for path in expand(args.paths):
+        source = WavFrames(path)
+        # Fresh, uncalibrated floor per fixture so recordings don't influence each other
+        noise_floor = NoiseFloor()
+        detector = PhraseDetector(source.sample_rate, source.sample_width, source.frame_count, noise_floor)
+        before = dict(gate.stats)
+        for audio in phrases(source, detector):
+            start = time.perf_counter()
+            gate.check(audio, noise_floor.threshold, now=0)
+            gate_seconds += time.perf_counter() - start
+        audio_seconds += noise_floor.frames * source.frame_count / source.sample_rate
+        found = gate.stats["phrases"] - before["phrases"]
+        passed = gate.stats["passed"] - before["passed"]
+        print(f"  {os.path.basename(path)}: {found} phrases, {passed} sent to ASR")
+
+    stats = gate.stats
+    print(f"\nAudio replayed: {audio_seconds:.1f} s   gate CPU: {gate_seconds * 1000:.0f} ms")
+    print(f"Phrases: {stats['phrases']}   no speech: {stats['no_speech']}   "
+          f"no wake word: {stats['no_wake_word']}   sent to ASR: {stats['passed']}")
+    print(f"ASR calls avoided: {stats['phrases'] - stats['passed']} ({gate.avoided():.0%})")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,12 @@
 
-from typing import Callable, Dict, Any, Optional
+from typing import Callable, Dict, Any, List, Optional
+import hashlib
+import importlib
 import inspect
+import threading
 import config
+import telemetry
+from command_schema import ArgumentError, CommandSchema
 
 class CommandRegistry:
     """
@@ -12,8 +17,17 @@ class CommandRegistry:
     def __init__(self):
         self._commands: Dict[str, Callable] = {}
         self._metadata: Dict[str, Dict[str, Any]] = {}
+        # Lazily registered commands: name -> module that implements them
+        self._lazy: Dict[str, str] = {}
+        self._load_lock = threading.RLock()
+        # Bumped on every registration so caches can tell when the catalog changed
+        self.version = 0
+        self._fingerprint = None
+        self._fingerprint_version = -1
 
-    def register(self, name: str, description: str, safe: bool = False):
+    def register(self, name: str, description: str, safe: bool = False,
+                 rules: Optional[List[Dict[str, Any]]] = None, examples: Optional[List[str]] = None,
+                 timeout: Optional[float] = None, independent: bool = False):
         """
         Decorator to register a function as an executable command.
         
@@ -21,57 +35,210 @@ class CommandRegistry:
             name: The command name used by the LLM (e.g., 'open_browser').
             description: Description of what the command does.
             safe: If True, bypasses confirmation (e.g., read-only ops).
+            rules: Offline fallback rules for this command, used when the LLM is
+                unavailable (see intent_rules.RuleEngine for the format).
+            examples: Sample user phrasings, used to pick relevant commands for the prompt.
+            timeout: Seconds the command may run as a job (None: JOB_TIMEOUT, 0: no limit).
+            independent: If True, the command neither affects nor observes what other commands
+                do (time, web lookups), so old-style workflow lists run it alongside their other steps.
         """
         def decorator(func: Callable):
+            if name in self._lazy:
+                # Module imported on demand: bind the function to its manifest entry
+                self._commands[name] = func
+                del self._lazy[name]
+                return func
             if name in self._commands:
                 raise ValueError(f"Command '{name}' is already registered.")
             
             # Store function and metadata
+            params = str(inspect.signature(func))
             self._commands[name] = func
             self._metadata[name] = {
                 "description": description,
                 "safe": safe,
-                "params": str(inspect.signature(func))
+                "params": params,
+                "schema": CommandSchema(name, params),
+                "rules": rules or [],
+                "examples": examples or [],
+                "timeout": timeout,
+                "independent": independent
             }
+            self.version += 1
             return func
         return decorator
 
+    def register_lazy(self, name: str, module: str, description: str, safe: bool = False,
+                      params: str = "()", rules: Optional[List[Dict[str, Any]]] = None,
+                      examples: Optional[List[str]] = None, timeout: Optional[float] = None,
+                      independent: bool = False):
+        """
+        Registers a command from manifest data without importing its module.
+        The module is imported on first use, and its @register decorator then binds
+        the real function to this entry.
+        """
+        if name in self._commands or name in self._lazy:
+            raise ValueError(f"Command '{name}' is already registered.")
+        self._lazy[name] = module
+        self._metadata[name] = {
+            "description": description,
+            "safe": safe,
+            "params": params,
+            # Compiled from the manifest's signature, so args are checked without importing the module
+            "schema": CommandSchema(name, params),
+            "rules": rules or [],
+            "examples": examples or [],
+            "timeout": timeout,
+            "independent": independent
+        }
+        self.version += 1
+
     def get_command(self, name: str) -> Optional[Callable]:
+        if name in self._lazy:
+            self._load(name)
         return self._commands.get(name)
 
+    def has_command(self, name: str) -> bool:
+        return name in self._commands or name in self._lazy
+
+    def preload(self):
+        """Imports every lazily registered module (used for background pre-warming)."""
+        for module in sorted(set(self._lazy.values())):
+            try:
+                importlib.import_module(module)
+            except Exception as e:
+                print(f"[Registry] Failed to pre-load {module}: {e}")
+
+    def _load(self, name: str):
+        with self._load_lock:
+            module = self._lazy.get(name)
+            if module is None:
+                return
+            importlib.import_module(module)
+            if name in self._lazy:
+                raise ImportError(f"Module '{module}' did not register command '{name}'.")
+
+    def timeout(self, name: str) -> float:
+        """Seconds `name` may run as a job (0 = no limit)."""
+        timeout = self._metadata[name]["timeout"]
+        return config.JOB_TIMEOUT if timeout is None else timeout
+
+    def is_independent(self, name: str) -> bool:
+        return self.has_command(name) and self._metadata[name]["independent"]
+
     def is_safe(self, name: str) -> bool:
-        if name not in self._commands:
+        if not self.has_command(name):
             return False
         # Check explicit registry safety check AND config override
         return self._metadata[name]["safe"] and name not in config.REQUIRE_CONFIRMATION
 
-    def list_commands(self):
-        """Returns a string list of all available commands for the LLM system prompt."""
+    def list_commands(self, names: Optional[List[str]] = None):
+        """
+        Returns a string list of all available commands for the LLM system prompt.
+        If `names` is given, only those commands are listed (in registration order).
+        """
         cmd_list = []
         for name, meta in self._metadata.items():
+            if names is not None and name not in names:
+                continue
             cmd_list.append(f"- {name}: {meta['description']} (Params: {meta['params']})")
         return "\n".join(cmd_list)
 
+    def args_schema(self, name: str) -> Dict[str, Any]:
+        return self._metadata[name]["schema"].json_schema()
+
+    def validate(self, name: str, kwargs: Dict[str, Any]) -> Dict[str, Any]:
+        """The command's args checked and coerced against its signature; raises ArgumentError."""
+        return self._metadata[name]["schema"].validate(kwargs)
+
+    def tool_definitions(self, names: Optional[List[str]] = None, style: str = "openai") -> List[Dict[str, Any]]:
+        """Commands as provider tool definitions ('openai' or 'anthropic' format)."""
+        return [meta["schema"].tool(meta["description"], style)
+                for name, meta in self._metadata.items() if names is None or name in names]
+
+    def intent_schema(self, names: Optional[List[str]] = None, per_command: bool = True) -> Dict[str, Any]:
+        """
+        JSON schema of the intent object the LLM must return, limited to `names`.
+        With `per_command`, each command's args are constrained to its own parameters
+        (an anyOf of one object per command); otherwise args is any object, for
+        providers whose schema support doesn't allow top-level alternatives.
+        "unknown" is always allowed so a shortlisted prompt can ask for the full catalog.
+        """
+        commands = [name for name in self._metadata if names is None or name in names]
+        response = {"type": "string"}
+        if not per_command:
+            return {
+                "type": "object",
+                "properties": {"command": {"type": "string", "enum": commands + ["unknown"]},
+                               "args": {"type": "object"}, "response": response},
+                "required": ["command", "args", "response"],
+            }
+        variants = []
+        for name in commands + ["unknown"]:
+            args = self.args_schema(name) if name in self._metadata else {"type": "object"}
+            variants.append({
+                "type": "object",
+                "properties": {"command": {"const": name}, "args": args, "response": response},
+                "required": ["command", "args", "response"],
+            })
+        return {"anyOf": variants}
+
+    def fingerprint(self) -> str:
+        """Stable hash of the command catalog (names, descriptions, params)."""
+        if self._fingerprint_version != self.version:
+            self._fingerprint = hashlib.sha1(self.list_commands().encode("utf-8")).hexdigest()
+            self._fingerprint_version = self.version
+        return self._fingerprint
+
+    def confirm(self, command_name: str, kwargs: Dict[str, Any]) -> bool:
+        """Asks the user before running an unsafe command. Safe commands pass straight through."""
+        if self.is_safe(command_name):
+            return True
+        print(f"\n[SECURITY] Command '{command_name}' requires confirmation.")
+        confirm = input(f"Execute {command_name} with {kwargs}? (y/n): ").lower()
+        return confirm == 'y'
+
+    def invoke(self, command_name: str, kwargs: Dict[str, Any]) -> Any:
+        """
+        Runs a command without the confirmation prompt and lets exceptions propagate.
+        For callers that confirmed up front and handle failures themselves (workflows).
+        """
+        if not self.has_command(command_name):
+            raise KeyError(f"Command '{command_name}' is not supported.")
+        kwargs = self.validate(command_name, kwargs)
+        func = self.get_command(command_name)
+        with telemetry.span("execute", command=command_name):
+            return func(**kwargs)
+
     def execute(self, command_name: str, **kwargs) -> Any:
         """
         Safely executes a registered command.
         """
-        if command_name not in self._commands:
+        if not self.has_command(command_name):
             return f"Error: Command '{command_name}' is not supported."
 
-        func = self._commands[command_name]
-        
-        # Security Check
-        if not self.is_safe(command_name):
-            print(f"\n[SECURITY] Command '{command_name}' requires confirmation.")
-            confirm = input(f"Execute {command_name} with {kwargs}? (y/n): ").lower()
-            if confirm != 'y':
-                return "Action cancelled by user."
+        # Bad args are turned away before the skill is loaded, confirmed or half-run
+        try:
+            kwargs = self.validate(command_name, kwargs)
+        except ArgumentError as e:
+            print(f"[Registry] Rejected {command_name} arguments: {e}")
+            return f"Argument Error: {e}"
 
         try:
-            return func(**kwargs)
+            func = self.get_command(command_name)
         except Exception as e:
-            return f"Execution Error: {str(e)}"
+            return f"Execution Error: could not load '{command_name}': {e}"
+        
+        # Security Check
+        if not self.confirm(command_name, kwargs):
+            return "Action cancelled by user."
+
+        with telemetry.span("execute", command=command_name) as span:
+            try:
+                return func(**kwargs)
+            except Exception as e:
+                span.fail(e)
+                return f"Execution Error: {str(e)}"
 
 # Global Registry Instance
 registry = CommandRegistry()
@@ -0,0 +1,303 @@
+import ast
+import json
+import re
+from typing import Any, Callable, Dict, List, Optional
+
+# Annotation name -> JSON schema type, for the output schemas sent to the LLM
+JSON_TYPES = {"str": "string", "int": "integer", "float": "number", "bool": "boolean",
+              "list": "array", "List": "array", "tuple": "array", "Tuple": "array", "set": "array",
+              "dict": "object", "Dict": "object"}
+
+_DESCRIBE = {"string": "a string", "integer": "an integer", "number": "a number", "boolean": "true or false",
+             "array": "a list", "object": "an object"}
+
+_TRUE = {"true", "yes", "y", "on", "1"}
+_FALSE = {"false", "no", "n", "off", "0"}
+_INTEGER = re.compile(r"\s*[+-]?\d+\s*\Z")
+
+# Marks a parameter without a default (None is a valid default)
+REQUIRED = object()
+
+
+class ArgumentError(ValueError):
+    """
+    Arguments that don't fit a command's signature. The message names every problem
+    and the expected signature, so it can be shown to the model to repair the call.
+    """
+
+    def __init__(self, command: str, problems: List[str], signature: str):
+        self.command = command
+        self.problems = problems
+        super().__init__(f"{'; '.join(problems)}. Expected {command}{signature}.")
+
+
+class _Mismatch(Exception):
+    pass
+
+
+# --- Coercion: LLMs send "5" for 5, 5 for "5", "true" for True and JSON strings for lists ---
+
+def _to_str(value):
+    if isinstance(value, str):
+        return value
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return str(value)
+    raise _Mismatch
+
+
+def _to_int(value):
+    if isinstance(value, bool):
+        raise _Mismatch
+    if isinstance(value, int):
+        return value
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    if isinstance(value, str) and _INTEGER.match(value):
+        return int(value)
+    raise _Mismatch
+
+
+def _to_float(value):
+    if isinstance(value, bool):
+        raise _Mismatch
+    if isinstance(value, (int, float)):
+        return float(value)
+    if isinstance(value, str):
+        try:
+            return float(value)
+        except ValueError:
+            pass
+    raise _Mismatch
+
+
+def _to_bool(value):
+    if isinstance(value, bool):
+        return value
+    if isinstance(value, int) and value in (0, 1):
+        return bool(value)
+    if isinstance(value, str):
+        text = value.strip().lower()
+        if text in _TRUE:
+            return True
+        if text in _FALSE:
+            return False
+    raise _Mismatch
+
+
+def _from_json(value, kind):
+    if isinstance(value, str) and value.strip()[:1] in "[{":
+        try:
+            value = json.loads(value)
+        except ValueError:
+            raise _Mismatch
+    if not isinstance(value, kind):
+        raise _Mismatch
+    return value
+
+
+def _to_list(value):
+    return list(value) if isinstance(value, tuple) else _from_json(value, list)
+
+
+def _to_dict(value):
+    return _from_json(value, dict)
+
+
+def _to_any(value):
+    return value
+
+
+COERCERS: Dict[Optional[str], Callable[[Any], Any]] = {
+    "string": _to_str, "integer": _to_int, "number": _to_float, "boolean": _to_bool,
+    "array": _to_list, "object": _to_dict, None: _to_any,
+}
+
+
+class Param:
+    """One compiled parameter: JSON type, optional item type or enum, and its coercer."""
+
+    __slots__ = ("name", "type", "items", "enum", "nullable", "default", "coerce", "coerce_item")
+
+    def __init__(self, name: str, json_type: Optional[str] = None, items: Optional[str] = None,
+                 enum: Optional[list] = None, nullable: bool = False, default: Any = REQUIRED):
+        self.name = name
+        self.type = json_type
+        self.items = items
+        self.enum = enum
+        self.nullable = nullable or default is None
+        self.default = default
+        self.coerce = COERCERS[json_type]
+        self.coerce_item = COERCERS[items] if items else None
+
+    @property
+    def required(self) -> bool:
+        return self.default is REQUIRED
+
+    def describe(self) -> str:
+        if self.enum is not None:
+            return "one of " + ", ".join(json.dumps(v) for v in self.enum)
+        if self.type == "array" and self.items:
+            return f"a list of {self.items} values"
+        return _DESCRIBE.get(self.type, "any value")
+
+    def check(self, value):
+        if value is None:
+            if self.nullable:
+                return None
+            raise _Mismatch
+        value = self.coerce(value)
+        if self.coerce_item is not None:
+            value = [self.coerce_item(item) for item in value]
+        if self.enum is not None and value not in self.enum:
+            # "Mute" for "mute": match case-insensitively before giving up
+            folded = {str(v).lower(): v for v in self.enum}
+            if str(value).lower() not in folded:
+                raise _Mismatch
+            value = folded[str(value).lower()]
+        return value
+
+    def json_schema(self) -> Dict[str, Any]:
+        schema = {"type": self.type} if self.type else {}
+        if self.items:
+            schema["items"] = {"type": self.items}
+        if self.enum is not None:
+            schema["enum"] = list(self.enum)
+        if not self.required and self.default is not None:
+            schema["default"] = self.default
+        return schema
+
+
+def _literal(node: ast.AST):
+    try:
+        return ast.literal_eval(node)
+    except (ValueError, SyntaxError, TypeError):
+        return REQUIRED
+
+
+def _annotation(node: Optional[ast.AST]) -> dict:
+    """Param keyword arguments (json_type, items, enum, nullable) for an annotation node."""
+    if node is None:
+        return {}
+    if isinstance(node, ast.Constant):
+        if node.value is None:
+            return {"nullable": True}
+        if isinstance(node.value, str):
+            # A string (forward reference) annotation
+            try:
+                return _annotation(ast.parse(node.value, mode="eval").body)
+            except SyntaxError:
+                return {}
+    if isinstance(node, ast.BinOp) and isinstance(node.op, ast.BitOr):
+        return _union([node.left, node.right])
+
+    if isinstance(node, ast.Subscript):
+        base = _name(node.value)
+        args = node.slice.elts if isinstance(node.slice, ast.Tuple) else [node.slice]
+        if base == "Optional":
+            return {**_annotation(args[0]), "nullable": True}
+        if base == "Union":
+            return _union(args)
+        if base == "Literal":
+            values = [_literal(arg) for arg in args]
+            values = [v for v in values if v is not REQUIRED]
+            kinds = {JSON_TYPES.get(type(v).__name__) for v in values}
+            return {"json_type": kinds.pop() if len(kinds) == 1 else None, "enum": values}
+        json_type = JSON_TYPES.get(base)
+        if json_type == "array" and base not in ("tuple", "Tuple"):
+            item = _annotation(args[0]).get("json_type")
+            return {"json_type": "array", "items": item} if item else {"json_type": "array"}
+        return {"json_type": json_type} if json_type else {}
+
+    json_type = JSON_TYPES.get(_name(node))
+    return {"json_type": json_type} if json_type else {}
+
+
+def _union(nodes: List[ast.AST]) -> dict:
+    nullable = any(isinstance(n, ast.Constant) and n.value is None for n in nodes)
+    options = [_annotation(n) for n in nodes if not (isinstance(n, ast.Constant) and n.value is None)]
+    spec = options[0] if len(options) == 1 else {}  # Union[int, str]: accept anything
+    return {**spec, "nullable": True} if nullable else spec
+
+
+def _name(node: ast.AST) -> str:
+    if isinstance(node, ast.Attribute):  # typing.List
+        return node.attr
+    return node.id if isinstance(node, ast.Name) else ""
+
+
+class CommandSchema:
+    """
+    A command's parameters compiled once from its signature string, e.g.
+    "(query: str, limit: int = 10)", so LLM-supplied args are validated and coerced
+    before the skill (or its module) is ever touched. Unannotated parameters accept
+    any value; a signature that can't be parsed disables validation.
+    """
+
+    def __init__(self, name: str, signature: str):
+        self.name = name
+        self.signature = signature
+        self.params: Dict[str, Param] = {}
+        self.extra = False  # **kwargs: unknown args are passed through
+        self.compiled = True
+        try:
+            args = ast.parse(f"def _{signature}: pass").body[0].args
+        except SyntaxError:
+            self.compiled = False
+            self.extra = True
+            args = None
+        if args is not None:
+            positional = args.posonlyargs + args.args
+            defaults = [None] * (len(positional) - len(args.defaults)) + list(args.defaults)
+            for arg, default in list(zip(positional, defaults)) + list(zip(args.kwonlyargs, args.kw_defaults)):
+                value = REQUIRED if default is None else _literal(default)
+                if default is not None and value is REQUIRED:
+                    value = None  # A default that isn't a literal: optional, but unknown
+                self.params[arg.arg] = Param(arg.arg, default=value, **_annotation(arg.annotation))
+            self.extra = args.kwarg is not None
+        self.required = [p.name for p in self.params.values() if p.required]
+        self._json_schema = None
+
+    def validate(self, args: Dict[str, Any]) -> Dict[str, Any]:
+        """Coerced copy of `args`; raises ArgumentError listing every problem at once."""
+        if not isinstance(args, dict):
+            raise ArgumentError(self.name, [f"arguments must be an object, got {json.dumps(args, default=str)}"],
+                                self.signature)
+        problems = []
+        coerced = {}
+        params = self.params
+        for key, value in args.items():
+            param = params.get(key)
+            if param is None:
+                if self.extra:
+                    coerced[key] = value
+                    continue
+                expected = ", ".join(params) if params else "none"
+                problems.append(f"unexpected argument '{key}' (accepted: {expected})")
+                continue
+            try:
+                coerced[key] = param.check(value)
+            except (_Mismatch, TypeError):
+                problems.append(f"'{key}' must be {param.describe()}, got {json.dumps(value, default=str)}")
+        for name in self.required:
+            if name not in args:
+                problems.append(f"missing required argument '{name}' ({params[name].describe()})")
+        if problems:
+            raise ArgumentError(self.name, problems, self.signature)
+        return coerced
+
+    def json_schema(self) -> Dict[str, Any]:
+        if self._json_schema is None:
+            if not self.compiled:
+                self._json_schema = {"type": "object"}
+            else:
+                self._json_schema = {"type": "object",
+                                     "properties": {n: p.json_schema() for n, p in self.params.items()},
+                                     "required": list(self.required)}
+        return self._json_schema
+
+    def tool(self, description: str, style: str = "openai") -> Dict[str, Any]:
+        """Tool/function definition: 'openai' (also Groq, OpenRouter, local servers) or 'anthropic'."""
+        if style == "anthropic":
+            return {"name": self.name, "description": description, "input_schema": self.json_schema()}
+        return {"type": "function",
+                "function": {"name": self.name, "description": description, "parameters": self.json_schema()}}
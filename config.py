@@ -12,13 +12,100 @@ try:
 except ValueError:
     MICROPHONE_INDEX = 1
 
+# Phrases accepted in place of the wake word at the start of an utterance
+WAKE_NAME_VARIANTS = [WAKE_WORD.lower(), "rj", "r j", "are jay", "archie", "rg"]
+WAKE_TRIGGERS = [
+    "hey", "hi", "hello", "okay", "ok", # Greetings
+    "can you", "could you", "please", "tell me" # Politeness
+]
+WAKE_WORD_VARIANTS = WAKE_NAME_VARIANTS + WAKE_TRIGGERS
+
+# Speech endpointing: the threshold tracks an EWMA of the room's background energy
+PAUSE_THRESHOLD = float(os.getenv("PAUSE_THRESHOLD", 1.2))  # Seconds of quiet that end a phrase
+PHRASE_TIME_LIMIT = float(os.getenv("PHRASE_TIME_LIMIT", 15))
+NOISE_FLOOR_ALPHA = float(os.getenv("NOISE_FLOOR_ALPHA", 0.05))
+ENERGY_RATIO = float(os.getenv("ENERGY_RATIO", 3.0))  # Speech threshold = floor * ratio
+ENERGY_THRESHOLD_MIN = float(os.getenv("ENERGY_THRESHOLD_MIN", 150))
+AUDIO_CALIBRATION_PATH = os.getenv("AUDIO_CALIBRATION_PATH", os.path.join("logs", "audio_calibration.json"))
+
+# Local gate before cloud ASR: 'auto' (enrolled templates plus PocketSphinx for WAKE_TRIGGERS,
+# or either alone), 'template', 'sphinx', 'off'. Templates only recognize the wake word: with
+# 'template' (or 'auto' without PocketSphinx), "can you open chrome" never reaches ASR.
+WAKE_GATE = os.getenv("WAKE_GATE", "auto").lower()
+WAKE_TEMPLATES_DIR = os.getenv("WAKE_TEMPLATES_DIR", os.path.join("logs", "wake_templates"))  # python wake_gate.py to enroll
+WAKE_MATCH_THRESHOLD = float(os.getenv("WAKE_MATCH_THRESHOLD", 0.25))  # Tune with benchmarks/wake_gate_bench.py
+# Seconds after a bare wake word ("RJ" -> "Yes?") during which the command needs no wake word
+WAKE_FOLLOW_UP = float(os.getenv("WAKE_FOLLOW_UP", 8))
+
+# Talking over the assistant interrupts it: speech BARGE_IN_RATIO times louder than
+# the speech threshold for BARGE_IN_MIN seconds stops TTS
+BARGE_IN = os.getenv("BARGE_IN", "true").lower() == "true"
+BARGE_IN_RATIO = float(os.getenv("BARGE_IN_RATIO", 2.0))
+BARGE_IN_MIN = float(os.getenv("BARGE_IN_MIN", 0.3))
+# Captured phrases waiting for recognition; the oldest is dropped beyond this
+PHRASE_QUEUE_SIZE = int(os.getenv("PHRASE_QUEUE_SIZE", 8))
+
 VOICE_OUTPUT = os.getenv("VOICE_OUTPUT", "true").lower() == "true"
 ALWAYS_ASK_PERMISSION = os.getenv("ALWAYS_ASK_PERMISSION", "false").lower() == "true"
 
+# --- Speech Output ---
+# Canned and frequently spoken phrases are pre-rendered to WAV and played from disk
+TTS_CACHE_ENABLED = os.getenv("TTS_CACHE_ENABLED", "true").lower() == "true"
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", os.path.join("logs", "tts_cache"))
+TTS_CACHE_MAX_BYTES = int(os.getenv("TTS_CACHE_MAX_BYTES", 50 * 1024 * 1024))
+TTS_CACHE_MIN_USES = int(os.getenv("TTS_CACHE_MIN_USES", 2))  # Render a phrase once it's been spoken this often
+TTS_CACHE_MAX_CHARS = int(os.getenv("TTS_CACHE_MAX_CHARS", 160))  # Longer answers rarely repeat
+TTS_WARM_TOP_N = int(os.getenv("TTS_WARM_TOP_N", 20))  # Most-spoken phrases rendered at startup
+TTS_SPOKEN_MAX_ROWS = int(os.getenv("TTS_SPOKEN_MAX_ROWS", 2000))  # Spoken-phrase counts kept, most recent first
+TTS_CACHE_PHRASES = [
+    "System online.", "Yes?", "Shutting down.", "Cancelled, Sir.", "Executing procedure now.",
+    "Workflow cancelled.", "I'm not sure how to do that.", "Fetching details from the web, Sir.",
+]
+
 # --- Provider Config ---
 # 'auto', 'openai', 'gemini', 'anthropic', 'groq', 'ollama'
 LLM_PROVIDER = os.getenv("LLM_PROVIDER", "auto").lower()
 
+# Stream completions so speech and command dispatch start before the JSON is complete
+LLM_STREAMING = os.getenv("LLM_STREAMING", "true").lower() == "true"
+
+# Backup providers take over when the primary fails or its circuit is open
+LLM_BACKUP_PROVIDERS = [p.strip().lower() for p in os.getenv("LLM_BACKUP_PROVIDERS", "").split(",") if p.strip()]
+# 'health': each request goes to the healthiest provider (lowest EWMA latency / error rate);
+# 'order': the configured order, skipping providers whose circuit is open
+LLM_ROUTING = os.getenv("LLM_ROUTING", "health").lower()
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", 30))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", 1))
+
+# Circuit breaker: a provider that can't be reached, fails LLM_BREAKER_FAILURES times in a
+# row or exceeds LLM_BREAKER_ERROR_RATE is skipped, and probed every LLM_PROBE_INTERVAL
+# seconds once LLM_BREAKER_COOLDOWN has passed (doubling up to LLM_BREAKER_MAX_COOLDOWN)
+LLM_HEALTH_ALPHA = float(os.getenv("LLM_HEALTH_ALPHA", 0.2))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", 3))
+LLM_BREAKER_ERROR_RATE = float(os.getenv("LLM_BREAKER_ERROR_RATE", 0.5))
+LLM_BREAKER_MIN_REQUESTS = int(os.getenv("LLM_BREAKER_MIN_REQUESTS", 5))
+LLM_BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", 5))
+LLM_BREAKER_MAX_COOLDOWN = float(os.getenv("LLM_BREAKER_MAX_COOLDOWN", 120))
+LLM_PROBE_INTERVAL = float(os.getenv("LLM_PROBE_INTERVAL", 2))
+LLM_PROBE_TIMEOUT = float(os.getenv("LLM_PROBE_TIMEOUT", 3))
+
+# Structured output: 'auto' uses each provider's native mode (a JSON schema generated from
+# the command registry for local servers, JSON mode for hosted OpenAI-compatible APIs, a
+# forced tool call for Anthropic); 'json_schema' / 'json_object' force one mode for the
+# OpenAI-compatible providers; 'off' relies on prompting alone. Servers that reject the
+# mode fall back to plain prompting automatically.
+LLM_STRUCTURED_OUTPUT = os.getenv("LLM_STRUCTURED_OUTPUT", "auto").lower()
+# Output budget (max_tokens): twice the longest recent reply, within these bounds
+LLM_MIN_OUTPUT_TOKENS = int(os.getenv("LLM_MIN_OUTPUT_TOKENS", 256))
+LLM_MAX_OUTPUT_TOKENS = int(os.getenv("LLM_MAX_OUTPUT_TOKENS", 1024))
+
+# Hedging: if the provider hasn't answered within its LLM_HEDGE_PERCENTILE latency, the
+# same request also goes to the next backup provider; the first valid intent wins
+LLM_HEDGE = os.getenv("LLM_HEDGE", "false").lower() == "true"
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", 95))
+LLM_HEDGE_DELAY = float(os.getenv("LLM_HEDGE_DELAY", 2.0))  # Used until enough latencies are observed
+LLM_HEDGE_MIN_DELAY = float(os.getenv("LLM_HEDGE_MIN_DELAY", 0.3))
+
 # --- API Keys ---
 KEYS = {
     "openai": os.getenv("OPENAI_API_KEY"),
@@ -33,13 +120,118 @@ REMOTE_CONFIG = {
     "discord_token": os.getenv("DISCORD_BOT_TOKEN"),
     "discord_channel_id": int(os.getenv("DISCORD_ALLOWED_CHANNEL_ID", 0) or 0),
     "telegram_token": os.getenv("TELEGRAM_BOT_TOKEN"),
-    "telegram_user_id": int(os.getenv("TELEGRAM_ALLOWED_USER_ID", 0) or 0)
+    "telegram_user_id": int(os.getenv("TELEGRAM_ALLOWED_USER_ID", 0) or 0),
+    # Worker threads shared by all bots, and queued + running commands allowed per user
+    "workers": int(os.getenv("REMOTE_WORKERS", 4)),
+    "max_queue": int(os.getenv("REMOTE_MAX_QUEUE", 5))
 }
 
 # --- Base URLs ---
 LOCAL_LLM_URL = os.getenv("LOCAL_LLM_URL", "http://localhost:11434/v1")
 LOCAL_MODEL_NAME = os.getenv("LOCAL_MODEL_NAME", "local-model")
 
+# --- Conversation Memory ---
+# Recent turns per session (voice, each Discord channel, each Telegram user) are sent with
+# every request so follow-ups ("open it", "the second one") work. Beyond the token budget,
+# older turns are compacted into one-line summaries; the newest KEEP_TURNS stay verbatim.
+CONVERSATION_MEMORY = os.getenv("CONVERSATION_MEMORY", "true").lower() == "true"
+CONVERSATION_TOKEN_BUDGET = int(os.getenv("CONVERSATION_TOKEN_BUDGET", 1200))
+CONVERSATION_KEEP_TURNS = int(os.getenv("CONVERSATION_KEEP_TURNS", 2))
+CONVERSATION_RESULT_CHARS = int(os.getenv("CONVERSATION_RESULT_CHARS", 400))  # Command output kept per turn
+CONVERSATION_IDLE_TIMEOUT = float(os.getenv("CONVERSATION_IDLE_TIMEOUT", 600))  # Seconds before starting over
+CONVERSATION_MAX_SESSIONS = int(os.getenv("CONVERSATION_MAX_SESSIONS", 100))
+
+# --- Prompt ---
+# Only the PROMPT_TOP_K most relevant commands are listed in the prompt (0 = list all)
+PROMPT_TOP_K = int(os.getenv("PROMPT_TOP_K", 8))
+# Commands the prompt always lists regardless of relevance
+PROMPT_ALWAYS_INCLUDE = [
+    c.strip() for c in os.getenv(
+        "PROMPT_ALWAYS_INCLUDE", "chat,search_and_summarize,get_page_text,save_workflow,run_workflow"
+    ).split(",") if c.strip()
+]
+
+# --- Skills ---
+# Register skills from a scanned manifest and import each module on first use
+LAZY_SKILLS = os.getenv("LAZY_SKILLS", "true").lower() == "true"
+# Import lazily registered skills in a background thread right after startup
+SKILL_PREWARM = os.getenv("SKILL_PREWARM", "false").lower() == "true"
+# Machine-local cache of each skill file's mtime and commands, rebuilt when a file changes
+SKILL_MANIFEST_PATH = os.getenv("SKILL_MANIFEST_PATH", os.path.join("logs", "skill_manifest.json"))
+
+# --- Intent Cache ---
+INTENT_CACHE_ENABLED = os.getenv("INTENT_CACHE_ENABLED", "true").lower() == "true"
+INTENT_CACHE_PATH = os.getenv("INTENT_CACHE_PATH", os.path.join("logs", "intent_cache.db"))
+INTENT_CACHE_TTL = int(os.getenv("INTENT_CACHE_TTL", 7 * 24 * 3600))  # Seconds
+INTENT_CACHE_MAX_ENTRIES = int(os.getenv("INTENT_CACHE_MAX_ENTRIES", 5000))
+
+# --- Web Cache ---
+HTTP_CACHE_ENABLED = os.getenv("HTTP_CACHE_ENABLED", "true").lower() == "true"
+HTTP_CACHE_PATH = os.getenv("HTTP_CACHE_PATH", os.path.join("logs", "http_cache.db"))
+HTTP_CACHE_MAX_BYTES = int(os.getenv("HTTP_CACHE_MAX_BYTES", 50 * 1024 * 1024))
+# Pages without caching headers or validators (dynamic pages, search results) aren't stored,
+# except from these hosts (and their subdomains), which are kept for HTTP_CACHE_DEFAULT_TTL seconds
+HTTP_CACHE_DEFAULT_TTL = int(os.getenv("HTTP_CACHE_DEFAULT_TTL", 300))
+HTTP_CACHE_DEFAULT_TTL_HOSTS = [h.strip().lower() for h in os.getenv("HTTP_CACHE_DEFAULT_TTL_HOSTS", "").split(",")
+                                if h.strip()]
+# get_page_text stops downloading after PAGE_MAX_BYTES and returns at most PAGE_MAX_CHARS
+PAGE_MAX_BYTES = int(os.getenv("PAGE_MAX_BYTES", 512 * 1024))
+PAGE_MAX_CHARS = int(os.getenv("PAGE_MAX_CHARS", 3000))
+# search_and_summarize fetches this many results in parallel and gives up on
+# stragglers after SEARCH_DEADLINE seconds; the best passages fill SEARCH_CONTEXT_CHARS
+SEARCH_RESULTS = int(os.getenv("SEARCH_RESULTS", 4))
+SEARCH_DEADLINE = float(os.getenv("SEARCH_DEADLINE", 4))
+SEARCH_CONTEXT_CHARS = int(os.getenv("SEARCH_CONTEXT_CHARS", 3000))
+
+# --- Notes ---
+NOTES_DB_PATH = os.getenv("NOTES_DB_PATH", os.path.join("logs", "notes.db"))
+# Plain-text notes file of older versions, imported into the database automatically
+NOTES_LEGACY_FILE = os.getenv("NOTES_LEGACY_FILE", os.path.join("logs", "notes.txt"))
+
+# --- Workflows ---
+# Independent workflow steps run concurrently on this many threads
+WORKFLOW_WORKERS = int(os.getenv("WORKFLOW_WORKERS", 4))
+# Default per-step limits; steps can override them with "timeout" / "retries"
+WORKFLOW_STEP_TIMEOUT = float(os.getenv("WORKFLOW_STEP_TIMEOUT", 60))  # Seconds, 0 = no limit
+WORKFLOW_RETRIES = int(os.getenv("WORKFLOW_RETRIES", 0))
+
+# --- System Monitor ---
+# A background thread samples CPU (per core), RAM, disk and network I/O every
+# SYSTEM_SAMPLE_INTERVAL seconds into a fixed-size ring buffer covering SYSTEM_HISTORY_MINUTES,
+# so system_info answers instantly and trends (min/avg/max) are available.
+SYSTEM_SAMPLER = os.getenv("SYSTEM_SAMPLER", "true").lower() == "true"
+SYSTEM_SAMPLE_INTERVAL = float(os.getenv("SYSTEM_SAMPLE_INTERVAL", 2))
+SYSTEM_HISTORY_MINUTES = float(os.getenv("SYSTEM_HISTORY_MINUTES", 60))
+# Top processes by CPU are refreshed less often (walking the process table costs more)
+SYSTEM_TOP_INTERVAL = float(os.getenv("SYSTEM_TOP_INTERVAL", 10))
+SYSTEM_TOP_PROCESSES = int(os.getenv("SYSTEM_TOP_PROCESSES", 5))
+
+# --- Jobs ---
+# Commands run as jobs on a shared pool. A caller waits up to JOB_FOREGROUND_WAIT seconds
+# for the result; a command still running then continues in the background and its result
+# is announced when done (ask for "job status" or "cancel job <id>" meanwhile).
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", 4))
+JOB_TIMEOUT = float(os.getenv("JOB_TIMEOUT", 30))  # Default per-command limit (seconds, 0 = none)
+JOB_FOREGROUND_WAIT = float(os.getenv("JOB_FOREGROUND_WAIT", 3))
+JOB_HISTORY = int(os.getenv("JOB_HISTORY", 50))  # Finished jobs kept for job_status
+
+# --- Logging ---
+DEBUG_LOG_PATH = os.getenv("DEBUG_LOG_PATH", os.path.join("logs", "debug.log"))
+
+# --- Telemetry ---
+# Every interaction is traced as spans (listen, recognize_google, parse_intent, llm.request,
+# execute, speak) written as JSON lines; per-stage and per-command latency histograms are
+# exported in the Prometheus text format to a file and, if a port is set, over HTTP.
+TELEMETRY_ENABLED = os.getenv("TELEMETRY_ENABLED", "true").lower() == "true"
+TELEMETRY_TRACE_PATH = os.getenv("TELEMETRY_TRACE_PATH", os.path.join("logs", "traces.jsonl"))
+TELEMETRY_TRACE_MAX_BYTES = int(os.getenv("TELEMETRY_TRACE_MAX_BYTES", 10 * 1024 * 1024))  # Then rotated to .1
+TELEMETRY_METRICS_PATH = os.getenv("TELEMETRY_METRICS_PATH", os.path.join("logs", "metrics.prom"))
+TELEMETRY_METRICS_INTERVAL = float(os.getenv("TELEMETRY_METRICS_INTERVAL", 15))  # Seconds between file writes
+TELEMETRY_METRICS_PORT = int(os.getenv("TELEMETRY_METRICS_PORT", 0))  # Serves /metrics on localhost, 0 = off
+# Recent-latency quantiles cover the last TELEMETRY_WINDOW seconds (at most this many samples per series)
+TELEMETRY_WINDOW = float(os.getenv("TELEMETRY_WINDOW", 300))
+TELEMETRY_WINDOW_SAMPLES = int(os.getenv("TELEMETRY_WINDOW_SAMPLES", 1000))
+
 # --- Constraints ---
 ALLOWED_PATHS = [
     os.path.abspath("workspace"),
@@ -0,0 +1,173 @@
+import codecs
+import re
+from html.parser import HTMLParser
+from typing import List, Optional
+import config
+from http_client import fetch
+
+# Never contain readable content
+SKIP_TAGS = {"script", "style", "noscript", "svg", "template", "iframe", "head", "canvas"}
+# Page chrome: kept, but heavily penalised when scoring
+CHROME_TAGS = {"nav", "header", "footer", "aside", "form", "menu"}
+# Tags that end a text block
+BLOCK_TAGS = {
+    "p", "div", "section", "article", "main", "li", "ul", "ol", "td", "th", "tr", "table",
+    "h1", "h2", "h3", "h4", "h5", "h6", "pre", "blockquote", "dd", "dt", "dl", "br", "hr",
+    "figcaption", "body", "html",
+} | CHROME_TAGS
+CONTENT_TAGS = {"article", "main"}
+VOID_TAGS = {"br", "hr", "img", "input", "meta", "link", "area", "base", "col", "embed", "source", "wbr"}
+
+_SPACES = re.compile(r"\s+")
+
+
+class Block:
+    __slots__ = ("text", "link_chars", "chrome", "content", "heading")
+
+    def __init__(self, text: str, link_chars: int, chrome: bool, content: bool, heading: bool):
+        self.text = text
+        self.link_chars = link_chars
+        self.chrome = chrome
+        self.content = content
+        self.heading = heading
+
+    @property
+    def link_density(self) -> float:
+        return self.link_chars / max(len(self.text), 1)
+
+    def score(self) -> float:
+        """Text-density score: long, link-poor text outside page chrome wins."""
+        words = len(self.text.split())
+        score = words * (1 - self.link_density) ** 2
+        if self.chrome:
+            score *= 0.1
+        if self.content:
+            score *= 1.5
+        return score
+
+
+class BlockParser(HTMLParser):
+    """
+    Incremental HTML-to-blocks parser. feed() can be called with partial markup as
+    it streams in; text is grouped into blocks at block-level tag boundaries.
+    """
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.blocks: List[Block] = []
+        self.title = ""
+        self._parts: List[str] = []
+        self._link_chars = 0
+        self._skip = 0
+        self._chrome = 0
+        self._content = 0
+        self._link = 0
+        self._heading = 0
+        self._in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag == "title":
+            self._in_title = True
+        if tag in SKIP_TAGS:
+            self._skip += 1
+        if tag in VOID_TAGS:
+            if tag in BLOCK_TAGS:
+                self._flush()
+            return
+        if tag in BLOCK_TAGS:
+            self._flush()
+        if tag in CHROME_TAGS:
+            self._chrome += 1
+        if tag in CONTENT_TAGS:
+            self._content += 1
+        if tag == "a":
+            self._link += 1
+        if tag in ("h1", "h2", "h3", "h4", "h5", "h6"):
+            self._heading += 1
+
+    def handle_endtag(self, tag):
+        if tag == "title":
+            self._in_title = False
+        if tag in SKIP_TAGS:
+            self._skip = max(self._skip - 1, 0)
+        if tag in BLOCK_TAGS:
+            self._flush()
+        if tag in CHROME_TAGS:
+            self._chrome = max(self._chrome - 1, 0)
+        if tag in CONTENT_TAGS:
+            self._content = max(self._content - 1, 0)
+        if tag == "a":
+            self._link = max(self._link - 1, 0)
+        if tag in ("h1", "h2", "h3", "h4", "h5", "h6"):
+            self._heading = max(self._heading - 1, 0)
+
+    def handle_data(self, data):
+        if self._in_title:
+            self.title += data
+            return
+        if self._skip:
+            return
+        self._parts.append(data)
+        if self._link:
+            self._link_chars += len(data.strip())
+
+    def close(self):
+        super().close()
+        self._flush()
+
+    def _flush(self):
+        text = _SPACES.sub(" ", "".join(self._parts)).strip()
+        if text:
+            self.blocks.append(Block(text, self._link_chars, bool(self._chrome), bool(self._content), bool(self._heading)))
+        self._parts = []
+        self._link_chars = 0
+
+
+def select_main_blocks(blocks: List[Block]) -> List[Block]:
+    """
+    Keeps the blocks that look like main content, in document order.
+    The threshold is relative to the best block, so short pages still yield text;
+    headings are kept when they sit right before a kept block.
+    """
+    if not blocks:
+        return []
+    best = max(block.score() for block in blocks)
+    threshold = max(best * 0.15, 3)
+
+    keep = [block.score() >= threshold and block.link_density < 0.5 for block in blocks]
+    for i, block in enumerate(blocks[:-1]):
+        if block.heading and not block.chrome and keep[i + 1]:
+            keep[i] = True
+    return [block for block, kept in zip(blocks, keep) if kept]
+
+
+def extract_main_text(url: str, max_bytes: int = None, max_chars: int = None, timeout: float = 10) -> str:
+    """
+    Streams `url` (stopping after `max_bytes`), parses it incrementally and returns
+    the main-content text, truncated to `max_chars` only after boilerplate is removed.
+    """
+    max_bytes = max_bytes or config.PAGE_MAX_BYTES
+    max_chars = max_chars or config.PAGE_MAX_CHARS
+
+    parser = BlockParser()
+    decoder = []
+
+    def on_chunk(chunk: bytes, charset: Optional[str]):
+        # Decode and parse each piece as it arrives instead of buffering the page
+        if not decoder:
+            try:
+                decoder.append(codecs.getincrementaldecoder(charset or "utf-8")(errors="replace"))
+            except LookupError:
+                decoder.append(codecs.getincrementaldecoder("utf-8")(errors="replace"))
+        parser.feed(decoder[0].decode(chunk))
+
+    response = fetch(url, timeout=timeout, max_bytes=max_bytes, on_chunk=on_chunk)
+    response.raise_for_status()
+    if decoder:
+        parser.feed(decoder[0].decode(b"", final=True))
+    parser.close()
+
+    text = "\n".join(block.text for block in select_main_blocks(parser.blocks))
+    if parser.title.strip():
+        text = parser.title.strip() + "\n" + text
+    return text[:max_chars]
@@ -0,0 +1,152 @@
+import json
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Optional
+import config
+from prompt_builder import count_tokens
+
+# Words that make an utterance depend on earlier turns ("open it", "the second one")
+FOLLOW_UP_WORDS = {
+    "it", "its", "that", "this", "those", "these", "them", "they", "there", "he", "she", "him", "her",
+    "one", "ones", "first", "second", "third", "last", "previous", "next", "another", "again",
+    "same", "more", "else", "also", "instead", "too", "then",
+}
+
+
+def needs_history(text: str) -> bool:
+    """True if the utterance likely refers back to the conversation (so its intent isn't reusable)."""
+    return any(word in FOLLOW_UP_WORDS for word in re.findall(r"[a-z']+", text.lower()))
+
+
+def _clip(text: str, limit: int) -> str:
+    text = " ".join(str(text).split())
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+class Turn:
+    """One exchange: the user's utterance, the intent the model answered with and the command's output."""
+
+    def __init__(self, user: str, intent: Dict[str, Any]):
+        self.user = user
+        self.intent = {k: intent[k] for k in ("command", "args", "response") if k in intent}
+        self.result = ""
+        self.tokens = 0
+        self._measure()
+
+    def set_result(self, result: Any):
+        self.result = _clip(result, config.CONVERSATION_RESULT_CHARS)
+        self._measure()
+
+    def messages(self) -> List[Dict[str, str]]:
+        reply = dict(self.intent)
+        if self.result:
+            reply["result"] = self.result
+        return [{"role": "user", "content": self.user},
+                {"role": "assistant", "content": json.dumps(reply, ensure_ascii=False)}]
+
+    def digest(self) -> str:
+        """One-line summary used once the turn is compacted out of the verbatim history."""
+        command = self.intent.get("command", "unknown")
+        line = f'- User: "{_clip(self.user, 100)}" -> {command}'
+        if self.intent.get("args"):
+            line += f" {_clip(json.dumps(self.intent['args'], ensure_ascii=False), 80)}"
+        if self.result:
+            line += f" = {_clip(self.result, 100)}"
+        elif command == "chat" and self.intent.get("response"):
+            line += f': "{_clip(self.intent["response"], 100)}"'
+        return line
+
+    def _measure(self):
+        self.tokens = sum(count_tokens(m["content"]) for m in self.messages())
+
+
+class Conversation:
+    """
+    Recent turns of one session, kept within CONVERSATION_TOKEN_BUDGET. Older turns
+    are compacted into one-line digests (the summary), which are themselves trimmed
+    oldest first once they outgrow a third of the budget. The newest
+    CONVERSATION_KEEP_TURNS turns always stay verbatim.
+    """
+
+    def __init__(self, budget: int = None):
+        self.budget = budget or config.CONVERSATION_TOKEN_BUDGET
+        self.turns = deque()
+        self.digests = deque()
+        self.last_active = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def tokens(self) -> int:
+        return sum(t.tokens for t in self.turns) + count_tokens(self.summary())
+
+    def summary(self) -> str:
+        return "\n".join(self.digests)
+
+    def history(self) -> List[Dict[str, str]]:
+        with self._lock:
+            return [m for turn in self.turns for m in turn.messages()]
+
+    def commands(self) -> List[str]:
+        with self._lock:
+            return [turn.intent.get("command") for turn in self.turns if turn.intent.get("command")]
+
+    def add(self, user: str, intent: Dict[str, Any]):
+        with self._lock:
+            self.turns.append(Turn(user, intent))
+            self.last_active = time.monotonic()
+            self._compact()
+
+    def set_result(self, result: Any):
+        """Attaches a command's output to the latest turn (e.g. the list a follow-up will refer to)."""
+        with self._lock:
+            if self.turns and result is not None:
+                self.turns[-1].set_result(result)
+                self._compact()
+
+    def _compact(self):
+        verbatim = sum(t.tokens for t in self.turns)
+        while len(self.turns) > config.CONVERSATION_KEEP_TURNS and verbatim > self.budget * 2 // 3:
+            turn = self.turns.popleft()
+            verbatim -= turn.tokens
+            self.digests.append(turn.digest())
+        while self.digests and count_tokens(self.summary()) > self.budget // 3:
+            self.digests.popleft()
+
+
+class ConversationMemory:
+    """
+    Conversations by session id ("voice", "discord:<channel>", "telegram:<user>").
+    A session idle for CONVERSATION_IDLE_TIMEOUT starts over; at most
+    CONVERSATION_MAX_SESSIONS are kept, least recently active dropped first.
+    """
+
+    def __init__(self):
+        self._sessions: "OrderedDict[str, Conversation]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, session: Optional[str]) -> Optional[Conversation]:
+        if session is None:
+            return None
+        with self._lock:
+            conversation = self._sessions.get(session)
+            if conversation is not None and \
+                    time.monotonic() - conversation.last_active > config.CONVERSATION_IDLE_TIMEOUT:
+                conversation = None
+            if conversation is None:
+                conversation = self._sessions[session] = Conversation()
+                while len(self._sessions) > config.CONVERSATION_MAX_SESSIONS:
+                    self._sessions.popitem(last=False)
+            self._sessions.move_to_end(session)
+            return conversation
+
+    def clear(self, session: str):
+        with self._lock:
+            self._sessions.pop(session, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            sessions = list(self._sessions.values())
+        return {"sessions": len(sessions), "turns": sum(len(c.turns) for c in sessions),
+                "tokens": sum(c.tokens for c in sessions)}
@@ -0,0 +1,309 @@
+import email.utils
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+from urllib.parse import urlparse
+import requests
+from requests.adapters import HTTPAdapter
+import config
+from job_executor import check_cancelled
+
+DEFAULT_HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
+}
+
+CHUNK_SIZE = 16 * 1024
+# Marks cached bodies that were cut at a byte cap
+TRUNCATED_HEADER = "x-rj-truncated"
+# The request headers a cached response's Vary names, with the values they were sent with
+VARY_HEADER = "x-rj-vary"
+
+_session = None
+_session_lock = threading.Lock()
+
+
+def get_session() -> requests.Session:
+    """Process-wide keep-alive session, so repeat hosts skip DNS/TCP/TLS setup."""
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=16, pool_maxsize=32)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                session.headers.update(DEFAULT_HEADERS)
+                _session = session
+    return _session
+
+
+class CachedResponse:
+    """The parts of a response the skills use, whether it came from the network or the cache."""
+
+    def __init__(self, url: str, status: int, headers: Dict[str, str], content: bytes,
+                 encoding: Optional[str], from_cache: bool = False):
+        self.url = url
+        self.status_code = status
+        self.headers = headers
+        self.content = content
+        self.encoding = encoding
+        self.from_cache = from_cache
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding or "utf-8", errors="replace")
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} Error for url: {self.url}")
+
+
+def _charset(headers: Dict[str, str]) -> Optional[str]:
+    match = re.search(r"charset=([\w.:-]+)", headers.get("content-type", ""), re.I)
+    return match.group(1).strip('"') if match else None
+
+
+def _download(url: str, response, max_bytes: Optional[int], on_chunk) -> CachedResponse:
+    """Reads a streamed response body, stopping once `max_bytes` have been received."""
+    headers = _lower(response.headers)
+    charset = _charset(headers)
+    chunks, received = [], 0
+    try:
+        for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+            check_cancelled()  # Stops the download once its job is cancelled or timed out
+            if max_bytes is not None and received + len(chunk) >= max_bytes:
+                chunk = chunk[:max_bytes - received]
+                headers[TRUNCATED_HEADER] = "1"
+            chunks.append(chunk)
+            received += len(chunk)
+            if on_chunk:
+                on_chunk(chunk, charset)
+            if TRUNCATED_HEADER in headers:
+                break
+    finally:
+        response.close()
+    return CachedResponse(url, response.status_code, headers, b"".join(chunks), charset)
+
+
+def _replay(response: CachedResponse, max_bytes: Optional[int], on_chunk) -> CachedResponse:
+    """Applies the same byte cap and chunk callback to a cached body."""
+    if max_bytes is not None and len(response.content) > max_bytes:
+        response.content = response.content[:max_bytes]
+    if on_chunk and response.content:
+        on_chunk(response.content, response.encoding)
+    return response
+
+
+def _lower(headers) -> Dict[str, str]:
+    """Header names are case-insensitive; keep them lower-cased once stored."""
+    return {k.lower(): v for k, v in headers.items()}
+
+
+def _variant(headers: Dict[str, str], sent: Dict[str, str]) -> Optional[str]:
+    """The request header values a response varies on (for VARY_HEADER), or None for "Vary: *"."""
+    names = sorted({name.strip().lower() for name in headers.get("vary", "").split(",") if name.strip()})
+    if "*" in names:
+        return None
+    return json.dumps({name: sent.get(name, "") for name in names})
+
+
+def _default_ttl_host(url: str) -> bool:
+    host = (urlparse(url).hostname or "").lower()
+    return any(host == h or host.endswith("." + h) for h in config.HTTP_CACHE_DEFAULT_TTL_HOSTS)
+
+
+def _freshness(url: str, headers: Dict[str, str], now: float) -> Optional[float]:
+    """
+    Expiry timestamp from Cache-Control / Expires / Last-Modified, or None if the
+    response must not be stored at all. A response with neither freshness information
+    nor a validator is only stored from HTTP_CACHE_DEFAULT_TTL_HOSTS.
+    """
+    cache_control = headers.get("cache-control", "").lower()
+    if "no-store" in cache_control or "private" in cache_control:
+        return None
+    if "no-cache" in cache_control:
+        return now
+    match = re.search(r"max-age=(\d+)", cache_control)
+    if match:
+        return now + int(match.group(1))
+    if "expires" in headers:
+        try:
+            return email.utils.parsedate_to_datetime(headers["expires"]).timestamp()
+        except (TypeError, ValueError):
+            return now
+    if "last-modified" in headers:
+        # Heuristic freshness: 10% of the document's age, capped at a day
+        try:
+            modified = email.utils.parsedate_to_datetime(headers["last-modified"]).timestamp()
+            return now + min(max(now - modified, 0) * 0.1, 86400)
+        except (TypeError, ValueError):
+            pass
+    if "etag" in headers or "last-modified" in headers:
+        return now  # Stored, but revalidated before every use
+    if _default_ttl_host(url):
+        return now + config.HTTP_CACHE_DEFAULT_TTL
+    return None
+
+
+class HTTPCache:
+    """
+    On-disk HTTP cache (SQLite) honoring Cache-Control, Expires, ETag, Last-Modified
+    and Vary (an entry only serves requests with the same values for the headers it
+    varies on). Stale entries with validators are revalidated with a conditional
+    request; the least recently used entries are evicted beyond `max_bytes`.
+    """
+
+    def __init__(self, path: str = None, max_bytes: int = None):
+        self.path = path or config.HTTP_CACHE_PATH
+        self.max_bytes = max_bytes or config.HTTP_CACHE_MAX_BYTES
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS pages ("
+            " url TEXT PRIMARY KEY, status INTEGER, headers TEXT, body BLOB, encoding TEXT,"
+            " expires REAL, size INTEGER, last_used REAL)"
+        )
+        self._db.commit()
+
+    def get(self, url: str, timeout: float = 10, max_bytes: int = None, on_chunk=None) -> CachedResponse:
+        now = time.time()
+        sent = _lower(get_session().headers)
+        with self._lock:
+            row = self._db.execute(
+                "SELECT status, headers, body, encoding, expires FROM pages WHERE url = ?", (url,)
+            ).fetchone()
+
+        if row:
+            stored = json.loads(row[1])
+            # A body cut at a smaller cap can't serve a request for more bytes
+            if stored.get(TRUNCATED_HEADER) and (max_bytes is None or max_bytes > len(row[2])):
+                row = None
+            # Nor can a variant for other values of the headers it varies on
+            elif stored.get(VARY_HEADER) != _variant(stored, sent):
+                row = None
+
+        if row and row[4] > now:
+            self._touch(url, now)
+            self.hits += 1
+            return _replay(CachedResponse(url, row[0], json.loads(row[1]), row[2], row[3], from_cache=True),
+                           max_bytes, on_chunk)
+
+        request_headers = {}
+        if row:
+            cached_headers = json.loads(row[1])
+            if "etag" in cached_headers:
+                request_headers["If-None-Match"] = cached_headers["etag"]
+            if "last-modified" in cached_headers:
+                request_headers["If-Modified-Since"] = cached_headers["last-modified"]
+
+        response = get_session().get(url, headers=request_headers, timeout=timeout, stream=True)
+
+        if response.status_code == 304 and row:
+            response.close()
+            headers = json.loads(row[1])
+            headers.update({k: v for k, v in _lower(response.headers).items() if k in ("cache-control", "expires", "etag")})
+            expires = _freshness(url, headers, now) or now
+            with self._lock:
+                self._db.execute("UPDATE pages SET headers = ?, expires = ?, last_used = ? WHERE url = ?",
+                                 (json.dumps(headers), expires, now, url))
+                self._db.commit()
+            self.revalidated += 1
+            return _replay(CachedResponse(url, row[0], headers, row[2], row[3], from_cache=True),
+                           max_bytes, on_chunk)
+
+        self.misses += 1
+        result = _download(url, response, max_bytes, on_chunk)
+        if response.status_code == 200:
+            self.store(result, now, sent)
+        return result
+
+    def store(self, response: CachedResponse, now: float = None, sent: Dict[str, str] = None):
+        """Stores `response`, which was fetched with the (lower-cased) request headers `sent`."""
+        now = now or time.time()
+        expires = _freshness(response.url, response.headers, now)
+        variant = _variant(response.headers, sent or {})
+        if expires is None or variant is None:
+            return
+        headers = dict(response.headers)
+        headers[VARY_HEADER] = variant
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO pages (url, status, headers, body, encoding, expires, size, last_used)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (response.url, response.status_code, json.dumps(headers), response.content,
+                 response.encoding, expires, len(response.content), now)
+            )
+            self._evict()
+            self._db.commit()
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM pages").fetchone()
+        lookups = self.hits + self.revalidated + self.misses
+        return {
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.revalidated) / lookups, 3) if lookups else 0.0,
+            "entries": entries,
+            "bytes": size,
+        }
+
+    def _touch(self, url: str, now: float):
+        with self._lock:
+            self._db.execute("UPDATE pages SET last_used = ? WHERE url = ?", (now, url))
+            self._db.commit()
+
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM pages").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for url, size in self._db.execute("SELECT url, size FROM pages ORDER BY last_used ASC").fetchall():
+            self._db.execute("DELETE FROM pages WHERE url = ?", (url,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def _get_cache() -> Optional[HTTPCache]:
+    global _cache
+    if _cache is None and config.HTTP_CACHE_ENABLED:
+        with _cache_lock:
+            if _cache is None:
+                _cache = HTTPCache()
+    return _cache
+
+
+def fetch(url: str, timeout: float = 10, max_bytes: int = None, on_chunk=None) -> CachedResponse:
+    """
+    GET through the shared session and the on-disk cache (if enabled).
+    The body is streamed: reading stops after `max_bytes`, and `on_chunk(bytes, charset)`
+    is called for every piece as it arrives (or once with the cached body).
+    """
+    check_cancelled()
+    cache = _get_cache()
+    if cache:
+        return cache.get(url, timeout=timeout, max_bytes=max_bytes, on_chunk=on_chunk)
+    response = get_session().get(url, timeout=timeout, stream=True)
+    return _download(url, response, max_bytes, on_chunk)
+
+
+def cache_stats() -> Optional[dict]:
+    """Hit/revalidation/miss counters of the HTTP cache (None if disabled)."""
+    cache = _get_cache()
+    return cache.stats() if cache else None
@@ -2,12 +2,16 @@
 import discord
 import config
 import logging
-from remote_handler import handle_remote_command
+from remote_handler import RemoteDispatcher
 
 # Suppress debug logs
 logging.getLogger('discord').setLevel(logging.WARNING)
 
 class AssistantBot(discord.Client):
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.dispatcher = RemoteDispatcher()
+
     async def on_ready(self):
         print(f'[Discord] Logged in as {self.user} (ID: {self.user.id})')
 
@@ -23,11 +27,12 @@ class AssistantBot(discord.Client):
 
         print(f"[Discord] Command from {message.author}: {message.content}")
         
-        # Execute Command
-        response = handle_remote_command(message.content)
-        
-        # Reply
-        await message.channel.send(f"🤖 **RJ**: {response}")
+        # Execute Command off the event loop (keeps heartbeats alive), replying when done
+        async def reply(text):
+            await message.channel.send(f"🤖 **RJ**: {text}")
+
+        await self.dispatcher.submit((message.channel.id, message.author.id), message.content, reply,
+                                     session=f"discord:{message.channel.id}")
 
 def run_discord():
     token = config.REMOTE_CONFIG["discord_token"]
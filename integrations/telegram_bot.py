@@ -3,11 +3,13 @@ import logging
 from telegram import Update
 from telegram.ext import ApplicationBuilder, ContextTypes, MessageHandler, filters
 import config
-from remote_handler import handle_remote_command
+from remote_handler import RemoteDispatcher
 
 # Suppress debug logs
 logging.getLogger('httpx').setLevel(logging.WARNING)
 
+dispatcher = RemoteDispatcher()
+
 async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     message_text = update.message.text
@@ -20,11 +22,11 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     print(f"[Telegram] Command from {user_id}: {message_text}")
     
-    # Execute Command
-    response = handle_remote_command(message_text)
-    
-    # Reply
-    await update.message.reply_text(f"🤖 **RJ**: {response}")
+    # Execute Command off the event loop, replying when done
+    async def reply(text):
+        await update.message.reply_text(f"🤖 **RJ**: {text}")
+
+    await dispatcher.submit(user_id, message_text, reply, session=f"telegram:{user_id}")
 
 def run_telegram():
     token = config.REMOTE_CONFIG["telegram_token"]
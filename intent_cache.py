@@ -0,0 +1,189 @@
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional
+import config
+
+# Words that carry no intent and only fragment the cache
+FILLER_WORDS = {
+    "please", "kindly", "um", "uh", "erm", "hmm", "just", "sir", "okay", "ok", "hey", "now",
+}
+
+_PUNCTUATION = re.compile(r"[^\w\s:/.-]")
+_SPACES = re.compile(r"\s+")
+
+
+def normalize_utterance(text: str) -> str:
+    """
+    Reduces an utterance to a canonical cache key form.
+    Mirrors the wake-word stripping done in AI_Assistant.execute_command, then drops
+    case, punctuation and filler words.
+    """
+    text = _PUNCTUATION.sub(" ", text.lower())
+    text = _SPACES.sub(" ", text).strip(" .")
+
+    # Strip stacked leading triggers ("hey rj can you ...")
+    stripped = True
+    while stripped:
+        stripped = False
+        for trigger in config.WAKE_WORD_VARIANTS:
+            if text == trigger or text.startswith(trigger + " "):
+                text = text[len(trigger):].strip()
+                stripped = True
+                break
+
+    wake_word = config.WAKE_WORD.lower()
+    return " ".join(w for w in text.split() if w != wake_word and w not in FILLER_WORDS)
+
+
+class IntentCache:
+    """
+    Two-level (memory + SQLite) cache for parsed intents.
+    Entries expire after `ttl` seconds and the least recently used ones are evicted
+    once `max_entries` is exceeded. Identical concurrent lookups share one computation.
+    """
+
+    def __init__(self, path: str = None, ttl: int = None, max_entries: int = None, memory_entries: int = 256):
+        self.path = path or config.INTENT_CACHE_PATH
+        self.ttl = ttl if ttl is not None else config.INTENT_CACHE_TTL
+        self.max_entries = max_entries or config.INTENT_CACHE_MAX_ENTRIES
+        self.memory_entries = memory_entries
+
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, tuple]" = OrderedDict()
+        self._inflight: Dict[str, Future] = {}
+
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS intents ("
+            " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+            " created REAL NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS intents_last_used ON intents(last_used)")
+        self._db.commit()
+
+    @staticmethod
+    def make_key(provider: str, model: Any, registry_fingerprint: str, text: str) -> str:
+        raw = "\x1f".join([provider, str(model), registry_fingerprint, normalize_utterance(text)])
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str) -> Optional[dict]:
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and now - entry[0] < self.ttl:
+                self._memory.move_to_end(key)
+                self.hits += 1
+                return json.loads(entry[1])
+
+            row = self._db.execute("SELECT value, created FROM intents WHERE key = ?", (key,)).fetchone()
+            if row and now - row[1] < self.ttl:
+                self._db.execute("UPDATE intents SET last_used = ? WHERE key = ?", (now, key))
+                self._db.commit()
+                self._remember(key, row[1], row[0])
+                self.hits += 1
+                return json.loads(row[0])
+
+            self.misses += 1
+            return None
+
+    def put(self, key: str, intent: dict):
+        now = time.time()
+        value = json.dumps(intent)
+        with self._lock:
+            self._remember(key, now, value)
+            self._db.execute(
+                "INSERT OR REPLACE INTO intents (key, value, created, last_used) VALUES (?, ?, ?, ?)",
+                (key, value, now, now)
+            )
+            self._evict(now)
+            self._db.commit()
+
+    def get_or_compute(self, key: str, compute: Callable[[], dict],
+                       storable: Callable[[dict], bool] = None) -> dict:
+        """
+        Returns the cached intent or runs `compute` once, even if several threads ask
+        for the same key at the same time. Exceptions propagate and are not cached;
+        neither are results `storable` rejects (they are still returned).
+        """
+        cached = self.get(key)
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            # Another thread may have finished the same lookup since our miss
+            entry = self._memory.get(key)
+            if entry and time.time() - entry[0] < self.ttl:
+                self.coalesced += 1
+                return json.loads(entry[1])
+
+            pending = self._inflight.get(key)
+            owner = pending is None
+            if owner:
+                pending = Future()
+                self._inflight[key] = pending
+            else:
+                self.coalesced += 1
+
+        if not owner:
+            return pending.result()
+
+        try:
+            intent = compute()
+            if storable is None or storable(intent):
+                self.put(key, intent)
+            pending.set_result(intent)
+            return intent
+        except BaseException as e:
+            pending.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries = self._db.execute("SELECT COUNT(*) FROM intents").fetchone()[0]
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            "entries": entries,
+        }
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._db.execute("DELETE FROM intents")
+            self._db.commit()
+
+    def _remember(self, key: str, created: float, value: str):
+        self._memory[key] = (created, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _evict(self, now: float):
+        self._db.execute("DELETE FROM intents WHERE created < ?", (now - self.ttl,))
+        count = self._db.execute("SELECT COUNT(*) FROM intents").fetchone()[0]
+        if count > self.max_entries:
+            self._db.execute(
+                "DELETE FROM intents WHERE key IN ("
+                " SELECT key FROM intents ORDER BY last_used ASC LIMIT ?)",
+                (count - self.max_entries,)
+            )
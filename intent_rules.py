@@ -0,0 +1,166 @@
+import re
+from collections import deque
+from typing import Any, Dict, List
+
+# Words dropped from extracted slots ("open my email" -> "email")
+SLOT_FILLERS = {"my", "the", "please", "a", "an"}
+# Leading connectives dropped from queries ("search for cats" -> "cats")
+SLOT_CONNECTIVES = {"for", "about", "up", "on", "that"}
+
+_TOKEN = re.compile(r"[a-z0-9][\w.:/'-]*")
+
+
+def _clean_slot(text: str) -> str:
+    words = [w for w in text.split() if w not in SLOT_FILLERS]
+    while words and words[0] in SLOT_CONNECTIVES:
+        words.pop(0)
+    return " ".join(words).strip(" .,")
+
+
+def _guess_url(target: str) -> str:
+    if "browser" in target or target == "":
+        return "https://google.com"
+    if "http" in target or ".com" in target:
+        return target
+    # Try to guess URL if not explicit
+    return f"https://{target.replace(' ', '')}.com"
+
+
+# Slot extractors available to rule templates. Each receives the lower-cased
+# input and the (start, end) character span of the matched trigger phrase.
+SLOT_EXTRACTORS = {
+    "text": lambda text, span: text.strip(),
+    "rest": lambda text, span: _clean_slot(text[span[1]:]),
+    "before": lambda text, span: _clean_slot(text[:span[0]]),
+    "remainder": lambda text, span: _clean_slot(text[:span[0]] + " " + text[span[1]:]),
+    "target": lambda text, span: _clean_slot(text[span[1]:]) or "the browser",
+    "url": lambda text, span: _guess_url(_clean_slot(text[span[1]:])),
+}
+
+
+class _Slots(dict):
+    """Computes slot values on first use so templates only pay for what they reference."""
+
+    def __init__(self, text: str, span: tuple):
+        super().__init__()
+        self._text = text
+        self._span = span
+
+    def __missing__(self, key):
+        if key not in SLOT_EXTRACTORS:
+            raise KeyError(f"Unknown slot '{key}'")
+        value = SLOT_EXTRACTORS[key](self._text, self._span)
+        self[key] = value
+        return value
+
+
+def _render(template: Any, slots: _Slots) -> Any:
+    if isinstance(template, str):
+        return template.format_map(slots)
+    if isinstance(template, dict):
+        return {k: _render(v, slots) for k, v in template.items()}
+    if isinstance(template, list):
+        return [_render(v, slots) for v in template]
+    return template
+
+
+class RuleEngine:
+    """
+    Offline intent matcher used when the LLM is unavailable.
+
+    Rules are declarative dicts contributed by skills at registration, e.g.
+        {"phrases": ["take note", "write note"], "args": {"content": "{rest}"},
+         "response": "Note saved, Sir.", "priority": 80}
+    All trigger phrases are compiled into one word-level Aho-Corasick automaton, so
+    matching is a single pass over the input regardless of the number of rules.
+    Phrases only match whole words; the highest-priority hit wins, ties go to the
+    earliest and then the longest phrase.
+    """
+
+    def __init__(self, registry):
+        self.registry = registry
+        self._version = -1
+        self._rules: List[Dict[str, Any]] = []
+        self._goto: List[Dict[str, int]] = []
+        self._fail: List[int] = []
+        self._out: List[List[tuple]] = []
+
+    def match(self, text: str) -> dict:
+        """Returns an intent dict, or an 'unknown' intent when no rule applies."""
+        self._ensure_compiled()
+        text = text.lower().strip()
+
+        best = None
+        for rule_index, start, end in self._scan(text):
+            rule = self._rules[rule_index]
+            rank = (rule["priority"], -start, end - start)
+            if best is None or rank > best[0]:
+                best = (rank, rule_index, (start, end))
+
+        if best is None:
+            return {"command": "unknown", "args": {}}
+
+        _, rule_index, span = best
+        rule = self._rules[rule_index]
+        slots = _Slots(text, span)
+        intent = {"command": rule["command"], "args": _render(rule.get("args", {}), slots)}
+        if rule.get("response"):
+            intent["response"] = _render(rule["response"], slots)
+        return intent
+
+    def _scan(self, text: str):
+        """Yields (rule_index, start_char, end_char) for every phrase occurrence."""
+        state = 0
+        starts = []
+        for token in _TOKEN.finditer(text):
+            word = token.group().rstrip(".:'-")
+            starts.append(token.start())
+
+            while state and word not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(word, 0)
+
+            for rule_index, length in self._out[state]:
+                yield rule_index, starts[-length], token.start() + len(word)
+
+    def _ensure_compiled(self):
+        if self._version == self.registry.version:
+            return
+
+        rules = []
+        for name, meta in self.registry._metadata.items():
+            for rule in meta.get("rules") or []:
+                compiled = dict(rule)
+                compiled.setdefault("command", name)
+                compiled.setdefault("priority", 0)
+                rules.append(compiled)
+
+        goto: List[Dict[str, int]] = [{}]
+        out: List[List[tuple]] = [[]]
+        for rule_index, rule in enumerate(rules):
+            for phrase in rule["phrases"]:
+                words = phrase.lower().split()
+                state = 0
+                for word in words:
+                    if word not in goto[state]:
+                        goto.append({})
+                        out.append([])
+                        goto[state][word] = len(goto) - 1
+                    state = goto[state][word]
+                out[state].append((rule_index, len(words)))
+
+        # Failure links (breadth-first), merging outputs of suffix states
+        fail = [0] * len(goto)
+        queue = deque(goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for word, child in goto[state].items():
+                queue.append(child)
+                f = fail[state]
+                while f and word not in goto[f]:
+                    f = fail[f]
+                fail[child] = goto[f].get(word, 0) if goto[f].get(word, 0) != child else 0
+                out[child] = out[child] + out[fail[child]]
+
+        self._rules, self._goto, self._fail, self._out = rules, goto, fail, out
+        self._version = self.registry.version
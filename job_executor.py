@@ -0,0 +1,293 @@
+import contextlib
+import contextvars
+import heapq
+import itertools
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+import config
+from command_registry import CommandRegistry, registry
+from command_schema import ArgumentError
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED, TIMED_OUT = "queued", "running", "done", "failed", "cancelled", "timed out"
+FINISHED = {DONE, FAILED, CANCELLED, TIMED_OUT}
+
+# Answered on the caller's thread: they must never wait behind the jobs they manage
+CONTROL_COMMANDS = {"job_status", "cancel_job"}
+
+_job = contextvars.ContextVar("job", default=None)
+# Extra cancellation flags of the current cancel_scope()s
+_scopes = contextvars.ContextVar("cancel_scopes", default=())
+
+
+class JobCancelled(Exception):
+    """Raised by check_cancelled() inside a command whose job was cancelled or timed out."""
+
+
+def current_job() -> Optional["Job"]:
+    return _job.get()
+
+
+def cancelled() -> bool:
+    job = _job.get()
+    if job is not None and job.cancel_event.is_set():
+        return True
+    return any(event.is_set() for event in _scopes.get())
+
+
+def check_cancelled():
+    """Cooperative cancellation point for long-running skills (a no-op outside a job)."""
+    if cancelled():
+        job = _job.get()
+        raise JobCancelled(f"Job {job.id} was {job.state}." if job and job.cancel_event.is_set() else "Cancelled.")
+
+
+@contextlib.contextmanager
+def cancel_scope(event: threading.Event):
+    """
+    check_cancelled() in the block also stops once `event` is set: for helper threads a
+    command fans out to (run them in a copy of its context to keep the job's flag too).
+    """
+    token = _scopes.set(_scopes.get() + (event,))
+    try:
+        yield
+    finally:
+        _scopes.reset(token)
+
+
+def _clip(text: Any, limit: int = 120) -> str:
+    text = " ".join(str(text).split())
+    return text if len(text) <= limit else text[:limit - 3] + "..."
+
+
+class Job:
+    """One command run on the job pool: its state, result and cancellation flag."""
+
+    def __init__(self, job_id: int, command: str, args: Dict[str, Any], timeout: float):
+        self.id = job_id
+        self.command = command
+        self.args = args
+        self.timeout = timeout
+        self.state = QUEUED
+        self.result = None
+        self.created = time.monotonic()
+        self.started = None
+        self.finished = None
+        self.cancel_event = threading.Event()
+        self._done = threading.Event()
+        self._callbacks = []
+        self._lock = threading.Lock()
+
+    @property
+    def done(self) -> bool:
+        return self._done.is_set()
+
+    @property
+    def elapsed(self) -> float:
+        start = self.started or self.created
+        return (self.finished or time.monotonic()) - start
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self._done.wait(timeout)
+
+    def add_done_callback(self, callback: Callable[["Job"], None]):
+        with self._lock:
+            if not self.done:
+                self._callbacks.append(callback)
+                return
+        callback(self)
+
+    def describe(self) -> str:
+        name = f"Job {self.id} ({self.command})"
+        if self.state == QUEUED:
+            return f"{name}: queued"
+        if self.state == RUNNING:
+            return f"{name}: running for {self.elapsed:.1f}s"
+        if self.state == DONE:
+            return f"{name}: done in {self.elapsed:.1f}s -> {_clip(self.result)}"
+        return f"{name}: {self.state} after {self.elapsed:.1f}s"
+
+    def _finish(self, state: str, result: Any = None) -> bool:
+        """Settles the job once; a late result from a timed-out or cancelled command is dropped."""
+        with self._lock:
+            if self.done:
+                return False
+            self.state = state
+            self.result = result
+            self.finished = time.monotonic()
+            self._done.set()
+            callbacks, self._callbacks = self._callbacks, []
+        for callback in callbacks:
+            try:
+                callback(self)
+            except Exception as e:
+                print(f"[Jobs] Callback for job {self.id} failed: {e}")
+        return True
+
+
+class JobExecutor:
+    """
+    Runs registry commands as jobs on a bounded pool, with per-command timeouts
+    (the command's `timeout`, else JOB_TIMEOUT) and cooperative cancellation.
+
+    Python threads can't be killed: a timed-out or cancelled job is settled at once
+    and its cancel flag set; commands that call check_cancelled() (or fetch through
+    http_client) stop at their next checkpoint, others finish and their result is dropped.
+    """
+
+    def __init__(self, command_registry: CommandRegistry = None, workers: int = None):
+        self.registry = command_registry or registry
+        self._pool = ThreadPoolExecutor(max_workers=workers or config.JOB_WORKERS, thread_name_prefix="job")
+        self._jobs: "OrderedDict[int, Job]" = OrderedDict()
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._deadlines = []  # Heap of (deadline, job id) for running jobs with a timeout
+        self._wakeup = threading.Condition()
+        self._watchdog = None
+
+    def submit(self, command: str, args: Dict[str, Any], confirm: bool = True, timeout: float = None) -> Job:
+        """
+        Validates the args and (for unsafe commands) asks for confirmation on the
+        caller's thread, then queues the command. Raises KeyError for an unknown
+        command, ArgumentError for bad args and PermissionError if the user declines.
+        `timeout` overrides the command's own (0 = no limit).
+        """
+        if not self.registry.has_command(command):
+            raise KeyError(command)
+        args = self.registry.validate(command, args)
+        if confirm and not self.registry.confirm(command, args):
+            raise PermissionError("Action cancelled by user.")
+
+        with self._lock:
+            job = Job(next(self._ids), command, args, self.registry.timeout(command) if timeout is None else timeout)
+            self._jobs[job.id] = job
+            self._prune()
+        # In the caller's context, so the command's execute span joins the caller's trace
+        self._pool.submit(contextvars.copy_context().run, self._run, job)
+        return job
+
+    def run(self, command: str, args: Dict[str, Any], wait: float = None,
+            on_done: Callable[[Job], None] = None) -> Any:
+        """
+        registry.execute on the job pool: returns the result, or an error string.
+        With `on_done`, the caller waits at most `wait` (JOB_FOREGROUND_WAIT) seconds; a
+        command still running then continues in the background, the reply says so and
+        on_done(job) gets the result later. Without it, waits until the job settles.
+        """
+        if command in CONTROL_COMMANDS:
+            return self.registry.execute(command, **args)
+        try:
+            job = self.submit(command, args)
+        except KeyError:
+            return f"Error: Command '{command}' is not supported."
+        except ArgumentError as e:
+            print(f"[Registry] Rejected {command} arguments: {e}")
+            return f"Argument Error: {e}"
+        except PermissionError as e:
+            return str(e)
+        return self.collect(job, wait, on_done)
+
+    def collect(self, job: Job, wait: float = None, on_done: Callable[[Job], None] = None) -> Any:
+        """The job's result, waiting as described in run()."""
+        if on_done is None:
+            job.wait()
+            return job.result
+        if job.wait(config.JOB_FOREGROUND_WAIT if wait is None else wait):
+            return job.result
+        job.add_done_callback(on_done)
+        return (f"Still working on {job.command.replace('_', ' ')}, Sir. It continues in the background "
+                f"as job {job.id}; I'll report back when it's done.")
+
+    def get(self, job_id: int) -> Optional[Job]:
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def status(self, job_id: int = None) -> str:
+        if job_id is not None:
+            job = self.get(job_id)
+            return job.describe() if job else f"There is no job {job_id}, Sir."
+        with self._lock:
+            jobs = list(self._jobs.values())
+        active = [job for job in jobs if not job.done]
+        recent = [job for job in jobs if job.done][-3:]
+        if not active and not recent:
+            return "No background jobs, Sir."
+        return "; ".join(job.describe() for job in active + recent)
+
+    def cancel(self, job_id: int) -> str:
+        job = self.get(job_id)
+        if job is None:
+            return f"There is no job {job_id}, Sir."
+        job.cancel_event.set()
+        if not job._finish(CANCELLED, f"Job {job.id} ({job.command}) was cancelled."):
+            return f"Job {job.id} already {job.state}, Sir."
+        return f"Job {job.id} ({job.command}) cancelled, Sir."
+
+    def stats(self) -> dict:
+        with self._lock:
+            jobs = list(self._jobs.values())
+        counts = {}
+        for job in jobs:
+            counts[job.state] = counts.get(job.state, 0) + 1
+        return counts
+
+    def shutdown(self):
+        """Cancels everything still queued or running."""
+        with self._lock:
+            jobs = [job for job in self._jobs.values() if not job.done]
+        for job in jobs:
+            self.cancel(job.id)
+        self._pool.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, job: Job):
+        if job.done:
+            return  # Cancelled while queued
+        job.state = RUNNING
+        job.started = time.monotonic()
+        if job.timeout:
+            self._watch(job)
+        _job.set(job)
+        try:
+            result = self.registry.invoke(job.command, job.args)
+            job._finish(DONE, result)
+        except JobCancelled:
+            job._finish(CANCELLED, f"Job {job.id} ({job.command}) was cancelled.")
+        except Exception as e:
+            job._finish(FAILED, f"Execution Error: {str(e)}")
+
+    def _watch(self, job: Job):
+        with self._wakeup:
+            heapq.heappush(self._deadlines, (job.started + job.timeout, job.id))
+            if self._watchdog is None:
+                self._watchdog = threading.Thread(target=self._watch_loop, name="job-watchdog", daemon=True)
+                self._watchdog.start()
+            self._wakeup.notify()
+
+    def _watch_loop(self):
+        while True:
+            with self._wakeup:
+                while not self._deadlines:
+                    self._wakeup.wait()
+                deadline, job_id = self._deadlines[0]
+                remaining = deadline - time.monotonic()
+                if remaining > 0:
+                    self._wakeup.wait(remaining)
+                    continue
+                heapq.heappop(self._deadlines)
+            job = self.get(job_id)
+            if job is not None and job._finish(
+                    TIMED_OUT, f"Execution Error: {job.command} timed out after {job.timeout:.3g}s."):
+                job.cancel_event.set()
+                print(f"[Jobs] Job {job.id} ({job.command}) timed out after {job.timeout:.3g}s.")
+
+    def _prune(self):
+        """Forgets the oldest finished jobs beyond JOB_HISTORY."""
+        finished = [job_id for job_id, job in self._jobs.items() if job.done]
+        for job_id in finished[:max(len(finished) - config.JOB_HISTORY, 0)]:
+            del self._jobs[job_id]
+
+
+# Global executor shared by the voice loop, the bots and the job commands
+jobs = JobExecutor(registry)
@@ -0,0 +1,266 @@
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+SENTENCE_ENDINGS = ".!?"
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+def _decode(raw: str) -> str:
+    """Decodes the body of a JSON string literal (without quotes)."""
+    try:
+        return json.loads('"' + raw + '"')
+    except ValueError:
+        return raw
+
+
+def _repair(text: str) -> Tuple[str, int]:
+    """
+    Closes whatever a truncated JSON document left open: an unterminated string, a
+    dangling key or comma, and the open objects/arrays. Trailing commas are dropped.
+    Returns the repaired text and how many containers were left open.
+    """
+    out = []
+    stack = []
+    in_string = escape = False
+    for ch in text:
+        if in_string:
+            out.append(ch)
+            if escape:
+                escape = False
+            elif ch == "\\":
+                escape = True
+            elif ch == '"':
+                in_string = False
+            continue
+        if ch == '"':
+            in_string = True
+        elif ch in "{[":
+            stack.append(_CLOSERS[ch])
+        elif ch in "}]":
+            # Drop a trailing comma before the closer
+            while out and out[-1].isspace():
+                out.pop()
+            if out and out[-1] == ",":
+                out.pop()
+            if stack:
+                stack.pop()
+            out.append(ch)
+            if not stack:
+                break
+            continue
+        out.append(ch)
+
+    repaired = "".join(out)
+    depth = len(stack)
+    if in_string:
+        if escape:
+            repaired = repaired[:-1]
+        repaired += '"'
+    if not stack:
+        return repaired, depth
+
+    repaired = repaired.rstrip()
+    if stack[-1] == "}":
+        # A key without a value ("key" or "key":) can't be completed; cut it
+        dangling = re.search(r'[{,]\s*"(?:[^"\\]|\\.)*"\s*:?\s*$', repaired)
+        if dangling:
+            repaired = repaired[:dangling.start() + 1]
+    repaired = repaired.rstrip().rstrip(",").rstrip(":")
+    return repaired + "".join(reversed(stack)), depth
+
+
+def salvage_intent(text: str) -> Dict[str, Any]:
+    """
+    Parses the model's intent as leniently as possible: markdown fences and prose
+    around the object are ignored, truncated JSON is closed, and tool-call shaped
+    output ({"name": ..., "arguments": ...}) is mapped onto command/args.
+    A reply that had to be closed gets "truncated": True: its response may be cut short.
+    Raises ValueError if no command can be recovered.
+    """
+    start = text.find("{")
+    if start == -1:
+        raise ValueError(f"No JSON object in model output: {text[:80]!r}")
+    body = text[start:]
+    depth = 0
+    try:
+        intent, _ = json.JSONDecoder().raw_decode(body)
+    except ValueError:
+        repaired, depth = _repair(body)
+        if depth > 1:
+            # Cut off inside args (or another nested value): running it half-filled would be wrong
+            raise ValueError("Model output was cut off inside a nested value.")
+        intent = json.loads(repaired)
+    if not isinstance(intent, dict):
+        raise ValueError("Model output is not a JSON object.")
+
+    if "command" not in intent and "name" in intent:
+        intent = {"command": intent["name"], "args": intent.get("arguments", intent.get("args", {})),
+                  "response": intent.get("response", "")}
+    if not isinstance(intent.get("command"), str) or not intent["command"]:
+        raise ValueError("Model output has no command.")
+    args = intent.get("args")
+    if isinstance(args, str):
+        try:
+            args = json.loads(args)
+        except ValueError:
+            args = None
+    intent["args"] = args if isinstance(args, dict) else {}
+    if depth:
+        intent["truncated"] = True
+    return intent
+
+
+class IncrementalIntentParser:
+    """
+    Incremental parser for the intent object streamed by the LLM:
+        { "command": "...", "args": {...}, "response": "..." }
+
+    `feed()` accepts arbitrary chunks and returns the events that became available:
+        ("command", name)          once the command string is closed
+        ("args", dict)             once the args object is closed
+        ("sentence", text)         for every finished sentence of 'response'
+    Anything before the first '{' (e.g. a ```json fence) is ignored.
+    """
+
+    def __init__(self):
+        self.buffer = ""
+        self.command: Optional[str] = None
+        self.args: Optional[Dict[str, Any]] = None
+        self.response = ""
+
+        self._started = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._key: Optional[str] = None
+        self._expect = "key"          # "key" | "colon" | "value" | "comma"
+        self._token_start = 0
+        self._sentence_raw = ""
+        self._response_raw = ""
+        self._done = False
+
+    @property
+    def has_response(self) -> bool:
+        """True once any part of the 'response' string has been received."""
+        return bool(self.response or self._response_raw)
+
+    def feed(self, chunk: str) -> List[Tuple[str, Any]]:
+        events: List[Tuple[str, Any]] = []
+        base = len(self.buffer)
+        self.buffer += chunk
+        for offset, ch in enumerate(chunk):
+            pos = base + offset
+            if self._done:
+                break
+            if not self._started:
+                if ch == "{":
+                    self._started = True
+                    self._depth = 1
+                continue
+            self._step(ch, pos, events)
+        return events
+
+    def finish(self) -> Tuple[Dict[str, Any], List[Tuple[str, Any]]]:
+        """Returns the complete intent plus any trailing events (last sentence)."""
+        events: List[Tuple[str, Any]] = []
+        if self._sentence_raw.strip():
+            events.append(("sentence", _decode(self._sentence_raw).strip()))
+            self._sentence_raw = ""
+
+        try:
+            intent = salvage_intent(self.buffer)
+        except ValueError:
+            intent = None
+        if intent is None:
+            intent = {"command": self.command or "unknown", "args": self.args or {}}
+            if not self._done:
+                intent["truncated"] = True
+            response = self.response or _decode(self._response_raw.rstrip("\\")).strip()
+            if response:
+                intent["response"] = response
+        return intent, events
+
+    def _step(self, ch: str, pos: int, events: List[Tuple[str, Any]]):
+        top_level = self._depth == 1
+
+        if self._in_string:
+            if top_level and self._expect == "comma" and self._key == "response" and self._token_start:
+                self._response_char(ch, events)
+            if self._escape:
+                self._escape = False
+            elif ch == "\\":
+                self._escape = True
+            elif ch == '"':
+                self._in_string = False
+                if top_level:
+                    self._string_closed(pos, events)
+            return
+
+        if ch == '"':
+            self._in_string = True
+            if top_level:
+                self._token_start = pos + 1
+                if self._expect == "value":
+                    self._expect = "comma"
+                    if self._key == "response":
+                        self._sentence_raw = ""
+            return
+
+        if ch in "{[":
+            if top_level and self._expect == "value":
+                self._token_start = pos
+                self._expect = "comma"
+            self._depth += 1
+        elif ch in "}]":
+            self._depth -= 1
+            if self._depth == 1 and self._key == "args":
+                try:
+                    self.args = json.loads(self.buffer[self._token_start:pos + 1])
+                    events.append(("args", self.args))
+                except ValueError:
+                    pass
+            elif self._depth == 0:
+                self._done = True
+        elif top_level:
+            if ch == ":" and self._expect == "colon":
+                self._expect = "value"
+            elif ch == ",":
+                self._expect = "key"
+                self._key = None
+            elif not ch.isspace() and self._expect == "value":
+                # Scalar (number, null, true...) value; nothing to stream
+                self._expect = "comma"
+
+    def _string_closed(self, pos: int, events: List[Tuple[str, Any]]):
+        raw = self.buffer[self._token_start:pos]
+        if self._expect == "key":
+            self._key = _decode(raw)
+            self._expect = "colon"
+            return
+
+        # A top-level string value just ended
+        value = _decode(raw)
+        if self._key == "command":
+            self.command = value
+            events.append(("command", value))
+        elif self._key == "response":
+            self.response = value
+            tail = self._sentence_raw[:-1] if self._sentence_raw.endswith('"') else self._sentence_raw
+            if tail.strip():
+                events.append(("sentence", _decode(tail).strip()))
+            self._sentence_raw = ""
+        self._token_start = 0
+
+    def _response_char(self, ch: str, events: List[Tuple[str, Any]]):
+        self._sentence_raw += ch
+        if ch != '"' or self._escape:
+            self._response_raw += ch
+        if not ch.isspace():
+            return
+        stripped = self._sentence_raw.rstrip()
+        if stripped and stripped[-1] in SENTENCE_ENDINGS and not stripped.endswith("\\"):
+            sentence = _decode(stripped).strip()
+            if sentence:
+                events.append(("sentence", sentence))
+            self._sentence_raw = ""
@@ -1,216 +1,357 @@
 
-import json
-import os
-import openai
-import google.generativeai as genai
 import config
+import telemetry
 from command_registry import registry
+from conversation import ConversationMemory, needs_history
+from intent_cache import IntentCache, normalize_utterance
+from intent_rules import RuleEngine
+from json_stream import IncrementalIntentParser, salvage_intent
+from llm_providers import LLMRequest, Provider, detect_provider, hedged_complete, hedged_stream
+from prompt_builder import PromptBuilder
+from provider_health import ProviderRouter
 
 class LLMEngine:
     def __init__(self):
         self.provider = config.LLM_PROVIDER
-        self.client = None
-        self.model = ""
-
-        # Auto-detect logic
         if self.provider == "auto":
-            if config.KEYS["openai"]:
-                self.provider = "openai"
-                self.model = "gpt-3.5-turbo"
-            elif config.KEYS["gemini"]:
-                self.provider = "gemini"
-                self.model = "gemini-pro"
-            elif config.KEYS["anthropic"]:
-                self.provider = "anthropic"
-                self.model = "claude-3-opus-20240229"
-            elif config.KEYS["groq"]:
-                self.provider = "groq"
-                self.model = "llama3-70b-8192"
-            elif config.KEYS["openrouter"]:
-                self.provider = "openrouter"
-                self.model = "openai/gpt-3.5-turbo" # Default free/cheap model on OpenRouter
-            else:
-                self.provider = "local" # Default to local if no keys
+            self.provider = detect_provider() # Default to local if no keys
 
         # Initialize Client based on Provider
-        if self.provider == "openai":
-            self.client = openai.OpenAI(api_key=config.KEYS["openai"])
-            self.model = "gpt-3.5-turbo"
-            
-        elif self.provider == "gemini":
-            genai.configure(api_key=config.KEYS["gemini"])
-            self.model = genai.GenerativeModel('gemini-pro')
-            
-        elif self.provider == "anthropic":
-            from anthropic import Anthropic
-            self.client = Anthropic(api_key=config.KEYS["anthropic"])
-            self.model = "claude-3-opus-20240229"
-
-        elif self.provider == "groq":
-            self.client = openai.OpenAI(
-                base_url="https://api.groq.com/openai/v1",
-                api_key=config.KEYS["groq"]
-            )
-            self.model = "llama3-70b-8192"
-
-        elif self.provider == "openrouter":
-            self.client = openai.OpenAI(
-                base_url="https://openrouter.ai/api/v1",
-                api_key=config.KEYS["openrouter"]
-            )
-            # You can change this to any model supported by OpenRouter
-            self.model = "openai/gpt-3.5-turbo"
-            
-        elif self.provider == "local" or self.provider == "ollama":
-            self.client = openai.OpenAI(
-                base_url=config.LOCAL_LLM_URL,
-                api_key="lm-studio" # Dummy key
-            )
-            self.model = config.LOCAL_MODEL_NAME
-
-        print(f"LLM Engine Initialized: Provider={self.provider}, Model={self.model}")
-
-    def parse_intent(self, user_input: str, context: str = ""):
+        self.providers = []
+        try:
+            self.providers.append(Provider(self.provider))
+        except Exception as e:
+            print(f"LLM provider '{self.provider}' unavailable: {e}")
+        self.client = self.providers[0].client if self.providers else None
+        self.model = self.providers[0].model if self.providers else ""
+
+        # Backup providers: failed over to when the primary is down, and raced against it
+        # when it is slower than usual (LLM_HEDGE)
+        if self.providers:
+            for name in config.LLM_BACKUP_PROVIDERS:
+                if name == self.provider or (name not in ("local", "ollama") and not config.KEYS.get(name)):
+                    continue
+                try:
+                    self.providers.append(Provider(name))
+                except Exception as e:
+                    print(f"Backup provider '{name}' unavailable: {e}")
+
+        # Routes each request to the healthiest provider and probes the ones that are down
+        self.router = ProviderRouter(self.providers)
+        self.router.start()
+
+        self.rules = RuleEngine(registry)
+        self.prompts = PromptBuilder(registry)
+
+        # Recent turns per session, so follow-ups like "open it" can be resolved
+        self.memory = ConversationMemory() if config.CONVERSATION_MEMORY else None
+
+        self.cache = None
+        if config.INTENT_CACHE_ENABLED:
+            try:
+                self.cache = IntentCache()
+            except Exception as e:
+                print(f"Intent cache disabled: {e}")
+
+        backups = ", ".join(p.name for p in self.providers[1:])
+        print(f"LLM Engine Initialized: Provider={self.provider}, Model={self.model}"
+              + (f", Backups: {backups}" if backups else ""))
+
+    def prompt_stats(self):
+        """Character and token size of the cacheable system-prompt prefix."""
+        return self.prompts.prefix_size()
+
+    def cache_stats(self):
+        """Hit/miss counters of the intent cache (None if disabled)."""
+        return self.cache.stats() if self.cache else None
+
+    def health_stats(self):
+        """Per-provider circuit state, EWMA latency and error rate."""
+        return self.router.stats()
+
+    def remember_result(self, session: str, result):
+        """Attaches a command's output to the session's latest turn, for follow-ups about it."""
+        conversation = self.memory.get(session) if self.memory else None
+        if conversation is not None:
+            conversation.set_result(result)
+
+    def parse_intent(self, user_input: str, context: str = "", session: str = None):
         """
         Analyzes user input and returns a structured command JSON.
+        With a `session`, the conversation so far is sent along and this turn is remembered.
         """
+        conversation = self.memory.get(session) if self.memory else None
+        with telemetry.span("parse_intent", streaming=False, session=session) as span:
+            intent = self._parse_intent(user_input, context, conversation)
+            span.set(command=intent.get("command"))
+        if conversation is not None:
+            conversation.add(user_input, intent)
+        return intent
+
+    def _parse_intent(self, user_input: str, context: str, conversation):
         # If no client initialized (e.g. no keys and local server down), use fallback
-        if not self.client and self.provider != "gemini":
+        if not self.providers:
              return self._fallback_parser(user_input)
 
-        context_info = f"\nADDITIONAL CONTEXT (Retrieved Info):\n{context}\n" if context else ""
-
-        system_prompt = f"""
-        You are RJ, a helpful AI Desktop Assistant (modeled after JARVIS).
-        Your goal is to assist the user by executing commands or chatting helpfully.
-        
-        AVAILABLE COMMANDS:
-        {registry.list_commands()}
-        - chat: Use this for general conversation, questions, or confirming actions.
-        
-        EFFICIENCY & WORKFLOWS:
-        1. If the user asks you to "remember how to do [X]" or "teach you [X]", use `save_workflow`.
-           - 'commands' in `save_workflow` should be a list: [{{ "command": "...", "args": {{...}} }}, ...]
-        2. If the user wants to execute a stored procedure, use `run_workflow`.
-        3. You can suggest creating a workflow if you see the user repeating tasks.
-        
-        INFORMATION RETRIEVAL:
-        - If the user asks a factual question (e.g., "What is the weather in Delhi?"), use `search_and_summarize`.
-        - If the user provides a URL and asks about it, use `get_page_text`.
-        - If you have context provided below, use it to answer the user's question in the 'response' field.
-        {context_info}
-        
-        RULES:
-        1. ALWAYS output a conversational 'response' field in your JSON. This is what you will say to the user via TTS.
-        2. If executing a command, set the 'command' and 'args' fields.
-        3. ALWAYS request permission for risky commands or before starting a complex workflow by chatting first.
-        4. Be concise, professional, and efficient. Address the user as "Sir" occasionally.
-        
-        OUTPUT FORMAT EXAMPLE:
-        {{ "command": "search_and_summarize", "args": {{ "query": "current time in London" }}, "response": "Checking the time in London for you, Sir." }}
-        
-        Strict JSON Output Only. No markdown.
+        try:
+            if self._cacheable(user_input, context, conversation):
+                key = self._cache_key(user_input)
+                telemetry.tag(source="cache")  # Replaced by the provider's if it's a miss
+                answered = []
+                return self.cache.get_or_compute(
+                    key, lambda: self._query_llm(user_input, conversation=conversation, answered=answered),
+                    storable=lambda intent: self._storable(intent, answered))
+            return self._query_llm(user_input, context, conversation=conversation)
+
+        except Exception as e:
+            print(f"LLM Error ({self.provider}): {e}")
+            return self._fallback_parser(user_input)
+
+    def stream_intent(self, user_input: str, context: str = "", on_sentence=None, on_command=None,
+                      session: str = None):
         """
+        Streaming variant of parse_intent.
+        Calls on_command(name, args) as soon as both are complete and on_sentence(text)
+        for every finished sentence of the 'response' field, then returns the full intent.
+        """
+        conversation = self.memory.get(session) if self.memory else None
+        with telemetry.span("parse_intent", streaming=True, session=session) as span:
+            intent = self._stream_intent(user_input, context, on_sentence, on_command, conversation)
+            span.set(command=intent.get("command"))
+        if conversation is not None:
+            conversation.add(user_input, intent)
+        return intent
+
+    def _stream_intent(self, user_input: str, context: str, on_sentence, on_command, conversation):
+        if not self.providers:
+            return self._emit_intent(self._fallback_parser(user_input), on_sentence, on_command)
+
+        key = self._cache_key(user_input) if self._cacheable(user_input, context, conversation) else None
+        if key:
+            cached = self.cache.get(key)
+            if cached is not None:
+                telemetry.tag(source="cache")
+                return self._emit_intent(cached, on_sentence, on_command)
+
+        parser = IncrementalIntentParser()
+        command_sent = False
+        commands = self._select_commands(user_input, conversation)
+        answered = []  # The provider that streamed the reply
+        spoken = []
+        # While a shortlist reply says "unknown" its sentences are held back: the full-catalog
+        # retry may find the command, and its response would contradict them
+        held = []
+
+        def say(sentence):
+            if commands is not None and parser.command in (None, "unknown"):
+                held.append(sentence)
+                return
+            for text in held + [sentence]:
+                spoken.append(text)
+                if on_sentence:
+                    on_sentence(text)
+            held.clear()
 
         try:
-            response_text = ""
-            
-            # --- OPENAI / GROQ / LOCAL / OPENROUTER ---
-            if self.provider in ["openai", "groq", "local", "ollama", "openrouter"]:
-                response = self.client.chat.completions.create(
-                    model=self.model,
-                    messages=[
-                        {"role": "system", "content": system_prompt},
-                        {"role": "user", "content": user_input}
-                    ],
-                    temperature=0.0
-                )
-                response_text = response.choices[0].message.content
-
-            # --- GEMINI ---
-            elif self.provider == "gemini":
-                chat = self.model.start_chat(history=[])
-                response = chat.send_message(system_prompt + "\nUSER: " + user_input)
-                response_text = response.text
-
-            # --- ANTHROPIC ---
-            elif self.provider == "anthropic":
-                message = self.client.messages.create(
-                    model=self.model,
-                    max_tokens=100,
-                    system=system_prompt,
-                    messages=[{"role": "user", "content": user_input}]
-                )
-                response_text = message.content[0].text
-
-            # Cleanup JSON (sometimes models add markdown ```json ... ```)
-            clean_json = response_text.replace("```json", "").replace("```", "").strip()
-            return json.loads(clean_json)
+            for chunk in self._stream_llm(user_input, context, commands, conversation, answered):
+                for kind, value in parser.feed(chunk):
+                    if kind == "sentence":
+                        say(value)
+                    elif not command_sent and parser.command and parser.args is not None:
+                        command_sent = True
+                        if on_command:
+                            on_command(parser.command, parser.args)
+
+            intent, tail = parser.finish()
+            truncated = intent.get("truncated")
+            if truncated:
+                # Cut off by the output budget: the last half sentence isn't spoken, and the
+                # request is retried with a bigger budget (the retry also covers "unknown")
+                if answered:
+                    answered[0].budget.expand()
+                intent = self._query_llm(user_input, context, conversation=conversation, retried=True,
+                                         answered=answered)
+                rest = self._unspoken(intent.get("response") or "", spoken)
+                if rest and on_sentence and not intent.get("truncated"):
+                    on_sentence(rest)
+                if command_sent and (intent.get("command"), intent.get("args", {})) != (parser.command, parser.args):
+                    command_sent = False  # on_command gets the corrected command below
+                tail = []
+                held.clear()
+            for kind, value in tail:
+                if kind == "sentence":
+                    say(value)
+
+            if commands is not None and intent.get("command") == "unknown" and not truncated:
+                # The command may simply not have been in the shortlist
+                intent = self._query_llm(user_input, context, full_catalog=True, conversation=conversation,
+                                         answered=answered)
+                if intent.get("command") != "unknown":
+                    command_sent = False
+                    held.clear()
+                    self._emit_intent(intent, on_sentence)
+            if held and on_sentence:
+                # Still unknown: the first reply's "not sure" sentences stand
+                for text in held:
+                    on_sentence(text)
+
+            if not command_sent and on_command and intent.get("command"):
+                on_command(intent.get("command"), intent.get("args", {}))
+
+            if key and self._storable(intent, answered):
+                self.cache.put(key, intent)
+            return intent
 
         except Exception as e:
             print(f"LLM Error ({self.provider}): {e}")
-            return self._fallback_parser(user_input)
+            if command_sent:
+                # The command is already running; keep whatever the model got out
+                intent, _ = parser.finish()
+                return intent
+            on_sentence = None if spoken else on_sentence
+            return self._emit_intent(self._fallback_parser(user_input), on_sentence, on_command)
+
+    def _emit_intent(self, intent: dict, on_sentence=None, on_command=None):
+        """Replays an already complete intent through the streaming callbacks."""
+        if on_command and intent.get("command"):
+            on_command(intent.get("command"), intent.get("args", {}))
+        if on_sentence and intent.get("response"):
+            on_sentence(intent["response"])
+        return intent
+
+    @staticmethod
+    def _unspoken(response: str, spoken) -> str:
+        """The part of `response` after the sentences already spoken ("" if it says something else)."""
+        words, said = response.split(), " ".join(spoken).split()
+        if words[:len(said)] != said:
+            return ""
+        return " ".join(words[len(said):])
+
+    def _storable(self, intent: dict, answered) -> bool:
+        """
+        Whether an intent may be cached under _cache_key. Only complete replies from the
+        primary provider qualify: the key names the primary's model, and a reply cut off
+        by the output budget would be replayed for INTENT_CACHE_TTL. Chat replies aren't
+        cached either: normalization folds differently worded small talk onto one key.
+        """
+        if intent.get("command") == "chat":
+            return False
+        return not intent.get("truncated") and bool(answered) and answered[-1] is self.providers[0]
+
+    def _cacheable(self, user_input: str, context: str, conversation) -> bool:
+        """
+        Retrieved context changes per call, and follow-ups ("open it") depend on the
+        conversation, so only self-contained utterances are served from the cache.
+        Greetings ("hi", "hey rj") normalize to nothing and would all share one key.
+        """
+        if not self.cache or context or not normalize_utterance(user_input):
+            return False
+        return not (conversation and conversation.turns and needs_history(user_input))
+
+    def _cache_key(self, user_input: str) -> str:
+        return IntentCache.make_key(self.provider, self.providers[0].model_name, registry.fingerprint(), user_input)
+
+    def _select_commands(self, user_input: str, conversation=None):
+        """The relevant commands for the prompt, plus those used in the conversation so far."""
+        return self.prompts.select_commands(user_input, conversation.commands() if conversation else None)
+
+    def _request(self, user_input: str, context: str = "", commands=None, conversation=None) -> LLMRequest:
+        return LLMRequest(self.prompts.static_prefix(commands), self.prompts.dynamic_suffix(context), user_input,
+                          schema=self.prompts.schema(commands),
+                          flat_schema=self.prompts.schema(commands, per_command=False),
+                          history=conversation.history() if conversation else None,
+                          summary=conversation.summary() if conversation else "")
+
+    def _route(self):
+        """Providers to try for this request, healthiest first; raises if every circuit is open."""
+        providers = self.router.order()
+        if not providers:
+            raise RuntimeError("no LLM provider available (all circuits open)")
+        return providers
+
+    def _stream_llm(self, user_input: str, context: str = "", commands=None, conversation=None, answered=None):
+        """
+        Yields raw text chunks of the completion as the provider produces them.
+        A provider that fails before producing output is failed over to the next one.
+        The provider that answers is appended to `answered`.
+        """
+        request = self._request(user_input, context, commands, conversation)
+        providers = self._route()
+        if config.LLM_HEDGE and len(providers) > 1:
+            winner = None
+            for provider, chunk in hedged_stream(providers, request):
+                if winner is None:
+                    winner = provider
+                    self._tag_provider(provider)
+                    if answered is not None:
+                        answered.append(provider)
+                yield chunk
+            return
+
+        for i, provider in enumerate(providers):
+            started = False
+            try:
+                for chunk in provider.stream(request):
+                    if not started:
+                        self._tag_provider(provider)
+                        if answered is not None:
+                            answered.append(provider)
+                    started = True
+                    yield chunk
+                return
+            except Exception as e:
+                if started or i == len(providers) - 1:
+                    raise
+                print(f"[LLM] {provider.name} failed ({e}), trying {providers[i + 1].name}.")
+
+    @staticmethod
+    def _tag_provider(provider: Provider):
+        """Records on the parse_intent span which provider and model answered."""
+        telemetry.tag(source="llm", provider=provider.name, model=provider.model_name)
+
+    def _parse(self, response_text: str) -> dict:
+        # Tolerates markdown fences, surrounding prose and replies cut off after the args
+        return salvage_intent(response_text)
+
+    def _query_llm(self, user_input: str, context: str = "", full_catalog: bool = False, conversation=None,
+                   retried: bool = False, answered=None):
+        """
+        Sends one request to the healthiest provider and returns the parsed JSON intent,
+        failing over to the next one on error. With LLM_HEDGE, a slow provider is raced
+        against the next instead.
+        Only the most relevant commands are listed unless `full_catalog` is set; if the
+        model can't map the request to one of them, it is retried with every command.
+        A reply cut off by the output budget is retried once with a bigger budget.
+        The provider that answers is appended to `answered`.
+        """
+        commands = None if full_catalog else self._select_commands(user_input, conversation)
+        request = self._request(user_input, context, commands, conversation)
+        providers = self._route()
+        if config.LLM_HEDGE and len(providers) > 1:
+            provider, intent = hedged_complete(providers, request, self._parse)
+        else:
+            for i, provider in enumerate(providers):
+                try:
+                    intent = self._parse(provider.complete(request))
+                    break
+                except Exception as e:
+                    if i == len(providers) - 1:
+                        raise
+                    print(f"[LLM] {provider.name} failed ({e}), trying {providers[i + 1].name}.")
+        self._tag_provider(provider)
+        if answered is not None:
+            answered.append(provider)
+
+        if intent.get("truncated") and not retried:
+            provider.budget.expand()
+            return self._query_llm(user_input, context, full_catalog, conversation, retried=True, answered=answered)
+        if commands is not None and intent.get("command") == "unknown":
+            return self._query_llm(user_input, context, full_catalog=True, conversation=conversation,
+                                   retried=retried, answered=answered)
+        return intent
 
     def _fallback_parser(self, text: str):
-        """Robust backup parser when LLM is offline."""
-        text = text.lower().strip()
-        print(f"Fallback Parser: Analying '{text}'")
-
-        # --- BROWSER ---
-        if "google" in text or "search" in text:
-            query = text.replace("google", "").replace("search", "").strip()
-            return {"command": "google_search", "args": {"query": query}, "response": f"Searching Google for {query}, Sir."}
-        
-        if "open youtube" in text:
-             return {"command": "open_browser", "args": {"url": "https://youtube.com"}, "response": "Of course, Sir. Opening YouTube."}
-
-        if "close tab" in text or "close this tab" in text:
-            return {"command": "close_tab", "args": {}, "response": "Closing the tab, Sir."}
-        
-        if "close browser" in text or "close window" in text:
-            return {"command": "close_browser", "args": {}, "response": "Closing the browser window, Sir."}
-
-        # Clean filler words
-        text = text.replace("my ", "").replace("the ", "").replace("please ", "").strip()
-
-        # Generic "Open X" logic
-        if "open" in text:
-             target = text.split("open", 1)[1].strip()
-             if "browser" in target or target == "":
-                 url = "https://google.com"
-             elif "http" in target or ".com" in target:
-                 url = target 
-             else:
-                 # Try to guess URL if not explicit
-                 url = f"https://{target.replace(' ', '')}.com"
-             
-             return {"command": "open_browser", "args": {"url": url}, "response": f"Opening {target} for you, Sir."}
-
-        # --- NOTES ---
-        if "take note" in text or "write note" in text or "save this" in text:
-            content = text.replace("take note", "").replace("write note", "").replace("save this", "").strip()
-            return {"command": "take_note", "args": {"content": content}, "response": "Note saved, Sir."}
-            
-        if "read notes" in text or "last note" in text:
-            return {"command": "read_notes", "args": {}, "response": "Reading your last notes, Sir."}
-
-        if "list workflows" in text or "list procedures" in text:
-            return {"command": "list_workflows", "args": {}, "response": "Retrieving stored procedures, Sir."}
-
-        # --- CHAT / SYSTEM ---
-        if "hello" in text or "hi" in text:
-             return {"command": "chat", "args": {"text": "Hello, sir. Ready for commands."}, "response": "Hello, sir. I am online and ready to assist."}
-             
-        if "who are you" in text:
-             return {"command": "chat", "args": {"text": "I am RJ, your personal AI assistant."}, "response": "I am RJ, your personal AI assistant. How may I help you today?"}
-             
-        if "thank" in text:
-             return {"command": "chat", "args": {"text": "You are welcome, sir."}, "response": "You are most welcome, Sir."}
-
-        if "time" in text or "date" in text:
-            return {"command": "get_time", "args": {}, "response": "Checking the system time for you, Sir."}
-        
-        if "system" in text or "cpu" in text or "ram" in text:
-            return {"command": "system_info", "args": {}, "response": "Retrieving system diagnostics, Sir."}
-            
-        return {"command": "unknown", "args": {}}
+        """Robust backup parser when LLM is offline (rules contributed by the skills)."""
+        print(f"Fallback Parser: Analyzing '{text.lower().strip()}'")
+        telemetry.tag(source="fallback")
+        return self.rules.match(text)
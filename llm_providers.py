@@ -0,0 +1,592 @@
+import contextvars
+import json
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Iterator, List, Optional, Tuple
+import openai
+import config
+import telemetry
+from prompt_builder import count_tokens
+from provider_health import ProviderHealth
+
+try:
+    import google.generativeai as genai
+except ImportError:
+    genai = None
+
+OPENAI_COMPATIBLE = ["openai", "groq", "local", "ollama", "openrouter"]
+
+# Detection order when LLM_PROVIDER is 'auto'
+AUTO_ORDER = ["openai", "gemini", "anthropic", "groq", "openrouter"]
+
+# Structured-output mode per provider when LLM_STRUCTURED_OUTPUT is 'auto'. Local servers
+# (Ollama, LM Studio, llama.cpp) enforce a full schema with grammar-constrained decoding;
+# the hosted OpenAI-compatible APIs are asked for a JSON object, Anthropic for a forced tool call.
+STRUCTURED_DEFAULTS = {"local": "json_schema", "ollama": "json_schema", "openai": "json_object",
+                       "groq": "json_object", "openrouter": "json_object", "gemini": "json_object",
+                       "anthropic": "tool"}
+
+# Errors meaning the server refused the request itself (e.g. an unsupported response_format)
+_REJECTED_ERRORS = {"BadRequestError", "UnprocessableEntityError", "InvalidArgument"}
+
+# Usage attribute names: OpenAI-compatible, Anthropic, Gemini
+_USAGE_FIELDS = {"prompt_tokens": ("prompt_tokens", "input_tokens", "prompt_token_count"),
+                 "completion_tokens": ("completion_tokens", "output_tokens", "candidates_token_count"),
+                 "cached_tokens": ("cache_read_input_tokens", "cached_content_token_count")}
+
+_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="llm")
+
+
+class LLMRequest:
+    """
+    One intent request: the cacheable system prefix, the per-request suffix and the
+    utterance, plus the session's earlier turns (user/assistant messages) and the
+    summary of the turns compacted out of them.
+    """
+
+    def __init__(self, prefix: str, suffix: str, user_input: str,
+                 schema: Optional[dict] = None, flat_schema: Optional[dict] = None,
+                 history: Optional[List[dict]] = None, summary: str = ""):
+        self.prefix = prefix
+        self.suffix = suffix
+        self.user_input = user_input
+        self.history = history or []
+        self.summary = f"EARLIER IN THIS CONVERSATION:\n{summary}" if summary else ""
+        # Intent JSON schema with per-command args, and a single-object variant for tool inputs
+        self.schema = schema
+        self.flat_schema = flat_schema
+
+
+class LatencyWindow:
+    """Rolling window of recent request latencies (seconds)."""
+
+    def __init__(self, size: int = 100):
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, p: float, min_samples: int = 10) -> Optional[float]:
+        with self._lock:
+            samples = sorted(self._samples)
+        if len(samples) < min_samples:
+            return None
+        index = min(int(round(p / 100 * (len(samples) - 1))), len(samples) - 1)
+        return samples[index]
+
+
+class OutputBudget:
+    """
+    max_tokens for the next request: twice the longest recent reply, within
+    [LLM_MIN_OUTPUT_TOKENS, LLM_MAX_OUTPUT_TOKENS]. A truncated reply doubles the floor.
+    """
+
+    def __init__(self, size: int = 50):
+        self._sizes = deque(maxlen=size)
+        self._floor = config.LLM_MIN_OUTPUT_TOKENS
+        self._lock = threading.Lock()
+
+    def tokens(self) -> int:
+        with self._lock:
+            largest = max(self._sizes, default=0)
+            return int(min(max(largest * 2, self._floor), config.LLM_MAX_OUTPUT_TOKENS))
+
+    def observe(self, tokens: int, truncated: bool = False):
+        with self._lock:
+            self._sizes.append(tokens)
+        if truncated:
+            self.expand()
+
+    def expand(self) -> bool:
+        """Doubles the floor after a cut-off reply; False if it is already at the ceiling."""
+        with self._lock:
+            if self._floor >= config.LLM_MAX_OUTPUT_TOKENS:
+                return False
+            self._floor = min(self._floor * 2, config.LLM_MAX_OUTPUT_TOKENS)
+            return True
+
+
+def structured_mode(name: str) -> Optional[str]:
+    """'json_schema', 'json_object', 'tool' or None (plain prompting) for a provider."""
+    mode = config.LLM_STRUCTURED_OUTPUT
+    if mode == "off":
+        return None
+    if mode == "auto" or name not in OPENAI_COMPATIBLE:
+        return STRUCTURED_DEFAULTS.get(name)
+    return mode
+
+
+def _rejected(error: Exception) -> bool:
+    return type(error).__name__ in _REJECTED_ERRORS or getattr(error, "status_code", None) in (400, 422)
+
+
+def _usage(usage) -> Optional[dict]:
+    """Token counts from a provider's usage object (None if it didn't report any)."""
+    if usage is None:
+        return None
+    counts = {}
+    for key, names in _USAGE_FIELDS.items():
+        counts[key] = next((getattr(usage, n) for n in names if getattr(usage, n, None) is not None), 0)
+    details = getattr(usage, "prompt_tokens_details", None)
+    if details is not None and getattr(details, "cached_tokens", None):
+        counts["cached_tokens"] = details.cached_tokens
+    return counts
+
+
+class Provider:
+    """
+    A configured LLM backend: builds the provider's native request (system prompt
+    layout, prompt caching) and returns or streams the completion text.
+    """
+
+    def __init__(self, name: str, base_url: str = None):
+        self.name = name
+        self.client = None
+        self.model = ""
+        self.latency = LatencyWindow()
+        self.health = ProviderHealth(name)
+        self.budget = OutputBudget()
+        self.structured = structured_mode(name)
+        # Fail fast so a dead provider trips its circuit instead of stalling every request
+        timeouts = {"timeout": config.LLM_TIMEOUT, "max_retries": config.LLM_MAX_RETRIES}
+
+        if name == "openai":
+            self.client = openai.OpenAI(api_key=config.KEYS["openai"], **timeouts)
+            self.model = "gpt-3.5-turbo"
+
+        elif name == "gemini":
+            if genai is None:
+                raise ImportError("google-generativeai is not installed.")
+            genai.configure(api_key=config.KEYS["gemini"])
+            self.model = genai.GenerativeModel('gemini-pro')
+
+        elif name == "anthropic":
+            from anthropic import Anthropic
+            self.client = Anthropic(api_key=config.KEYS["anthropic"], **timeouts)
+            self.model = "claude-3-opus-20240229"
+
+        elif name == "groq":
+            self.client = openai.OpenAI(
+                base_url="https://api.groq.com/openai/v1",
+                api_key=config.KEYS["groq"],
+                **timeouts
+            )
+            self.model = "llama3-70b-8192"
+
+        elif name == "openrouter":
+            self.client = openai.OpenAI(
+                base_url="https://openrouter.ai/api/v1",
+                api_key=config.KEYS["openrouter"],
+                **timeouts
+            )
+            # You can change this to any model supported by OpenRouter
+            self.model = "openai/gpt-3.5-turbo"
+
+        elif name == "local" or name == "ollama":
+            self.client = openai.OpenAI(
+                base_url=base_url or config.LOCAL_LLM_URL,
+                api_key="lm-studio", # Dummy key
+                **timeouts
+            )
+            self.model = config.LOCAL_MODEL_NAME
+
+        else:
+            raise ValueError(f"Unknown LLM provider '{name}'.")
+
+    @property
+    def model_name(self) -> str:
+        return getattr(self.model, "model_name", self.model)
+
+    def _openai_messages(self, request: LLMRequest):
+        """
+        Static prefix as the first system message so automatic prefix caching can hit it,
+        then the conversation so far, which only grows between turns and stays cacheable too.
+        """
+        messages = [{"role": "system", "content": request.prefix}]
+        if request.summary:
+            messages.append({"role": "system", "content": request.summary})
+        messages.extend(request.history)
+        if request.suffix:
+            messages.append({"role": "system", "content": request.suffix})
+        messages.append({"role": "user", "content": request.user_input})
+        return messages
+
+    def _anthropic_system(self, request: LLMRequest):
+        """System blocks with the static prefix marked as an explicit cache breakpoint."""
+        blocks = [{"type": "text", "text": request.prefix, "cache_control": {"type": "ephemeral"}}]
+        if request.summary:
+            blocks.append({"type": "text", "text": request.summary})
+        if request.suffix and not request.history:
+            blocks.append({"type": "text", "text": request.suffix})
+        return blocks
+
+    def _anthropic_messages(self, request: LLMRequest):
+        """
+        Earlier turns with a second cache breakpoint on the last one, so the next turn
+        reads the whole conversation from the cache. Retrieved context then goes into
+        the new user message, after the breakpoint.
+        """
+        if not request.history:
+            return [{"role": "user", "content": request.user_input}]
+        messages = [dict(m) for m in request.history]
+        messages[-1]["content"] = [{"type": "text", "text": messages[-1]["content"],
+                                    "cache_control": {"type": "ephemeral"}}]
+        content = [{"type": "text", "text": request.suffix}] if request.suffix else []
+        content.append({"type": "text", "text": request.user_input})
+        messages.append({"role": "user", "content": content})
+        return messages
+
+    def _gemini_prompt(self, request: LLMRequest):
+        prompt = "\n\n".join(part for part in (request.prefix, request.summary, request.suffix) if part)
+        return prompt + "\nUSER: " + request.user_input
+
+    def _gemini_history(self, request: LLMRequest):
+        """Earlier turns as a native chat history (Gemini calls the assistant 'model')."""
+        return [{"role": "model" if m["role"] == "assistant" else "user", "parts": [m["content"]]}
+                for m in request.history]
+
+    def _openai_kwargs(self, request: LLMRequest, structured: Optional[str]) -> dict:
+        kwargs = {"model": self.model, "messages": self._openai_messages(request),
+                  "temperature": 0.0, "max_tokens": self.budget.tokens()}
+        if structured == "json_schema" and request.schema:
+            kwargs["response_format"] = {"type": "json_schema",
+                                         "json_schema": {"name": "intent", "schema": request.schema}}
+        elif structured:
+            kwargs["response_format"] = {"type": "json_object"}
+        return kwargs
+
+    def _anthropic_kwargs(self, request: LLMRequest, structured: Optional[str]) -> dict:
+        kwargs = {"model": self.model, "max_tokens": self.budget.tokens(),
+                  "system": self._anthropic_system(request),
+                  "messages": self._anthropic_messages(request)}
+        if structured and request.flat_schema:
+            # A forced tool call makes the reply's input the intent object itself
+            kwargs["tools"] = [{"name": "intent", "description": "The command to run and the reply to speak.",
+                                "input_schema": request.flat_schema}]
+            kwargs["tool_choice"] = {"type": "tool", "name": "intent"}
+        return kwargs
+
+    def _gemini_config(self, structured: Optional[str]) -> dict:
+        generation_config = {"max_output_tokens": self.budget.tokens()}
+        if structured:
+            generation_config["response_mime_type"] = "application/json"
+        return generation_config
+
+    def probe(self) -> Optional[bool]:
+        """Cheap reachability check used while the circuit is open (None: no probe available)."""
+        if self.name in OPENAI_COMPATIBLE:
+            self.client.with_options(timeout=config.LLM_PROBE_TIMEOUT, max_retries=0).models.list()
+            return True
+        if self.name == "gemini":
+            genai.get_model(self.model.model_name)
+            return True
+        return None
+
+    def _fall_back_to_plain(self, error: Exception):
+        print(f"[LLM] {self.name} rejected structured output ({error}); using plain JSON prompting.")
+        self.structured = None
+
+    def _record_usage(self, span, request: LLMRequest, text: str, meta: dict):
+        """Tags the llm.request span with token usage (estimated if the provider didn't report it)."""
+        usage = meta.get("usage")
+        if usage is None:
+            parts = [request.prefix, request.summary, request.suffix, request.user_input]
+            parts += [m["content"] for m in request.history]
+            usage = {"prompt_tokens": sum(count_tokens(p) for p in parts if p),
+                     "completion_tokens": count_tokens(text)}
+            span.set(usage_estimated=True)
+        span.set(structured=self.structured, truncated=meta["truncated"])
+        span.add(**usage)
+
+    def complete(self, request: LLMRequest) -> str:
+        """Sends the request and returns the whole completion text."""
+        start = time.monotonic()
+        meta = {"truncated": False, "usage": None}
+        with telemetry.span("llm.request", provider=self.name, model=self.model_name, streaming=False) as span:
+            try:
+                try:
+                    text = self._complete(request, self.structured, meta)
+                except Exception as e:
+                    if not (self.structured and _rejected(e)):
+                        raise
+                    text = self._complete(request, None, meta)
+                    self._fall_back_to_plain(e)
+            except Exception as e:
+                self.health.record_failure(e)
+                raise
+            elapsed = time.monotonic() - start
+            self.latency.add(elapsed)
+            self.health.record_success(elapsed)
+            self.budget.observe(count_tokens(text), meta["truncated"])
+            self._record_usage(span, request, text, meta)
+        return text
+
+    def _complete(self, request: LLMRequest, structured: Optional[str], meta: dict) -> str:
+        """Returns the completion text; meta gets whether it was cut off by the output budget and the usage."""
+        # --- OPENAI / GROQ / LOCAL / OPENROUTER ---
+        if self.name in OPENAI_COMPATIBLE:
+            response = self.client.chat.completions.create(**self._openai_kwargs(request, structured))
+            choice = response.choices[0]
+            meta["truncated"] = choice.finish_reason == "length"
+            meta["usage"] = _usage(getattr(response, "usage", None))
+            return choice.message.content or ""
+
+        # --- GEMINI ---
+        if self.name == "gemini":
+            chat = self.model.start_chat(history=self._gemini_history(request))
+            response = chat.send_message(self._gemini_prompt(request),
+                                         generation_config=self._gemini_config(structured))
+            try:
+                meta["truncated"] = response.candidates[0].finish_reason.name == "MAX_TOKENS"
+            except (AttributeError, IndexError):
+                pass
+            meta["usage"] = _usage(getattr(response, "usage_metadata", None))
+            return response.text
+
+        # --- ANTHROPIC ---
+        message = self.client.messages.create(**self._anthropic_kwargs(request, structured))
+        text = ""
+        for block in message.content:
+            if block.type == "tool_use":
+                text = json.dumps(block.input)
+                break
+            if block.type == "text":
+                text += block.text
+        meta["truncated"] = message.stop_reason == "max_tokens"
+        meta["usage"] = _usage(getattr(message, "usage", None))
+        return text
+
+    def stream(self, request: LLMRequest, cancel: Optional[threading.Event] = None) -> Iterator[str]:
+        """
+        Yields completion text chunks as they arrive. Setting `cancel` closes the
+        underlying HTTP stream at the next chunk, so a hedged loser stops generating.
+        """
+        start = time.monotonic()
+        chunks = []
+        meta = {"truncated": False, "usage": None}
+        # Not made current: the generator is suspended between chunks, in its consumer's context
+        span = telemetry.start_span("llm.request", provider=self.name, model=self.model_name, streaming=True)
+        try:
+            try:
+                for chunk in self._stream(request, cancel, self.structured, meta):
+                    if not chunks:
+                        span.set(first_chunk_ms=round((time.monotonic() - start) * 1000, 1))
+                    chunks.append(chunk)
+                    yield chunk
+            except Exception as e:
+                # An unsupported response_format is refused before any output
+                if chunks or not (self.structured and _rejected(e)):
+                    raise
+                for chunk in self._stream(request, cancel, None, meta):
+                    chunks.append(chunk)
+                    yield chunk
+                self._fall_back_to_plain(e)
+        except GeneratorExit:
+            span.set(cancelled=True)
+            telemetry.end_span(span)
+            raise
+        except Exception as e:
+            if cancel is None or not cancel.is_set():
+                self.health.record_failure(e)
+            telemetry.end_span(span, e)
+            raise
+        text = "".join(chunks)
+        self._record_usage(span, request, text, meta)
+        if cancel is not None and cancel.is_set():
+            span.set(cancelled=True)
+            telemetry.end_span(span)
+            return  # Cut short, so neither a latency sample nor a health signal
+        elapsed = time.monotonic() - start
+        self.latency.add(elapsed)
+        self.health.record_success(elapsed)
+        self.budget.observe(count_tokens(text), meta["truncated"])
+        telemetry.end_span(span)
+
+    def _stream(self, request: LLMRequest, cancel: Optional[threading.Event],
+                structured: Optional[str], meta: dict) -> Iterator[str]:
+        # --- OPENAI / GROQ / LOCAL / OPENROUTER ---
+        if self.name in OPENAI_COMPATIBLE:
+            stream = self.client.chat.completions.create(stream=True, **self._openai_kwargs(request, structured))
+            try:
+                for chunk in stream:
+                    if cancel is not None and cancel.is_set():
+                        return
+                    if getattr(chunk, "usage", None):
+                        meta["usage"] = _usage(chunk.usage)  # Servers that report it send it with the last chunk
+                    if not chunk.choices:
+                        continue
+                    if chunk.choices[0].finish_reason == "length":
+                        meta["truncated"] = True
+                    if chunk.choices[0].delta.content:
+                        yield chunk.choices[0].delta.content
+            finally:
+                close = getattr(stream, "close", None)
+                if close:
+                    close()
+
+        # --- GEMINI ---
+        elif self.name == "gemini":
+            chat = self.model.start_chat(history=self._gemini_history(request))
+            for chunk in chat.send_message(self._gemini_prompt(request), stream=True,
+                                           generation_config=self._gemini_config(structured)):
+                if cancel is not None and cancel.is_set():
+                    return
+                meta["usage"] = _usage(getattr(chunk, "usage_metadata", None)) or meta["usage"]
+                yield chunk.text
+
+        # --- ANTHROPIC ---
+        else:
+            with self.client.messages.stream(**self._anthropic_kwargs(request, structured)) as stream:
+                for event in stream:
+                    if cancel is not None and cancel.is_set():
+                        return
+                    if event.type != "content_block_delta":
+                        continue
+                    if event.delta.type == "text_delta":
+                        yield event.delta.text
+                    elif event.delta.type == "input_json_delta":
+                        # The forced tool call's input streams as raw JSON: exactly the intent object
+                        yield event.delta.partial_json
+                message = stream.get_final_message()
+                meta["truncated"] = message.stop_reason == "max_tokens"
+                meta["usage"] = _usage(getattr(message, "usage", None))
+
+
+def detect_provider() -> str:
+    """The first provider with an API key, or 'local' when there are none."""
+    for name in AUTO_ORDER:
+        if config.KEYS.get(name):
+            return name
+    return "local"
+
+
+def hedge_delay(primary: Provider) -> float:
+    """How long to wait for `primary` before hedging: its LLM_HEDGE_PERCENTILE latency."""
+    observed = primary.latency.percentile(config.LLM_HEDGE_PERCENTILE)
+    delay = observed if observed is not None else config.LLM_HEDGE_DELAY
+    return max(delay, config.LLM_HEDGE_MIN_DELAY)
+
+
+def hedged_complete(providers: List[Provider], request: LLMRequest,
+                    parse: Callable[[str], dict]) -> Tuple[Provider, dict]:
+    """
+    Sends `request` to providers[0]; if it hasn't produced a valid intent within the
+    hedge delay (or failed), the next provider is tried as well. The first valid
+    parsed intent wins and every other attempt is cancelled.
+    """
+    results = queue.Queue()
+    cancels = []
+    delay = hedge_delay(providers[0])
+
+    def attempt(provider: Provider, cancel: threading.Event):
+        try:
+            text = "".join(provider.stream(request, cancel))
+            if not cancel.is_set():
+                results.put((provider, parse(text), None))
+        except Exception as e:
+            results.put((provider, None, e))
+
+    def launch():
+        cancel = threading.Event()
+        cancels.append(cancel)
+        # In the caller's context, so the attempt's llm.request span joins the caller's trace
+        _pool.submit(contextvars.copy_context().run, attempt, providers[len(cancels) - 1], cancel)
+
+    launch()
+    pending = 1
+    error = None
+    try:
+        while pending:
+            more = len(cancels) < len(providers)
+            try:
+                provider, intent, error_ = results.get(timeout=delay if more else None)
+            except queue.Empty:
+                print(f"[LLM] {providers[len(cancels) - 1].name} is slow (>{delay:.2f}s), hedging with "
+                      f"{providers[len(cancels)].name}.")
+                launch()
+                pending += 1
+                continue
+            pending -= 1
+            if error_ is None:
+                return provider, intent
+            error = error_
+            print(f"[LLM] {provider.name} failed: {error_}")
+            if more:
+                launch()
+                pending += 1
+        raise error
+    finally:
+        for cancel in cancels:
+            cancel.set()
+
+
+def hedged_stream(providers: List[Provider], request: LLMRequest) -> Iterator[Tuple[Provider, str]]:
+    """
+    Streaming counterpart of hedged_complete: the first provider to produce output
+    within the hedge delay wins, and its (provider, chunk) pairs are relayed while the
+    others are cancelled.
+    """
+    chunks = queue.Queue()
+    cancels = []
+    delay = hedge_delay(providers[0])
+
+    def attempt(index: int, cancel: threading.Event):
+        try:
+            for chunk in providers[index].stream(request, cancel):
+                chunks.put((index, "chunk", chunk))
+            chunks.put((index, "done", None))
+        except Exception as e:
+            chunks.put((index, "error", e))
+
+    def launch():
+        cancel = threading.Event()
+        cancels.append(cancel)
+        _pool.submit(contextvars.copy_context().run, attempt, len(cancels) - 1, cancel)
+
+    launch()
+    pending = 1
+    winner = None
+    error = None
+    try:
+        while True:
+            more = winner is None and len(cancels) < len(providers)
+            try:
+                index, kind, value = chunks.get(timeout=delay if more else None)
+            except queue.Empty:
+                print(f"[LLM] {providers[len(cancels) - 1].name} is slow (>{delay:.2f}s), hedging with "
+                      f"{providers[len(cancels)].name}.")
+                launch()
+                pending += 1
+                continue
+
+            if winner is None:
+                if kind == "chunk":
+                    winner = index
+                    for i, cancel in enumerate(cancels):
+                        if i != winner:
+                            cancel.set()
+                    yield providers[index], value
+                    continue
+                pending -= 1
+                error = value if kind == "error" else ValueError(f"{providers[index].name} returned nothing.")
+                print(f"[LLM] {providers[index].name} failed: {error}")
+                if len(cancels) < len(providers):
+                    launch()
+                    pending += 1
+                elif pending == 0:
+                    raise error
+            elif index == winner:
+                if kind == "chunk":
+                    yield providers[index], value
+                elif kind == "done":
+                    return
+                else:
+                    raise value
+    finally:
+        for cancel in cancels:
+            cancel.set()
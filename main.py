@@ -1,29 +1,46 @@
 
 import os
+import queue
 import sys
 import threading
+import time
 import speech_recognition as sr
-import pyttsx3
 import config
+import telemetry
 from config import WAKE_WORD, MICROPHONE_INDEX, REMOTE_CONFIG
 from command_registry import registry
+from command_schema import ArgumentError
+from job_executor import DONE, jobs
 from llm_engine import LLMEngine
-import skills.browser
-import skills.system
-import skills.files
-import skills.media
-import skills.input
+from speech_output import SpeechOutput
+from audio_capture import MicFrames, NoiseFloor, PhraseDetector
+from wake_gate import WakeGate, make_spotter
+from skill_loader import load_skills
+from system_monitor import get_sampler
+from workflow_engine import WorkflowEngine, compile_workflow
 
 import logging
-import skills.notes # Ensure notes skill is registered
-import skills.workflows
+
+load_skills([
+    "skills.browser",
+    "skills.system",
+    "skills.files",
+    "skills.media",
+    "skills.input",
+    "skills.notes",
+    "skills.workflows",
+    "skills.jobs",
+])
+
+# Conversation memory key for everything said to the assistant by voice (or typed locally)
+VOICE_SESSION = "voice"
 
 # Setup Logging
-if not os.path.exists("logs"):
-    os.makedirs("logs")
+if os.path.dirname(config.DEBUG_LOG_PATH):
+    os.makedirs(os.path.dirname(config.DEBUG_LOG_PATH), exist_ok=True)
 
 logging.basicConfig(
-    filename="logs/debug.log",
+    filename=config.DEBUG_LOG_PATH,
     level=logging.INFO,
     format="%(asctime)s [%(levelname)s] %(message)s",
     datefmt="%Y-%m-%d %H:%M:%S"
@@ -39,13 +56,8 @@ except ImportError:
 class AI_Assistant:
     def __init__(self):
         if config.VOICE_OUTPUT:
-            try:
-                self.engine = pyttsx3.init()
-                # Set voice
-                voices = self.engine.getProperty('voices')
-                if voices:
-                    self.engine.setProperty('voice', voices[0].id) 
-            except Exception:
+            self.engine = SpeechOutput(warm_phrases=self._canned_phrases())
+            if not self.engine.available:
                 self.engine = None
                 print("TTS Engine failed to initialize. Output will be text-only.")
         else:
@@ -54,67 +66,218 @@ class AI_Assistant:
 
         self.recognizer = sr.Recognizer()
         self.mic = None
+        self.noise_floor = None
+        self.gate = None
+        self.detector = None
         try:
             # Use specific microphone index if configured:
             mic_index = getattr(config, 'MICROPHONE_INDEX', None) 
-            self.mic = sr.Microphone(device_index=mic_index)
+            self.mic = MicFrames(device_index=mic_index)
+            # One open stream for the whole session; the threshold adapts as frames arrive
+            self.noise_floor = NoiseFloor(path=config.AUDIO_CALIBRATION_PATH, key=str(mic_index))
+            self.detector = PhraseDetector(self.mic.sample_rate, self.mic.sample_width, self.mic.frame_count,
+                                           self.noise_floor)
+            # Only phrases with speech and the wake word are uploaded to ASR
+            self.gate = WakeGate(make_spotter())
         except Exception as e:
+            self.mic = None
             print(f"Microphone init failed: {e}. Switching to text mode.")
 
         self.llm = LLMEngine()
+        self.workflows = WorkflowEngine(registry)
         self.running = True
+        if config.SYSTEM_SAMPLER:
+            # History starts now, so system_info and system_trends answer from the buffer
+            get_sampler()
+
+        # Safe command job started while the LLM is still streaming: (name, args, job)
+        self._early = None
+
+        # Voice pipeline: capture thread -> phrases -> ASR thread -> texts -> run() loop.
+        # Capture never pauses, so speech during ASR, thinking or TTS is queued, not lost.
+        self._phrases = queue.Queue(maxsize=config.PHRASE_QUEUE_SIZE)
+        self._texts = queue.Queue()
+        # Each phrase carries its trace id through the queues, so listen, ASR and the turn share a trace
+        self._trace = None
+        self._echo = False
+        # Background jobs that finished: their results are handled by run() between turns
+        self._finished = queue.Queue()
 
-    def speak(self, text):
+    @staticmethod
+    def _canned_phrases():
+        """Fixed responses worth pre-rendering: config phrases, rule responses and permission prompts."""
+        phrases = list(config.TTS_CACHE_PHRASES)
+        for name, meta in registry._metadata.items():
+            phrases.extend(rule["response"] for rule in meta.get("rules") or [] if rule.get("response"))
+            if config.ALWAYS_ASK_PERMISSION and name != "chat":
+                phrases.append(f"Sir, I'm about to {name.replace('_', ' ')}. Is that permitted?")
+        return list(dict.fromkeys(phrases))
+
+    def speak(self, text, wait=True):
         print(f"AI: {text}")
         if config.VOICE_OUTPUT and self.engine:
+            self.engine.say(text)
+            if wait:
+                self.engine.wait()
+
+    def _dispatch_early(self, cmd_name, args):
+        """Starts a safe command as soon as the streamed intent names it."""
+        if self._early and self._early[:2] == (cmd_name, args):
+            return
+        # The intent changed (a retry, or the fallback parser after a stream error)
+        self._cancel_early()
+        if cmd_name in ("chat", "unknown") or config.ALWAYS_ASK_PERMISSION or not registry.is_safe(cmd_name):
+            return
+        try:
+            self._early = (cmd_name, args, jobs.submit(cmd_name, args, confirm=False))
+        except (KeyError, ArgumentError):
+            pass  # Reported when the intent is complete
+
+    def _cancel_early(self):
+        """Cancels the early-started job, if any (it didn't match the final intent)."""
+        early, self._early = self._early, None
+        if early:
+            print(f"[Jobs] Intent changed, cancelling early {early[0]}: {jobs.cancel(early[2].id)}")
+
+    def _job_done(self, job):
+        """
+        Announces a command that finished in the background. Runs on the job's thread, so
+        the result (which may need input() or follow-up steps) is left to run() via _finished.
+        """
+        if job.state != DONE:
+            self.speak(f"Job {job.id}, {job.command.replace('_', ' ')}, {job.state}, Sir.", wait=False)
+            return
+        self.speak(f"Job {job.id}, {job.command.replace('_', ' ')}, is done, Sir.", wait=False)
+        self._finished.put(job)
+
+    def _drain_finished(self):
+        """Handles the results of background jobs that finished, on the main thread."""
+        while True:
             try:
-                self.engine.say(text)
-                self.engine.runAndWait()
-            except:
-                pass
+                job = self._finished.get_nowait()
+            except queue.Empty:
+                return
+            with telemetry.span("job_result", job=job.id, command=job.command):
+                self._handle_result(job.result)
 
     def listen(self):
         if not self.mic:
             return input("Type command: ")
-        
-        with self.mic as source:
-            print(f"\nListening (Say '{WAKE_WORD}'...)...")
-            self.recognizer.adjust_for_ambient_noise(source, duration=0.5)
-            self.recognizer.pause_threshold = 1.2  # Wait slightly longer for complex commands
-            self.recognizer.energy_threshold = 350
-            
+
+        try:
+            # Short timeout so Ctrl+C and shutdown are noticed
+            text, self._trace, self._echo = self._texts.get(timeout=0.5)
+            return text
+        except queue.Empty:
+            return None
+
+    def start_pipeline(self):
+        print(f"\nListening (Say '{WAKE_WORD}'...)...")
+        threading.Thread(target=self._capture_loop, name="capture", daemon=True).start()
+        threading.Thread(target=self._asr_loop, name="asr", daemon=True).start()
+
+    def _capture_loop(self):
+        """Reads the microphone continuously, cutting phrases and watching for barge-in."""
+        barge_frames = max(int(config.BARGE_IN_MIN / (self.mic.frame_count / self.mic.sample_rate)), 1)
+        loud_run = 0
+        echo = False
+        phrase_start = 0.0
+        try:
+            for frame in self.mic:
+                if not self.running:
+                    break
+                started = not self.detector.in_phrase
+                audio = self.detector.feed(frame)
+                speaking = self.engine is not None and self.engine.speaking
+                if started and self.detector.in_phrase:
+                    # A phrase that starts over our own speech is echo unless it barges in
+                    echo = speaking
+                    phrase_start = time.perf_counter()
+
+                if speaking and config.BARGE_IN and \
+                        self.detector.last_energy > self.noise_floor.threshold * config.BARGE_IN_RATIO:
+                    loud_run += 1
+                    if loud_run >= barge_frames:
+                        print("[Voice] Barge-in: stopping speech.")
+                        self.engine.stop()
+                        echo = False
+                        loud_run = 0
+                else:
+                    loud_run = 0
+
+                if audio is not None:
+                    # From the first voiced frame to the endpoint decision
+                    span = telemetry.record("listen", phrase_start, echo=echo)
+                    if echo:
+                        print("[Voice] Phrase started over our own speech; it needs the wake word.")
+                    # Flagged rather than dropped: the wake gate and wake-word check reject real echo
+                    self._enqueue((audio, span.trace_id, echo))
+                    echo = False
+                    self.noise_floor.save(min_interval=60)
+        except Exception as e:
+            print(f"Error listening: {e}")
+            self.running = False
+        finally:
+            # Closed here, by the thread that reads it
+            self.mic.close()
+
+    def _enqueue(self, phrase):
+        """Ring-buffer semantics: if recognition falls behind, the oldest phrase is dropped."""
+        try:
+            self._phrases.put_nowait(phrase)
+        except queue.Full:
             try:
-                audio = self.recognizer.listen(source, timeout=None, phrase_time_limit=15)
+                self._phrases.get_nowait()
+                print("[Voice] Phrase queue full, dropping the oldest phrase.")
+            except queue.Empty:
+                pass
+            self._phrases.put_nowait(phrase)
+
+    def _asr_loop(self):
+        while self.running:
+            audio, trace, echo = self._phrases.get()
+            with telemetry.span("wake_gate", trace_id=trace) as span:
+                passed = self.gate.check(audio, self.noise_floor.threshold, echo=echo)
+                span.set(passed=passed, echo=echo)
+            if not passed:
+                continue
+            with telemetry.span("recognize_google", trace_id=trace) as span:
                 try:
                     text = self.recognizer.recognize_google(audio)
                     print(f"Heard: '{text}'") # Debug print
-                    return text.lower()
+                    span.set(chars=len(text))
+                    self._texts.put((text.lower(), trace, echo))
                 except sr.UnknownValueError:
                     # print("...") # Ignore unrecognizable sounds
-                    return None
-            except sr.WaitTimeoutError:
-                return None
-            except Exception as e:
-                print(f"Error listening: {e}")
-                return None
+                    span.set(unrecognized=True)
+                except Exception as e:
+                    span.fail(e)
+                    print(f"Error recognizing: {e}")
 
     def execute_command(self, text):
         """Processes the command logic."""
+        # A voice turn continues the trace its phrase started in the capture thread
+        trace, self._trace = self._trace, None
+        echo, self._echo = self._echo, False
+        with telemetry.span("turn", trace_id=trace, voice=bool(self.mic)):
+            self._execute_command(text, echo)
+
+    def _execute_command(self, text, echo=False):
         # print(f"Debug: Processing '{text}'")
         
         cleaned_text = text
         
         # Voice Mode: REQUIRE wake word (or conversational trigger)
         if self.mic:
+            # Heard over our own speech: only an explicit wake word, not a trigger or
+            # the follow-up window, tells the user apart from the speaker's echo
+            if echo and not any(text.startswith(name) for name in config.WAKE_NAME_VARIANTS):
+                print(f"Ignored (echo): '{text}'")
+                return
+
             # Expanded triggers so you don't ALWAYS have to say strict "RJ"
-            wake_word_variants = [
-                WAKE_WORD.lower(), "rj", "r j", "are jay", "archie", "rg", # Name variants
-                "hey", "hi", "hello", "okay", "ok", # Greetings
-                "can you", "could you", "please", "tell me" # Politeness
-            ]
-            
             triggered = False
-            for trigger in wake_word_variants:
+            for trigger in config.WAKE_WORD_VARIANTS:
                 if text.startswith(trigger): # Check if sentence STARTS with these
                     # Remove the trigger but keep the rest
                     # e.g. "Can you open browser" -> "open browser"
@@ -126,8 +289,12 @@ class AI_Assistant:
             # If strictly configured to ONLY use RJ, you can remove the list above.
             # But for natural conversation, this check is better:
             if not triggered and WAKE_WORD.lower() not in text:
-                print(f"Ignored (No wake word): '{text}'")
-                return
+                if self.gate and self.gate.window_open():
+                    # Answer to "Yes?": the wake word was the previous phrase
+                    triggered = True
+                else:
+                    print(f"Ignored (No wake word): '{text}'")
+                    return
             
             # If wake word was in the middle of sentence (e.g. "Open google RJ")
             if not triggered and WAKE_WORD.lower() in text:
@@ -142,18 +309,33 @@ class AI_Assistant:
         
         if not cleaned_text:
             self.speak("Yes?")
+            if self.gate:
+                self.gate.open_window()
             return
 
         # 1. Analyze intent (LLM or Regex Fallback)
-        intent = self.llm.parse_intent(cleaned_text)
+        self._early = None
+        spoken = []
+        if config.LLM_STREAMING:
+            # Sentences are queued for TTS while the rest of the reply is generated
+            def on_sentence(sentence):
+                spoken.append(sentence)
+                self.speak(sentence, wait=False)
+
+            intent = self.llm.stream_intent(cleaned_text, on_sentence=on_sentence, on_command=self._dispatch_early,
+                                            session=VOICE_SESSION)
+        else:
+            intent = self.llm.parse_intent(cleaned_text, session=VOICE_SESSION)
         
         # 2. Extract Response and Action
         verbal_response = intent.get("response")
         cmd_name = intent.get("command")
         args = intent.get("args", {})
+        if self._early and self._early[:2] != (cmd_name, args):
+            self._cancel_early()
 
         # Speak LLM's personality response first
-        if verbal_response:
+        if verbal_response and not spoken:
              self.speak(verbal_response)
 
         # 3. Handle Unknowns
@@ -172,58 +354,93 @@ class AI_Assistant:
                     self.speak("Cancelled, Sir.")
                     return
 
-            result = registry.execute(cmd_name, **args)
-            
-            # Special Handling for Workflows
-            if isinstance(result, dict) and result.get("is_workflow"):
-                steps = result.get("steps", [])
-                self.speak(f"Sir, I have retrieved the procedure. It involves {len(steps)} steps. Shall I proceed?")
-                confirm = input("Proceed with workflow? (y/n): ").lower()
-                if confirm == 'y':
-                    self.speak("Executing procedure now.")
-                    for i, step in enumerate(steps):
-                        s_cmd = step.get("command")
-                        s_args = step.get("args", {})
-                        self.speak(f"Step {i+1}: {s_cmd.replace('_', ' ')}")
-                        s_res = registry.execute(s_cmd, **s_args)
-                        print(f"Step {i+1} Output: {s_res}")
-                    self.speak("Procedure complete, Sir.")
-                else:
-                    self.speak("Workflow cancelled.")
-                return
-
-            # Special Handling for Information Retrieval
-            if isinstance(result, dict) and result.get("is_info_retrieval"):
-                link = result.get("first_link")
-                query = result.get("query")
-                context = ""
-                if link:
-                    self.speak(f"Fetching details from the web, Sir.")
-                    context = registry.execute("get_page_text", url=link)
-                else:
-                    context = "No direct links found, but you can try to answer from your training data if you are sure."
-                
-                new_intent = self.llm.parse_intent(f"Based on this info, answer: {query}", context=context)
-                new_response = new_intent.get("response")
-                if new_response:
-                    self.speak(new_response)
-                return
-
-            print(f"Action Output: {result}")
-            
-            # If the command returned something important (like time or diagnostics), 
-            # and it wasn't already in the verbal response, speak it.
-            if result and str(result) not in str(verbal_response):
-                 self.speak(f"{result}")
+            # Long commands continue in the background; _job_done reports them
+            early = self._early
+            if early and early[0] == cmd_name and early[1] == args:
+                result = jobs.collect(early[2], on_done=self._job_done)
+            else:
+                result = jobs.run(cmd_name, args, on_done=self._job_done)
+            self._handle_result(result, verbal_response)
         elif not verbal_response:
             # Fallback for chat if no 'response' field was provided
             result = registry.execute(cmd_name, **args)
             self.speak(result)
 
+    def _handle_result(self, result, verbal_response=None):
+        """Speaks a command's result, running the follow-up steps workflows and web lookups need."""
+        # Special Handling for Workflows
+        if isinstance(result, dict) and result.get("is_workflow"):
+            steps = result.get("steps", [])
+            self.speak(f"Sir, I have retrieved the procedure. It involves {len(steps)} steps. Shall I proceed?")
+            confirm = input("Proceed with workflow? (y/n): ").lower()
+            if confirm == 'y':
+                self.run_workflow(result)
+            else:
+                self.speak("Workflow cancelled.")
+            return
+
+        # Special Handling for Information Retrieval
+        if isinstance(result, dict) and result.get("is_info_retrieval"):
+            link = result.get("first_link")
+            query = result.get("query")
+            # search_and_summarize already ranked passages from the top results
+            context = result.get("context", "")
+            if not context and link:
+                self.speak(f"Fetching details from the web, Sir.")
+                context = jobs.run("get_page_text", {"url": link})
+            elif not context:
+                context = "No direct links found, but you can try to answer from your training data if you are sure."
+            
+            new_intent = self.llm.parse_intent(f"Based on this info, answer: {query}", context=context)
+            new_response = new_intent.get("response")
+            if new_response:
+                self.llm.remember_result(VOICE_SESSION, new_response)
+                self.speak(new_response)
+            return
+
+        print(f"Action Output: {result}")
+        self.llm.remember_result(VOICE_SESSION, result)
+        
+        # If the command returned something important (like time or diagnostics), 
+        # and it wasn't already in the verbal response, speak it.
+        if result and str(result) not in str(verbal_response):
+             self.speak(f"{result}")
+
+    def run_workflow(self, result):
+        """Runs a retrieved procedure through the workflow engine, reporting steps as they finish."""
+        try:
+            if result.get("path"):
+                workflow = self.workflows.load(result["path"])
+            else:
+                workflow = compile_workflow("procedure", result.get("steps", []), registry)
+        except (OSError, ValueError) as e:
+            self.speak(f"That procedure is invalid, Sir. {e}")
+            return
+
+        def on_step(step_id, step_result):
+            command = workflow.steps[step_id].command
+            print(f"[Workflow] {step_id} ({command}): {step_result['status']} "
+                  f"in {step_result['elapsed']:.2f}s -> {step_result['output'] or step_result['error']}")
+
+        self.speak("Executing procedure now.")
+        start = time.monotonic()
+        results = self.workflows.run(workflow, on_step=on_step)
+        elapsed = time.monotonic() - start
+
+        failed = [step_id for step_id, step_result in results.items() if step_result["status"] != "ok"]
+        if failed:
+            self.speak(f"Procedure finished with {len(failed)} of {len(results)} steps incomplete: "
+                       f"{', '.join(failed)}.")
+        else:
+            self.speak(f"Procedure complete in {elapsed:.1f} seconds, Sir.")
+
     def run(self):
         self.speak("System online.")
+        if self.mic:
+            self.start_pipeline()
         try:
             while self.running:
+                self._drain_finished()
                 text = self.listen()
                 if text:
                     if "stop listening" in text or "exit" in text:
@@ -236,6 +453,21 @@ class AI_Assistant:
         except KeyboardInterrupt:
             self.running = False
             print("\nStopping...")
+        finally:
+            if self.mic:
+                self.noise_floor.save()
+                stats = self.gate.stats
+                print(f"[WakeGate] {stats['passed']}/{stats['phrases']} phrases sent to ASR "
+                      f"({self.gate.avoided():.0%} avoided locally).")
+            for name, health in self.llm.health_stats().items():
+                print(f"[LLM] {name}: {health['state']}, {health['latency_ms']} ms, "
+                      f"error rate {health['error_rate']:.0%}, {health['failures']}/{health['requests']} failed")
+            for stage, latency in telemetry.metrics.snapshot().items():
+                print(f"[Telemetry] {stage}: p50 {latency['p50']} ms, p95 {latency['p95']} ms (n={latency['n']})")
+            telemetry.exporter.flush()
+            jobs.shutdown()
+            if config.SYSTEM_SAMPLER:
+                get_sampler().stop()
 
 def select_provider():
     """Forces user to select an AI provider at startup."""
@@ -0,0 +1,196 @@
+import datetime
+import os
+import re
+import sqlite3
+import threading
+from typing import List, Optional, Tuple
+import config
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+_LEGACY_LINE = re.compile(r"^\[(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\] ?(.*)$")
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+
+def parse_when(text: Optional[str], end: bool = False) -> Optional[str]:
+    """
+    Turns 'today', 'yesterday', 'N days ago', 'last week' or an ISO date/datetime into
+    a TIMESTAMP_FORMAT string. With `end`, bare dates mean the end of that day.
+    """
+    if not text:
+        return None
+    text = text.strip().lower()
+    today = datetime.date.today()
+
+    match = re.fullmatch(r"(\d+) (day|week|month)s?( ago)?", text)
+    if text == "today":
+        day = today
+    elif text == "yesterday":
+        day = today - datetime.timedelta(days=1)
+    elif text in ("last week", "this week"):
+        day = today - datetime.timedelta(days=7)
+    elif text in ("last month", "this month"):
+        day = today - datetime.timedelta(days=30)
+    elif match:
+        days = {"day": 1, "week": 7, "month": 30}[match.group(2)] * int(match.group(1))
+        day = today - datetime.timedelta(days=days)
+    else:
+        try:
+            moment = datetime.datetime.fromisoformat(text)
+        except ValueError:
+            raise ValueError(f"Unrecognised date '{text}'. Use YYYY-MM-DD, 'yesterday' or 'N days ago'.")
+        if len(text) > 10:
+            return moment.strftime(TIMESTAMP_FORMAT)
+        day = moment.date()
+
+    moment = datetime.datetime.combine(day, datetime.time.max if end else datetime.time.min)
+    return moment.strftime(TIMESTAMP_FORMAT)
+
+
+def _fts_query(query: str) -> str:
+    """Quotes every word so user text can't be read as FTS5 syntax; words are ANDed and prefix-matched."""
+    return " ".join(f'"{word}"*' for word in _WORD.findall(query))
+
+
+class NotesStore:
+    """
+    Notes kept in SQLite: newest-first reads walk the primary key, date ranges use an
+    index on the timestamp, and text search uses an FTS5 index (LIKE when the SQLite
+    build lacks FTS5). Lines appended to the legacy notes.txt are imported on open.
+    """
+
+    def __init__(self, path: str = None, legacy_path: str = None):
+        self.path = path or config.NOTES_DB_PATH
+        self.legacy_path = legacy_path or config.NOTES_LEGACY_FILE
+        self._lock = threading.Lock()
+
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self._db = sqlite3.connect(self.path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS notes ("
+            " id INTEGER PRIMARY KEY, created TEXT NOT NULL, content TEXT NOT NULL)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS notes_created ON notes(created)")
+        self._db.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+        self.fts = self._create_fts()
+        self._db.commit()
+        self._import_legacy()
+
+    def _create_fts(self) -> bool:
+        try:
+            self._db.execute(
+                "CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5("
+                " content, content='notes', content_rowid='id')"
+            )
+        except sqlite3.OperationalError:
+            print("[Notes] SQLite has no FTS5 support; search falls back to LIKE.")
+            return False
+        self._db.execute(
+            "CREATE TRIGGER IF NOT EXISTS notes_ai AFTER INSERT ON notes BEGIN"
+            " INSERT INTO notes_fts(rowid, content) VALUES (new.id, new.content); END"
+        )
+        self._db.execute(
+            "CREATE TRIGGER IF NOT EXISTS notes_ad AFTER DELETE ON notes BEGIN"
+            " INSERT INTO notes_fts(notes_fts, rowid, content) VALUES ('delete', old.id, old.content); END"
+        )
+        return True
+
+    def _import_legacy(self):
+        """Imports whatever was appended to notes.txt since the last import (tracked by byte offset)."""
+        if not os.path.exists(self.legacy_path):
+            return
+        with self._lock:
+            row = self._db.execute("SELECT value FROM meta WHERE key = 'legacy_offset'").fetchone()
+            offset = int(row[0]) if row else 0
+            if os.path.getsize(self.legacy_path) < offset:
+                offset = 0  # File was replaced; start over
+
+            with open(self.legacy_path, "rb") as f:
+                f.seek(offset)
+                data = f.read()
+            # Only consume complete lines; a partial last line is picked up next time
+            data = data[:data.rfind(b"\n") + 1]
+            if not data:
+                return
+
+            fallback = datetime.datetime.fromtimestamp(os.path.getmtime(self.legacy_path)).strftime(TIMESTAMP_FORMAT)
+            notes: List[list] = []
+            for line in data.decode("utf-8", errors="replace").splitlines():
+                match = _LEGACY_LINE.match(line)
+                if match:
+                    notes.append([match.group(1), match.group(2)])
+                elif notes:
+                    notes[-1][1] += "\n" + line  # Multi-line note
+                elif line.strip():
+                    notes.append([fallback, line])
+
+            self._db.executemany("INSERT INTO notes (created, content) VALUES (?, ?)", notes)
+            self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('legacy_offset', ?)",
+                             (str(offset + len(data)),))
+            self._db.commit()
+        print(f"[Notes] Imported {len(notes)} notes from {self.legacy_path}.")
+
+    def add(self, content: str, created: str = None) -> Tuple[str, str]:
+        created = created or datetime.datetime.now().strftime(TIMESTAMP_FORMAT)
+        with self._lock:
+            self._db.execute("INSERT INTO notes (created, content) VALUES (?, ?)", (created, content))
+            self._db.commit()
+        return created, content
+
+    def latest(self, n: int = 5) -> List[Tuple[str, str]]:
+        """The last `n` notes, oldest first."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT created, content FROM notes ORDER BY id DESC LIMIT ?", (n,)
+            ).fetchall()
+        return rows[::-1]
+
+    def search(self, query: str, since: str = None, until: str = None, limit: int = 10) -> List[Tuple[str, str]]:
+        """Notes matching every word of `query` (best match first), optionally within a date range."""
+        since = since or "0000"
+        until = until or "9999"
+        with self._lock:
+            if self.fts:
+                match = _fts_query(query)
+                if not match:
+                    return []
+                return self._db.execute(
+                    "SELECT n.created, n.content FROM notes_fts f JOIN notes n ON n.id = f.rowid"
+                    " WHERE notes_fts MATCH ? AND n.created BETWEEN ? AND ?"
+                    " ORDER BY bm25(notes_fts) LIMIT ?", (match, since, until, limit)
+                ).fetchall()
+
+            words = _WORD.findall(query)
+            if not words:
+                return []
+            clauses = " AND ".join("content LIKE ?" for _ in words)
+            return self._db.execute(
+                f"SELECT created, content FROM notes WHERE {clauses} AND created BETWEEN ? AND ?"
+                " ORDER BY id DESC LIMIT ?", [f"%{w}%" for w in words] + [since, until, limit]
+            ).fetchall()
+
+    def between(self, since: str, until: str = None, limit: int = 20) -> List[Tuple[str, str]]:
+        """Notes taken in [since, until], oldest first."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT created, content FROM notes WHERE created BETWEEN ? AND ? ORDER BY created LIMIT ?",
+                (since or "0000", until or "9999", limit)
+            ).fetchall()
+
+    def count(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM notes").fetchone()[0]
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_store() -> NotesStore:
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = NotesStore()
+    return _store
@@ -0,0 +1,159 @@
+import textwrap
+import threading
+from collections import OrderedDict
+from typing import List, Optional
+import config
+from ranking import BM25Index
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _ENCODING = None
+
+# Stable part of the system prompt. Everything that changes per request goes after
+# it, so provider-side prompt caching can reuse the whole prefix.
+SYSTEM_TEMPLATE = textwrap.dedent("""
+    You are RJ, a helpful AI Desktop Assistant (modeled after JARVIS).
+    Your goal is to assist the user by executing commands or chatting helpfully.
+
+    AVAILABLE COMMANDS:
+    {commands}
+    - chat: Use this for general conversation, questions, or confirming actions.
+
+    EFFICIENCY & WORKFLOWS:
+    1. If the user asks you to "remember how to do [X]" or "teach you [X]", use `save_workflow`.
+       - 'commands' in `save_workflow` should be a list: [{{ "command": "...", "args": {{...}} }}, ...]
+       - Steps may add "id" and "after": [ids]; steps without shared dependencies run in parallel, and "${{id}}" in args inserts an earlier step's output.
+    2. If the user wants to execute a stored procedure, use `run_workflow`.
+    3. You can suggest creating a workflow if you see the user repeating tasks.
+
+    INFORMATION RETRIEVAL:
+    - If the user asks a factual question (e.g., "What is the weather in Delhi?"), use `search_and_summarize`.
+    - If the user provides a URL and asks about it, use `get_page_text`.
+    - If ADDITIONAL CONTEXT is provided, use it to answer the user's question in the 'response' field.
+
+    RULES:
+    1. ALWAYS output a conversational 'response' field in your JSON. This is what you will say to the user via TTS.
+    2. If executing a command, set the 'command' and 'args' fields.
+    3. ALWAYS request permission for risky commands or before starting a complex workflow by chatting first.
+    4. Be concise, professional, and efficient. Address the user as "Sir" occasionally.
+    5. If the request needs a command that is not listed above, set 'command' to "unknown".
+
+    OUTPUT FORMAT EXAMPLE:
+    {{ "command": "search_and_summarize", "args": {{ "query": "current time in London" }}, "response": "Checking the time in London for you, Sir." }}
+
+    Strict JSON Output Only. No markdown.
+""").strip()
+
+
+def count_tokens(text: str) -> int:
+    """Token count with tiktoken when available, otherwise a ~4 chars/token estimate."""
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return (len(text) + 3) // 4
+
+
+class PromptBuilder:
+    """
+    Builds the system prompt from a cached static prefix plus per-request context.
+    Prefixes are only re-rendered when the registry version changes.
+
+    With PROMPT_TOP_K set, the prefix lists just the commands most relevant to the
+    utterance (BM25 over names, descriptions, example phrases and rule phrases) plus
+    PROMPT_ALWAYS_INCLUDE. Selections are returned in registration order, so the
+    same selection always renders the same, cacheable prefix.
+    """
+
+    def __init__(self, registry, top_k: int = None, always_include: Optional[List[str]] = None):
+        self.registry = registry
+        self.top_k = config.PROMPT_TOP_K if top_k is None else top_k
+        self.always_include = config.PROMPT_ALWAYS_INCLUDE if always_include is None else always_include
+        self._lock = threading.Lock()
+        self._version = -1
+        self._names: List[str] = []
+        self._index: Optional[BM25Index] = None
+        self._prefixes: "OrderedDict[tuple, tuple]" = OrderedDict()
+        self._schemas: "OrderedDict[tuple, dict]" = OrderedDict()
+
+    def select_commands(self, user_input: str, extra: Optional[List[str]] = None) -> Optional[List[str]]:
+        """
+        Names of the commands to list for this utterance, or None for the full catalog
+        (selection disabled, or the registry is small enough to send whole).
+        `extra` names are always included (e.g. commands used earlier in the conversation).
+        """
+        self._refresh()
+        if not self.top_k or len(self._names) <= self.top_k + len(self.always_include):
+            return None
+
+        picked = {self._names[doc_id] for doc_id, _ in self._index.top_k(user_input, self.top_k)}
+        picked.update(name for name in self.always_include + list(extra or []) if name in self.registry._metadata)
+        return [name for name in self._names if name in picked]
+
+    def static_prefix(self, commands: Optional[List[str]] = None) -> str:
+        return self._render(commands)[0]
+
+    def schema(self, commands: Optional[List[str]] = None, per_command: bool = True) -> dict:
+        """JSON schema of the intent for the listed commands (see CommandRegistry.intent_schema)."""
+        self._refresh()
+        key = (tuple(commands) if commands is not None else None, per_command)
+        with self._lock:
+            schema = self._schemas.get(key)
+            if schema is None:
+                schema = self.registry.intent_schema(commands, per_command)
+                self._schemas[key] = schema
+                while len(self._schemas) > 64:
+                    self._schemas.popitem(last=False)
+            return schema
+
+    def dynamic_suffix(self, context: str = "") -> str:
+        return f"ADDITIONAL CONTEXT (Retrieved Info):\n{context}" if context else ""
+
+    def build(self, context: str = "", commands: Optional[List[str]] = None) -> str:
+        """Full system prompt as a single string (static prefix first)."""
+        suffix = self.dynamic_suffix(context)
+        prefix = self.static_prefix(commands)
+        return f"{prefix}\n\n{suffix}" if suffix else prefix
+
+    def prefix_size(self, commands: Optional[List[str]] = None) -> dict:
+        """Size of the cacheable prefix in characters and tokens."""
+        prefix, tokens = self._render(commands)
+        return {"chars": len(prefix), "tokens": tokens, "version": self._version}
+
+    def _render(self, commands: Optional[List[str]]) -> tuple:
+        self._refresh()
+        key = tuple(commands) if commands is not None else None
+        with self._lock:
+            cached = self._prefixes.get(key)
+            if cached is not None:
+                self._prefixes.move_to_end(key)
+                return cached
+
+        prefix = SYSTEM_TEMPLATE.format(commands=self.registry.list_commands(commands))
+        rendered = (prefix, count_tokens(prefix))
+        with self._lock:
+            self._prefixes[key] = rendered
+            while len(self._prefixes) > 64:
+                self._prefixes.popitem(last=False)
+        return rendered
+
+    def _refresh(self):
+        """Rebuilds the relevance index and drops rendered prefixes after registry changes."""
+        if self._version == self.registry.version:
+            return
+        with self._lock:
+            if self._version == self.registry.version:
+                return
+            version = self.registry.version
+            names, documents = [], []
+            for name, meta in list(self.registry._metadata.items()):
+                phrases = list(meta.get("examples") or [])
+                for rule in meta.get("rules") or []:
+                    phrases.extend(rule.get("phrases", []))
+                names.append(name)
+                documents.append(" ".join([name, name, meta["description"]] + phrases))
+            self._names = names
+            self._index = BM25Index(documents)
+            self._prefixes.clear()
+            self._schemas.clear()
+            self._version = version
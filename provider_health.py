@@ -0,0 +1,151 @@
+import threading
+import time
+from typing import List
+import config
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half-open"
+
+# Errors that mean the provider can't be reached at all (as opposed to a bad answer)
+_OUTAGE_ERRORS = {"APIConnectionError", "APITimeoutError", "ServiceUnavailable", "DeadlineExceeded"}
+
+
+def is_outage(error: Exception) -> bool:
+    return isinstance(error, (ConnectionError, TimeoutError)) or type(error).__name__ in _OUTAGE_ERRORS
+
+
+class ProviderHealth:
+    """
+    EWMA latency and error rate of one provider, plus its circuit breaker:
+    closed (normal), open (skipped until a probe succeeds) and half-open (back in
+    rotation; the next request decides between closed and open).
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self.state = CLOSED
+        self.latency = None  # EWMA of successful request latency (seconds)
+        self.error_rate = 0.0  # EWMA of the failure indicator
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.last_error = ""
+        self.opened_at = 0.0
+        self.cooldown = config.LLM_BREAKER_COOLDOWN
+        self._lock = threading.Lock()
+
+    @property
+    def available(self) -> bool:
+        return self.state != OPEN
+
+    def score(self) -> float:
+        """Expected seconds to a successful answer; lower is healthier (unmeasured providers rank last)."""
+        if self.latency is None:
+            return float("inf")
+        return self.latency / max(1.0 - self.error_rate, 0.05)
+
+    def record_success(self, seconds: float):
+        alpha = config.LLM_HEALTH_ALPHA
+        with self._lock:
+            self.requests += 1
+            self.consecutive_failures = 0
+            self.latency = seconds if self.latency is None else alpha * seconds + (1 - alpha) * self.latency
+            self.error_rate *= 1 - alpha
+            if self.state != CLOSED:
+                print(f"[LLM] {self.name} recovered, circuit closed.")
+                self.state = CLOSED
+                self.cooldown = config.LLM_BREAKER_COOLDOWN
+
+    def record_failure(self, error: Exception):
+        alpha = config.LLM_HEALTH_ALPHA
+        with self._lock:
+            self.requests += 1
+            self.failures += 1
+            self.consecutive_failures += 1
+            self.error_rate = alpha + (1 - alpha) * self.error_rate
+            self.last_error = f"{type(error).__name__}: {error}"[:200]
+            if (self.state == HALF_OPEN or is_outage(error)
+                    or self.consecutive_failures >= config.LLM_BREAKER_FAILURES
+                    or (self.requests >= config.LLM_BREAKER_MIN_REQUESTS
+                        and self.error_rate >= config.LLM_BREAKER_ERROR_RATE)):
+                self._trip()
+
+    def probe_due(self, now: float = None) -> bool:
+        now = time.monotonic() if now is None else now
+        return self.state == OPEN and now - self.opened_at >= self.cooldown
+
+    def probe_result(self, ok: bool):
+        """A passing probe puts the provider back in rotation as half-open; a failing one re-opens it for longer."""
+        with self._lock:
+            if self.state != OPEN:
+                return
+            if ok:
+                print(f"[LLM] {self.name} answered a probe, circuit half-open.")
+                self.state = HALF_OPEN
+            else:
+                self.cooldown = min(self.cooldown * 2, config.LLM_BREAKER_MAX_COOLDOWN)
+                self.opened_at = time.monotonic()
+
+    def _trip(self):
+        if self.state == HALF_OPEN:
+            self.cooldown = min(self.cooldown * 2, config.LLM_BREAKER_MAX_COOLDOWN)
+        if self.state != OPEN:
+            print(f"[LLM] {self.name} circuit open ({self.last_error}); retrying in {self.cooldown:.0f}s.")
+        self.state = OPEN
+        self.opened_at = time.monotonic()
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "state": self.state,
+                "latency_ms": round(self.latency * 1000) if self.latency is not None else None,
+                "error_rate": round(self.error_rate, 3),
+                "requests": self.requests,
+                "failures": self.failures,
+                "last_error": self.last_error,
+            }
+
+
+class ProviderRouter:
+    """
+    Orders providers by health for each request and probes open circuits in the
+    background, so a provider that went down is skipped instantly and rejoins as
+    soon as it answers again.
+    """
+
+    def __init__(self, providers: List):
+        self.providers = providers
+        self._thread = None
+        self._stop = threading.Event()
+
+    def order(self) -> List:
+        """Usable providers, healthiest first: half-open ones get their trial request, then closed by score."""
+        if config.LLM_ROUTING != "health":
+            return [p for p in self.providers if p.health.available]
+        ranked = [(0 if p.health.state == HALF_OPEN else 1, p.health.score(), i, p)
+                  for i, p in enumerate(self.providers) if p.health.available]
+        return [p for *_, p in sorted(ranked, key=lambda r: r[:3])]
+
+    def stats(self) -> dict:
+        return {p.name: p.health.snapshot() for p in self.providers}
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._probe_loop, name="llm-probe", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def probe_now(self, now: float = None):
+        for provider in self.providers:
+            if provider.health.probe_due(now):
+                try:
+                    ok = provider.probe()
+                except Exception:
+                    ok = False
+                # Providers without a cheap probe (None) just get a trial request after the cooldown
+                provider.health.probe_result(ok is not False)
+
+    def _probe_loop(self):
+        while not self._stop.wait(config.LLM_PROBE_INTERVAL):
+            self.probe_now()
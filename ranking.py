@@ -0,0 +1,110 @@
+import math
+import re
+from collections import Counter, defaultdict
+from typing import Dict, List, Sequence, Tuple
+
+STOPWORDS = {
+    "a", "an", "the", "and", "or", "of", "to", "in", "on", "for", "is", "it", "me", "my",
+    "you", "your", "i", "what", "please", "can", "could", "would", "with", "this", "that", "be",
+}
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """Lower-cases, drops stopwords and folds simple plurals ('notes' -> 'note')."""
+    tokens = []
+    for word in _WORD.findall(text.lower().replace("_", " ")):
+        if word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+class BM25Index:
+    """
+    Minimal Okapi BM25 index over a fixed list of documents.
+    Scoring only touches the postings of the query terms.
+    """
+
+    def __init__(self, documents: Sequence[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.size = len(documents)
+        self._lengths = []
+        self._postings: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+
+        for doc_id, text in enumerate(documents):
+            terms = tokenize(text)
+            self._lengths.append(len(terms))
+            for term, freq in Counter(terms).items():
+                self._postings[term].append((doc_id, freq))
+
+        self._avg_length = (sum(self._lengths) / self.size) if self.size else 0.0
+        self._idf = {
+            term: math.log(1 + (self.size - len(posts) + 0.5) / (len(posts) + 0.5))
+            for term, posts in self._postings.items()
+        }
+
+    def scores(self, query: str) -> Dict[int, float]:
+        scores: Dict[int, float] = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self._idf.get(term)
+            if idf is None:
+                continue
+            for doc_id, freq in self._postings[term]:
+                norm = 1 - self.b + self.b * (self._lengths[doc_id] / (self._avg_length or 1))
+                scores[doc_id] += idf * freq * (self.k1 + 1) / (freq + self.k1 * norm)
+        return scores
+
+    def top_k(self, query: str, k: int) -> List[Tuple[int, float]]:
+        """Best `k` (doc_id, score) pairs with a positive score, highest first."""
+        ranked = sorted(self.scores(query).items(), key=lambda item: item[1], reverse=True)
+        return ranked[:k]
+
+
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+def split_passages(text: str, size: int = 400) -> List[str]:
+    """Groups sentences into passages of roughly `size` characters."""
+    passages, current = [], ""
+    for sentence in _SENTENCE_END.split(text):
+        sentence = sentence.strip()
+        if not sentence:
+            continue
+        if current and len(current) + len(sentence) + 1 > size:
+            passages.append(current)
+            current = ""
+        current = f"{current} {sentence}".strip()
+    if current:
+        passages.append(current)
+    return passages
+
+
+def rank_passages(query: str, documents: Sequence[Tuple[str, str]], budget: int, size: int = 400) -> str:
+    """
+    Splits (source, text) documents into passages, ranks them against `query` with
+    BM25 and returns the best ones that fit in `budget` characters, each tagged with
+    its source. Falls back to the leading passages when nothing matches the query.
+    """
+    passages = [(source, passage) for source, text in documents for passage in split_passages(text, size)]
+    if not passages:
+        return ""
+
+    index = BM25Index([passage for _, passage in passages])
+    order = [doc_id for doc_id, _ in index.top_k(query, len(passages))]
+    seen = set(order)
+    order += [doc_id for doc_id in range(len(passages)) if doc_id not in seen]
+
+    picked, used = [], 0
+    for doc_id in order:
+        source, passage = passages[doc_id]
+        entry = f"[{source}] {passage}"
+        if used + len(entry) + 1 > budget:
+            continue
+        picked.append(entry)
+        used += len(entry) + 1
+    return "\n".join(picked)
@@ -1,24 +1,42 @@
-
-from command_registry import registry
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import config
+import telemetry
+from job_executor import DONE, jobs
 from llm_engine import LLMEngine
-import skills.browser
-import skills.system
-import skills.files
-import skills.media
-import skills.input
+from skill_loader import load_skills
+
+load_skills([
+    "skills.browser",
+    "skills.system",
+    "skills.files",
+    "skills.media",
+    "skills.input",
+    "skills.jobs",
+])
 
 # Shared engine instance
 llm = LLMEngine()
 
-def handle_remote_command(text: str) -> str:
+# Shared by every bot so the total number of commands in flight stays bounded
+_executor = ThreadPoolExecutor(max_workers=config.REMOTE_CONFIG["workers"], thread_name_prefix="remote")
+
+def handle_remote_command(text: str, session: str = None, notify=None) -> str:
     """
     Processes a text command from Discord/Telegram and returns the output.
+    `session` identifies the conversation ("discord:<channel>", "telegram:<user>").
+    With `notify`, a command still running after JOB_FOREGROUND_WAIT continues in the
+    background and notify(text) later delivers its result; without it, this waits.
     """
+    with telemetry.span("turn", session=session, remote=True):
+        return _handle_remote_command(text, session, notify)
+
+def _handle_remote_command(text: str, session: str, notify) -> str:
     if not text:
         return "Empty command."
 
     # 1. Parse Intent
-    intent = llm.parse_intent(text)
+    intent = llm.parse_intent(text, session=session)
     cmd_name = intent.get("command")
     args = intent.get("args", {})
 
@@ -26,8 +44,92 @@ def handle_remote_command(text: str) -> str:
         return f"I didn't understand: '{text}'"
 
     # 2. Execute
+    on_done = None
+    if notify is not None:
+        def on_done(job):
+            if job.state != DONE:
+                notify(f"Job {job.id} ({job.command}) {job.state}.")
+            else:
+                notify(f"Job {job.id} ({job.command}) is done: {_format_result(job.result, session)}")
     try:
-        result = registry.execute(cmd_name, **args)
-        return str(result)
+        result = jobs.run(cmd_name, args, on_done=on_done)
     except Exception as e:
         return f"Error executing '{cmd_name}': {e}"
+    return _format_result(result, session)
+
+def _format_result(result, session: str) -> str:
+    # 3. Answer retrieval questions from the fetched passages
+    if isinstance(result, dict) and result.get("is_info_retrieval"):
+        context = result.get("context") or "No direct links found, but you can try to answer from your training data if you are sure."
+        answer = llm.parse_intent(f"Based on this info, answer: {result.get('query')}", context=context)
+        answer = answer.get("response") or context
+        llm.remember_result(session, answer)
+        return answer
+
+    llm.remember_result(session, result)
+    return str(result)
+
+class RemoteDispatcher:
+    """
+    Async front-end to handle_remote_command for the bot event loops.
+    Every user gets a bounded FIFO drained by its own task, so a user's commands run
+    in order while different users are served concurrently on the shared worker pool.
+    The event loop itself never blocks on an LLM call or a skill.
+    """
+
+    def __init__(self, max_queue: int = None):
+        self.max_queue = max_queue or config.REMOTE_CONFIG["max_queue"]
+        self._queues = {}
+        self._workers = {}
+        self._pending = {}  # Queued + running commands per user
+
+    async def submit(self, user_key, text: str, reply, session: str = None) -> bool:
+        """
+        Queues a command for `user_key`. `reply` is an async callable used for the
+        acknowledgement and the final answer; `session` is the conversation the command
+        belongs to. Returns False if the user's queue is full.
+        """
+        ahead = self._pending.get(user_key, 0)
+        if ahead >= self.max_queue:
+            await self._safe_reply(reply, f"Still busy with your last {ahead} requests, Sir. Please try again shortly.")
+            return False
+
+        queue = self._queues.get(user_key)
+        if queue is None:
+            queue = self._queues[user_key] = asyncio.Queue()
+        self._pending[user_key] = ahead + 1
+        queue.put_nowait((text, reply, session))
+        if user_key not in self._workers:
+            self._workers[user_key] = asyncio.get_running_loop().create_task(self._drain(user_key, queue))
+
+        await self._safe_reply(reply, "Working on it..." if not ahead else f"Working on it ({ahead} ahead of this one)...")
+        return True
+
+    async def _drain(self, user_key, queue: asyncio.Queue):
+        loop = asyncio.get_running_loop()
+        try:
+            while not queue.empty():
+                text, reply, session = queue.get_nowait()
+
+                def notify(message, reply=reply):
+                    # Called from a job thread when a backgrounded command finishes
+                    asyncio.run_coroutine_threadsafe(self._safe_reply(reply, message), loop)
+
+                try:
+                    response = await loop.run_in_executor(_executor, handle_remote_command, text, session, notify)
+                except Exception as e:
+                    response = f"Error: {e}"
+                self._pending[user_key] -= 1
+                await self._safe_reply(reply, response)
+        finally:
+            # No await between the empty check and here, so nothing can slip in unseen
+            self._workers.pop(user_key, None)
+            self._queues.pop(user_key, None)
+            self._pending.pop(user_key, None)
+
+    @staticmethod
+    async def _safe_reply(reply, text: str):
+        try:
+            await reply(text)
+        except Exception as e:
+            print(f"[Remote] Failed to send reply: {e}")
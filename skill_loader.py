@@ -0,0 +1,117 @@
+import ast
+import importlib
+import importlib.util
+import json
+import os
+import threading
+from typing import Dict, List
+import config
+from command_registry import registry
+
+MANIFEST_PATH = config.SKILL_MANIFEST_PATH
+
+
+def _signature(args: ast.arguments) -> str:
+    """Renders a FunctionDef's arguments the way str(inspect.signature(func)) would."""
+    params = []
+    positional = args.posonlyargs + args.args
+    defaults = [None] * (len(positional) - len(args.defaults)) + list(args.defaults)
+    for arg, default in zip(positional, defaults):
+        text = arg.arg
+        if arg.annotation is not None:
+            text += f": {ast.unparse(arg.annotation)}"
+            if default is not None:
+                text += f" = {ast.unparse(default)}"
+        elif default is not None:
+            text += f"={ast.unparse(default)}"
+        params.append(text)
+    return f"({', '.join(params)})"
+
+
+def scan_module(path: str, module: str) -> List[Dict]:
+    """
+    Extracts @registry.register(...) metadata from a skill file without importing it.
+    Decorator arguments must be literals (they already are for every skill).
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+
+    entries = []
+    for node in tree.body:
+        if not isinstance(node, ast.FunctionDef):
+            continue
+        for decorator in node.decorator_list:
+            if not (isinstance(decorator, ast.Call) and isinstance(decorator.func, ast.Attribute)
+                    and decorator.func.attr == "register"
+                    and isinstance(decorator.func.value, ast.Name) and decorator.func.value.id == "registry"):
+                continue
+            options = {kw.arg: ast.literal_eval(kw.value) for kw in decorator.keywords}
+            for position, value in zip(("name", "description", "safe"), decorator.args):
+                options[position] = ast.literal_eval(value)
+            options["module"] = module
+            options["params"] = _signature(node.args)
+            entries.append(options)
+    return entries
+
+
+def build_manifest(modules: List[str]) -> Dict[str, Dict]:
+    """
+    Returns {module: {"mtime": ..., "commands": [...]}} for the given modules,
+    re-scanning only files that changed since the manifest was last written.
+    """
+    try:
+        with open(MANIFEST_PATH, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+
+    changed = False
+    for module in modules:
+        spec = importlib.util.find_spec(module)
+        if spec is None or not spec.origin:
+            raise ImportError(f"Skill module '{module}' not found.")
+        mtime = os.path.getmtime(spec.origin)
+        entry = manifest.get(module)
+        if not entry or entry.get("mtime") != mtime:
+            manifest[module] = {"mtime": mtime, "commands": scan_module(spec.origin, module)}
+            changed = True
+
+    if changed:
+        try:
+            if os.path.dirname(MANIFEST_PATH):
+                os.makedirs(os.path.dirname(MANIFEST_PATH), exist_ok=True)
+            with open(MANIFEST_PATH, "w", encoding="utf-8") as f:
+                json.dump(manifest, f, indent=2)
+        except OSError:
+            pass
+    return manifest
+
+
+def load_skills(modules: List[str], lazy: bool = None, prewarm: bool = None):
+    """
+    Registers the commands of the given skill modules.
+    In lazy mode only the manifest is read; each module is imported on the first
+    execution of one of its commands, or in a background thread when `prewarm` is set.
+    """
+    lazy = config.LAZY_SKILLS if lazy is None else lazy
+    prewarm = config.SKILL_PREWARM if prewarm is None else prewarm
+
+    if not lazy:
+        for module in modules:
+            importlib.import_module(module)
+        return
+
+    manifest = build_manifest(modules)
+    for module in modules:
+        for command in manifest[module]["commands"]:
+            if registry.has_command(command["name"]):
+                continue
+            registry.register_lazy(
+                command["name"], module, command["description"],
+                safe=command.get("safe", False), params=command["params"],
+                rules=command.get("rules"), examples=command.get("examples"),
+                timeout=command.get("timeout"), independent=command.get("independent", False)
+            )
+
+    if prewarm:
+        threading.Thread(target=registry.preload, name="skill-prewarm", daemon=True).start()
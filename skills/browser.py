@@ -1,12 +1,27 @@
 
+import contextvars
+import threading
 import webbrowser
 import pyautogui
 import time
-import requests
+from concurrent.futures import ThreadPoolExecutor, wait
+from urllib.parse import quote_plus, unquote, urlparse
 from bs4 import BeautifulSoup
+import config
 from command_registry import registry, CommandRegistry
+from http_client import fetch
+from content_extractor import extract_main_text
+from job_executor import cancel_scope
+from ranking import rank_passages
 
-@registry.register(name="open_browser", description="Opens a URL in the default browser.", safe=True)
+# Shared by all searches; fetches still running at SEARCH_DEADLINE are cancelled, which frees their worker
+_fetch_pool = ThreadPoolExecutor(max_workers=config.SEARCH_RESULTS * 2, thread_name_prefix="search")
+
+@registry.register(name="open_browser", description="Opens a URL in the default browser.", safe=True, rules=[
+    {"phrases": ["open youtube"], "args": {"url": "https://youtube.com"},
+     "response": "Of course, Sir. Opening YouTube.", "priority": 85},
+    {"phrases": ["open"], "args": {"url": "{url}"}, "response": "Opening {target} for you, Sir.", "priority": 60},
+])
 def open_browser(url: str):
     """Opens a website in the default browser."""
     if not url.startswith(("http://", "https://")):
@@ -14,68 +29,101 @@ def open_browser(url: str):
     webbrowser.open(url)
     return f"Opening {url} for you, sir."
 
-@registry.register(name="close_browser", description="Closes the current browser window.", safe=False)
+@registry.register(name="close_browser", description="Closes the current browser window.", safe=False, rules=[
+    {"phrases": ["close browser", "close window"], "response": "Closing the browser window, Sir.", "priority": 90},
+])
 def close_browser():
     """Closes the active window (Alt+F4)."""
     pyautogui.hotkey('alt', 'f4')
     return "Browser closed."
 
-@registry.register(name="close_tab", description="Closes the current browser tab.", safe=True)
+@registry.register(name="close_tab", description="Closes the current browser tab.", safe=True, rules=[
+    {"phrases": ["close tab", "close this tab"], "response": "Closing the tab, Sir.", "priority": 90},
+])
 def close_tab():
     """Closes the active tab (Ctrl+W)."""
     pyautogui.hotkey('ctrl', 'w')
     return "Tab closed."
 
-@registry.register(name="google_search", description="Performs a Google search.", safe=True)
+@registry.register(name="google_search", description="Performs a Google search.", safe=True, rules=[
+    {"phrases": ["google", "search"], "args": {"query": "{remainder}"},
+     "response": "Searching Google for {remainder}, Sir.", "priority": 70},
+])
 def google_search(query: str):
     """Searches Google for the given query."""
     url = f"https://www.google.com/search?q={query}"
     webbrowser.open(url)
     return f"Searched Google for: {query}"
 
-@registry.register(name="get_page_text", description="Retrieves text content from a URL to answer questions.", safe=True)
+@registry.register(name="get_page_text", description="Retrieves text content from a URL to answer questions.", safe=True,
+                   timeout=15, independent=True)
 def get_page_text(url: str):
     """Fetches text content from a URI."""
     try:
         if not url.startswith(("http://", "https://")):
             url = "https://" + url
-            
-        headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
-        
-        soup = BeautifulSoup(response.text, 'html.parser')
-        for script in soup(["script", "style"]):
-            script.extract()
-        text = soup.get_text()
-        lines = (line.strip() for line in text.splitlines())
-        chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-        text = '\n'.join(chunk for chunk in chunks if chunk)
-        return text[:3000]
+        return extract_main_text(url, timeout=10)
     except Exception as e:
         return f"Error retrieving page info: {str(e)}"
 
-@registry.register(name="search_and_summarize", description="Searches the web and provides a spoken summary of the information.", safe=True)
+@registry.register(name="search_and_summarize", description="Searches the web and provides a spoken summary of the information.", safe=True,
+                   timeout=20, independent=True)
 def search_and_summarize(query: str):
-    """Marker command for the engine to handle a deeper search."""
-    search_url = f"https://www.google.com/search?q={query}"
-    headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'}
+    """
+    Marker command for the engine to handle a deeper search.
+    The top result pages are fetched in parallel under a shared deadline and the
+    passages most relevant to the query are returned as 'context'.
+    """
+    search_url = f"https://www.google.com/search?q={quote_plus(query)}"
     
     try:
-        response = requests.get(search_url, headers=headers)
+        response = fetch(search_url)
         soup = BeautifulSoup(response.text, 'html.parser')
         
-        # Try to find the first search result link
+        # Collect the result links in ranking order
         links = []
         for a in soup.find_all('a', href=True):
             href = a['href']
             if "url?q=" in href and "webcache" not in href:
-                actual_link = href.split("url?q=")[1].split("&")[0]
-                if actual_link.startswith("http"):
+                actual_link = unquote(href.split("url?q=")[1].split("&")[0])
+                if actual_link.startswith("http") and actual_link not in links:
                     links.append(actual_link)
-        
-        if links:
-            return {"is_info_retrieval": True, "query": query, "first_link": links[0]}
-        return {"is_info_retrieval": True, "query": query, "first_link": None}
-    except:
+    except Exception:
+        links = []
+
+    if not links:
         return {"is_info_retrieval": True, "query": query, "first_link": None}
+
+    links = links[:config.SEARCH_RESULTS]
+    return {
+        "is_info_retrieval": True,
+        "query": query,
+        "first_link": links[0],
+        "links": links,
+        "context": _gather_context(query, links),
+    }
+
+def _fetch_page(link: str, expired: threading.Event) -> str:
+    with cancel_scope(expired):
+        return extract_main_text(link, max_chars=config.PAGE_MAX_CHARS * 2, timeout=config.SEARCH_DEADLINE)
+
+def _gather_context(query: str, links: list) -> str:
+    """Fetches `links` concurrently; pages not done by the deadline are dropped."""
+    expired = threading.Event()
+    # In copies of this context, so cancelling the search job stops its fetches too
+    futures = {
+        link: _fetch_pool.submit(contextvars.copy_context().run, _fetch_page, link, expired)
+        for link in links
+    }
+    done, _ = wait(futures.values(), timeout=config.SEARCH_DEADLINE)
+    # Stragglers stop at their next chunk (http_client checks for cancellation)
+    expired.set()
+    for future in futures.values():
+        future.cancel()
+
+    documents = [
+        (urlparse(link).netloc, future.result())
+        for link, future in futures.items()
+        if future in done and future.exception() is None and future.result()
+    ]
+    return rank_passages(query, documents, config.SEARCH_CONTEXT_CHARS)
@@ -9,7 +9,8 @@ def _is_safe_path(path):
     abs_path = os.path.abspath(path)
     return any(abs_path.startswith(safe) for safe in ALLOWED_PATHS) or True # Override for demo purposes
  
-@registry.register(name="list_files", description="List files in a directory.", safe=True)
+@registry.register(name="list_files", description="List files in a directory.", safe=True,
+                   examples=["what is in my downloads folder", "show the contents of documents"])
 def list_files(directory: str = "."):
     if not _is_safe_path(directory):
         return "Access to this directory is restricted."
@@ -19,7 +20,8 @@ def list_files(directory: str = "."):
     except Exception as e:
         return str(e)
 
-@registry.register(name="create_folder", description="Create a new folder.", safe=True)
+@registry.register(name="create_folder", description="Create a new folder.", safe=True,
+                   examples=["make a new directory called projects"])
 def create_folder(path: str):
     if not _is_safe_path(path):
         return "Access Restricted."
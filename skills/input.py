@@ -6,7 +6,8 @@ from command_registry import registry
 # Fail-safe to abort scripts if mouse is moved to corner
 pyautogui.FAILSAFE = True
 
-@registry.register(name="type_text", description="Types text at the current cursor position.", safe=False)
+@registry.register(name="type_text", description="Types text at the current cursor position.", safe=False,
+                   examples=["type hello world", "write this into the document"])
 def type_text(text: str):
     """Types the given text securely."""
     pyautogui.write(text, interval=0.05)
@@ -20,7 +21,8 @@ def press_key(key: str):
         return f"Key '{key}' pressed."
     return f"Error: Key '{key}' not supported."
 
-@registry.register(name="take_screenshot", description="Takes a screenshot of the screen.", safe=True)
+@registry.register(name="take_screenshot", description="Takes a screenshot of the screen.", safe=True,
+                   examples=["capture my screen", "grab a screen capture"])
 def take_screenshot():
     """Captures the screen and saves it."""
     timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
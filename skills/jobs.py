@@ -0,0 +1,19 @@
+from command_registry import registry
+from job_executor import jobs
+
+@registry.register(name="job_status", description="Reports on background jobs: one by id, or all recent ones.",
+                   safe=True, rules=[
+    {"phrases": ["job status", "background jobs", "status of job"], "response": "Checking the jobs, Sir.",
+     "priority": 85},
+], examples=["what's still running", "is the download done"])
+def job_status(job_id: int = None):
+    """Describes job `job_id`, or every running and recently finished job."""
+    return jobs.status(job_id)
+
+@registry.register(name="cancel_job", description="Cancels a running background job by its id.", safe=True, rules=[
+    {"phrases": ["cancel job", "stop job"], "args": {"job_id": "{rest}"}, "response": "Cancelling it, Sir.",
+     "priority": 90},
+], examples=["cancel job 3", "stop that search"])
+def cancel_job(job_id: int):
+    """Cancels job `job_id`; it stops at its next checkpoint and its result is discarded."""
+    return jobs.cancel(job_id)
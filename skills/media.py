@@ -8,7 +8,8 @@ from config import ALLOWED_PATHS
 # Use the first allowed path for saving media
 MEDIA_PATH = os.path.join(ALLOWED_PATHS[0], "Captured_Media")
 
-@registry.register(name="take_photo", description="Captures a photo from the webcam.", safe=True)
+@registry.register(name="take_photo", description="Captures a photo from the webcam.", safe=True,
+                   examples=["take a picture of me", "snap a selfie", "capture the camera"])
 def take_photo():
     """Captures a single frame from the primary camera."""
     if not os.path.exists(MEDIA_PATH):
@@ -1,34 +1,44 @@
-
-import os
-import datetime
 from command_registry import registry
-from config import ALLOWED_PATHS
+from notes_store import get_store, parse_when
 
-LOGS_DIR = os.path.join(os.getcwd(), "logs")
-NOTES_FILE = os.path.join(LOGS_DIR, "notes.txt")
+def _format(notes) -> str:
+    return "\n".join(f"[{created}] {content}" for created, content in notes)
 
-@registry.register(name="take_note", description="Saves a text note to the log file.", safe=True)
+@registry.register(name="take_note", description="Saves a text note to the notes store.", safe=True, rules=[
+    {"phrases": ["take note", "take a note", "write note", "save this"], "args": {"content": "{rest}"},
+     "response": "Note saved, Sir.", "priority": 80},
+])
 def take_note(content: str):
-    """Appends a timestamped note to logs/notes.txt"""
-    if not os.path.exists(LOGS_DIR):
-        os.makedirs(LOGS_DIR)
-        
-    timestamp = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    entry = f"[{timestamp}] {content}\n"
-    
-    with open(NOTES_FILE, "a", encoding="utf-8") as f:
-        f.write(entry)
-        
+    """Stores a timestamped note."""
+    get_store().add(content)
     return f"Note saved: {content}"
 
-@registry.register(name="read_notes", description="Reads the last 5 notes.", safe=True)
-def read_notes():
+@registry.register(name="read_notes", description="Reads the last n notes (default 5).", safe=True, rules=[
+    {"phrases": ["read notes", "read my notes", "last note"], "response": "Reading your last notes, Sir.", "priority": 80},
+])
+def read_notes(n: int = 5):
     """Reads the most recent notes."""
-    if not os.path.exists(NOTES_FILE):
+    notes = get_store().latest(int(n))
+    if not notes:
         return "No notes found."
-        
-    with open(NOTES_FILE, "r", encoding="utf-8") as f:
-        lines = f.readlines()
-        
-    last_notes = lines[-5:] # Get last 5
-    return "Here are your recent notes:\n" + "".join(last_notes)
+    return "Here are your recent notes:\n" + _format(notes)
+
+@registry.register(name="search_notes", description="Full-text search of notes, optionally only those since a date (YYYY-MM-DD, 'yesterday', '3 days ago').", safe=True, rules=[
+    {"phrases": ["search notes for", "search my notes for", "find notes about", "find my notes about"],
+     "args": {"query": "{rest}"}, "response": "Searching your notes, Sir.", "priority": 85},
+], examples=["what did I note about the dentist", "find my note on the wifi password"])
+def search_notes(query: str, since: str = None, limit: int = 10):
+    """Notes containing every word of the query, best match first."""
+    notes = get_store().search(query, since=parse_when(since), limit=int(limit))
+    if not notes:
+        return f"I found no notes about '{query}', Sir."
+    return f"Notes matching '{query}':\n" + _format(notes)
+
+@registry.register(name="notes_between", description="Lists notes taken between two dates (YYYY-MM-DD, 'yesterday', '2 weeks ago'; end defaults to now).", safe=True,
+    examples=["what notes did I take yesterday", "show my notes from last week"])
+def notes_between(start: str, end: str = None, limit: int = 20):
+    """Notes in a date range, oldest first."""
+    notes = get_store().between(parse_when(start), parse_when(end, end=True), limit=int(limit))
+    if not notes:
+        return "No notes were taken in that period, Sir."
+    return "Notes from that period:\n" + _format(notes)
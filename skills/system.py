@@ -2,22 +2,60 @@
 import os
 import datetime
 import platform
-import psutil
 from command_registry import registry
+from system_monitor import get_sampler
 
-@registry.register(name="get_time", description="Returns current date and time.", safe=True)
+@registry.register(name="get_time", description="Returns current date and time.", safe=True, rules=[
+    {"phrases": ["time", "date"], "response": "Checking the system time for you, Sir.", "priority": 40},
+], independent=True)
 def get_time():
     """Returns the current system time."""
     now = datetime.datetime.now()
     return now.strftime("%Y-%m-%d %H:%M:%S")
 
-@registry.register(name="system_info", description="Get CPU, RAM, and OS info.", safe=True)
+@registry.register(name="system_info", description="Get CPU, RAM, and OS info.", safe=True, rules=[
+    {"phrases": ["system", "cpu", "ram"], "response": "Retrieving system diagnostics, Sir.", "priority": 40},
+], independent=True)
 def system_info():
-    """Returns system diagnostic information."""
-    cpu = psutil.cpu_percent(interval=1)
-    ram = psutil.virtual_memory().percent
+    """Returns system diagnostic information from the background sampler's latest sample."""
+    sample = get_sampler().latest()
     os_info = f"{platform.system()} {platform.release()}"
-    return f"OS: {os_info} | CPU Usage: {cpu}% | RAM Usage: {ram}%"
+    return f"OS: {os_info} | CPU Usage: {sample['cpu']:.1f}% | RAM Usage: {sample['ram']:.1f}%"
+
+def _rate(value: float) -> str:
+    for unit in ("B/s", "KB/s", "MB/s"):
+        if value < 1024:
+            return f"{value:.0f} {unit}"
+        value /= 1024
+    return f"{value:.1f} GB/s"
+
+@registry.register(name="system_trends", description="CPU, RAM, disk and network min/avg/max over the last N minutes.",
+                   safe=True, rules=[
+    {"phrases": ["system trends", "cpu history", "usage over"], "response": "Summarizing recent system load, Sir.",
+     "priority": 45},
+], examples=["how busy has the cpu been in the last ten minutes", "average ram usage recently"], independent=True)
+def system_trends(minutes: float = 5):
+    """Summarizes the sampler's history: min / avg / max per metric."""
+    trends = get_sampler().trends(minutes)
+    parts = []
+    for name, label, fmt in (("cpu", "CPU", "{:.0f}%"), ("ram", "RAM", "{:.0f}%"),
+                             ("disk_read", "Disk read", None), ("disk_write", "Disk write", None),
+                             ("net_recv", "Net in", None), ("net_sent", "Net out", None)):
+        if name in trends:
+            low, avg, high = (fmt.format(v) if fmt else _rate(v) for v in trends[name])
+            parts.append(f"{label} min {low} / avg {avg} / max {high}")
+    return f"Last {minutes:g} min ({trends['samples']} samples): " + " | ".join(parts)
+
+@registry.register(name="top_processes", description="Lists the processes using the most CPU.", safe=True, rules=[
+    {"phrases": ["top processes", "what is using the cpu", "busiest processes"],
+     "response": "Checking the busiest processes, Sir.", "priority": 50},
+], independent=True)
+def top_processes():
+    """The busiest processes from the sampler's last process scan."""
+    top = get_sampler().latest()["top"]
+    if not top:
+        return "No process data yet, Sir."
+    return "Top processes: " + ", ".join(f"{name} {cpu:.0f}% CPU / {mem:.1f}% RAM" for name, cpu, mem in top)
 
 @registry.register(name="shutdown_system", description="Shuts down the computer.", safe=False)
 def shutdown_system(delay: int = 60):
@@ -29,7 +67,14 @@ def shutdown_system(delay: int = 60):
         os.system(f"shutdown -h +{delay//60}")
     return f"Shutdown scheduled in {delay} seconds."
 
-@registry.register(name="chat", description="Replies to the user with a spoken message.", safe=True)
+@registry.register(name="chat", description="Replies to the user with a spoken message.", safe=True, rules=[
+    {"phrases": ["who are you"], "args": {"text": "I am RJ, your personal AI assistant."},
+     "response": "I am RJ, your personal AI assistant. How may I help you today?", "priority": 50},
+    {"phrases": ["thank you", "thanks", "thank"], "args": {"text": "You are welcome, sir."},
+     "response": "You are most welcome, Sir.", "priority": 45},
+    {"phrases": ["hello", "hi", "hey"], "args": {"text": "Hello, sir. Ready for commands."},
+     "response": "Hello, sir. I am online and ready to assist.", "priority": 10},
+])
 def chat(text: str):
     """Returns the text for the assistant to speak."""
     return text
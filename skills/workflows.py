@@ -2,6 +2,7 @@
 import os
 import json
 from command_registry import registry
+from workflow_engine import compile_workflow
 
 WORKFLOWS_DIR = "workflows"
 
@@ -13,13 +14,26 @@ def save_workflow(name: str, commands: list):
     """
     Saves a workflow.
     Example commands: [{"command": "open_browser", "args": {"url": "google.com"}}, ...]
+    Steps may also set "id", "after" (ids they wait for), "timeout" and "retries";
+    see workflow_engine.compile_workflow.
     """
+    try:
+        workflow = compile_workflow(name, commands, registry)
+    except ValueError as e:
+        return f"I couldn't save that procedure, Sir: {e}"
+
     filepath = os.path.join(WORKFLOWS_DIR, f"{name.lower().replace(' ', '_')}.json")
     with open(filepath, 'w') as f:
         json.dump(commands, f, indent=4)
+    parallel = sum(1 for step in workflow.steps.values() if not step.after)
+    if parallel > 1:
+        return (f"Workflow '{name}' has been saved to my memory, Sir. {parallel} of its {len(workflow)} "
+                f"steps can start at once; the rest run in order.")
     return f"Workflow '{name}' has been saved to my memory, Sir."
 
-@registry.register(name="list_workflows", description="Lists all saved workflows.", safe=True)
+@registry.register(name="list_workflows", description="Lists all saved workflows.", safe=True, rules=[
+    {"phrases": ["list workflows", "list procedures"], "response": "Retrieving stored procedures, Sir.", "priority": 80},
+])
 def list_workflows():
     """Lists available workflows."""
     files = [f.replace(".json", "").replace("_", " ") for f in os.listdir(WORKFLOWS_DIR) if f.endswith(".json")]
@@ -30,9 +44,8 @@ def list_workflows():
 @registry.register(name="run_workflow", description="Executes a saved sequence of commands.", safe=False)
 def run_workflow(name: str):
     """
-    This is a special command. The main engine should probably handle the extraction
-    and step-by-step execution to allow for speech in between.
-    For now, we return the commands so main.py can iterate.
+    This is a special command. The steps are returned to main.py, which runs them
+    through the WorkflowEngine (independent steps concurrently).
     """
     filepath = os.path.join(WORKFLOWS_DIR, f"{name.lower().replace(' ', '_')}.json")
     if not os.path.exists(filepath):
@@ -41,4 +54,4 @@ def run_workflow(name: str):
     with open(filepath, 'r') as f:
         commands = json.load(f)
     
-    return {"is_workflow": True, "steps": commands}
+    return {"is_workflow": True, "steps": commands, "path": filepath}
@@ -0,0 +1,144 @@
+import queue
+import threading
+from collections import deque
+from typing import Iterable, Optional
+import pyttsx3
+import config
+import telemetry
+from tts_cache import TTSCache, WavPlayer
+
+
+class SpeechOutput:
+    """
+    Owns the pyttsx3 engine on a dedicated thread so callers can queue sentences
+    without blocking (the engine must be driven from the thread that created it).
+
+    With the TTS cache enabled, known phrases and anything spoken TTS_CACHE_MIN_USES
+    times are rendered to WAV files while the engine is idle and later played back
+    directly, skipping synthesis.
+    """
+
+    def __init__(self, warm_phrases: Optional[Iterable[str]] = None):
+        self.available = False
+        self.cache = None
+        self._warm = list(warm_phrases or [])
+        self._queue = queue.Queue()
+        self._ready = threading.Event()
+        self._speaking = threading.Event()
+        self._interrupt = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="tts", daemon=True)
+        self._thread.start()
+        self._ready.wait()
+
+    @property
+    def speaking(self) -> bool:
+        return self._speaking.is_set()
+
+    def say(self, text: str):
+        """Queues text to be spoken and returns immediately."""
+        if self.available and text:
+            # The caller's span (the turn) becomes the parent of the speak span on the TTS thread
+            self._queue.put((text, telemetry.current()))
+
+    def wait(self):
+        """Blocks until everything queued so far has been spoken."""
+        if self.available:
+            self._queue.join()
+
+    def stop(self):
+        """Barge-in: drops queued sentences and cuts the current one short."""
+        if not self.available:
+            return
+        while True:
+            try:
+                self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._queue.task_done()
+        # Set after draining, so the worker can't pick up a queued sentence and clear it
+        self._interrupt.set()
+
+    def _run(self):
+        try:
+            engine = pyttsx3.init()
+            # Set voice
+            voices = engine.getProperty('voices')
+            if voices:
+                engine.setProperty('voice', voices[0].id)
+
+            # The engine can only be stopped from its own loop, i.e. from a callback
+            def on_word(name, location, length):
+                # Only live speech is interrupted; background renders always complete
+                if self._interrupt.is_set() and self._speaking.is_set():
+                    engine.stop()
+
+            engine.connect('started-word', on_word)
+            self.available = True
+        except Exception:
+            engine = None
+        finally:
+            self._ready.set()
+        if not engine:
+            return
+
+        player = None
+        if config.TTS_CACHE_ENABLED:
+            try:
+                self.cache = TTSCache()
+                player = WavPlayer()
+                if not player.available:
+                    self.cache = None
+            except Exception as e:
+                print(f"[TTS] Cache disabled: {e}")
+                self.cache = None
+
+        voice, rate = engine.getProperty('voice'), engine.getProperty('rate')
+        renders = deque()
+        scheduled = set()
+
+        def schedule(text):
+            key = TTSCache.make_key(text, voice, rate)
+            if key not in scheduled and not self.cache.has(key):
+                scheduled.add(key)
+                renders.append((key, text))
+
+        if self.cache:
+            for text in self._warm + self.cache.most_spoken(config.TTS_WARM_TOP_N):
+                schedule(text)
+
+        while True:
+            try:
+                # Render pending phrases only while there is nothing to say
+                text, parent = self._queue.get(timeout=0.2 if renders else None)
+            except queue.Empty:
+                key, text = renders.popleft()
+                path = self.cache.path_for(key)
+                try:
+                    engine.save_to_file(text, path)
+                    engine.runAndWait()
+                    self.cache.add(key, text, path)
+                except Exception as e:
+                    print(f"[TTS] Could not render '{text}': {e}")
+                continue
+
+            self._interrupt.clear()
+            self._speaking.set()
+            span = telemetry.start_span("speak", parent=parent, chars=len(text))
+            try:
+                clip = None
+                if self.cache:
+                    clip = self.cache.lookup(TTSCache.make_key(text, voice, rate))
+                played = bool(clip and player.play(clip, self._interrupt))
+                if not played:
+                    engine.say(text)
+                    engine.runAndWait()
+                span.set(cached=played, interrupted=self._interrupt.is_set())
+                if self.cache and len(text) <= config.TTS_CACHE_MAX_CHARS:
+                    if self.cache.record(text) >= config.TTS_CACHE_MIN_USES and not clip:
+                        schedule(text)
+            except Exception as e:
+                span.fail(e)
+            finally:
+                telemetry.end_span(span)
+                self._speaking.clear()
+                self._queue.task_done()
@@ -0,0 +1,185 @@
+import threading
+import time
+from array import array
+from typing import Dict, List, Optional, Tuple
+import psutil
+import config
+
+# Row layout of the history buffer; per-core CPU fills the columns from CORES on
+TIME, CPU, RAM, DISK_READ, DISK_WRITE, NET_SENT, NET_RECV, CORES = range(8)
+
+# Trend series: name -> (column, unit)
+SERIES = {
+    "cpu": (CPU, "%"),
+    "ram": (RAM, "%"),
+    "disk_read": (DISK_READ, "B/s"),
+    "disk_write": (DISK_WRITE, "B/s"),
+    "net_sent": (NET_SENT, "B/s"),
+    "net_recv": (NET_RECV, "B/s"),
+}
+
+
+class RingBuffer:
+    """
+    Fixed number of fixed-width rows of floats in one flat array('d'): appending
+    overwrites the oldest row, and no per-sample objects are kept.
+    """
+
+    def __init__(self, capacity: int, width: int):
+        self.capacity = capacity
+        self.width = width
+        self._data = array("d", bytes(8 * capacity * width))
+        self._next = 0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def append(self, row):
+        with self._lock:
+            start = self._next * self.width
+            self._data[start:start + self.width] = array("d", row)
+            self._next = (self._next + 1) % self.capacity
+            self._count = min(self._count + 1, self.capacity)
+
+    def latest(self) -> Optional[array]:
+        with self._lock:
+            if not self._count:
+                return None
+            start = (self._next - 1) % self.capacity * self.width
+            return self._data[start:start + self.width]
+
+    def column(self, index: int, since: float = 0.0) -> List[float]:
+        """Values of one column for rows whose timestamp (column 0) is >= `since`, oldest first."""
+        values = []
+        with self._lock:
+            row = self._next
+            for _ in range(self._count):
+                row = (row - 1) % self.capacity
+                start = row * self.width
+                if self._data[start + TIME] < since:
+                    break
+                values.append(self._data[start + index])
+        values.reverse()
+        return values
+
+
+class SystemSampler:
+    """
+    Samples CPU (total and per core), RAM, disk and network I/O rates every
+    SYSTEM_SAMPLE_INTERVAL seconds on a daemon thread, and the top processes every
+    SYSTEM_TOP_INTERVAL. CPU use is measured between samples, so reading it never blocks.
+    """
+
+    def __init__(self, interval: float = None, minutes: float = None):
+        self.interval = interval or config.SYSTEM_SAMPLE_INTERVAL
+        minutes = minutes or config.SYSTEM_HISTORY_MINUTES
+        self.cores = psutil.cpu_count() or 1
+        self.history = RingBuffer(max(int(minutes * 60 / self.interval), 1), CORES + self.cores)
+        self.top: List[Tuple[str, float, float]] = []  # (name, CPU %, memory %), busiest first
+        self._top_at = 0.0
+        self._io = None  # (time, disk counters, net counters) of the previous sample
+        self._thread = None
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._prime()
+            self._thread = threading.Thread(target=self._run, name="system-sampler", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def sample(self):
+        """Takes one sample (the sampler thread calls this; so does a cold latest())."""
+        with self._lock:
+            if self._io is None:
+                self._prime()
+            # cpu_percent measures since the previous call: give a cold sample a short interval
+            time.sleep(max(0.1 - (time.time() - self._io[0]), 0))
+            now = time.time()
+            cores = psutil.cpu_percent(percpu=True) or [0.0]
+            disk, net = psutil.disk_io_counters(), psutil.net_io_counters()
+            then, last_disk, last_net = self._io
+            elapsed = max(now - then, 1e-6)
+
+            def rate(current, previous, field):
+                if current is None or previous is None:
+                    return 0.0
+                return max(getattr(current, field) - getattr(previous, field), 0) / elapsed
+
+            row = [now, sum(cores) / len(cores), psutil.virtual_memory().percent,
+                   rate(disk, last_disk, "read_bytes"), rate(disk, last_disk, "write_bytes"),
+                   rate(net, last_net, "bytes_sent"), rate(net, last_net, "bytes_recv")]
+            row += (list(cores) + [0.0] * self.cores)[:self.cores]
+            self.history.append(row)
+            self._io = (now, disk, net)
+            if now - self._top_at >= config.SYSTEM_TOP_INTERVAL:
+                self._top_at = now
+                self.top = self._top_processes()
+
+    def latest(self) -> Dict[str, object]:
+        """The newest sample as a dict (sampling once if there is none yet)."""
+        row = self.history.latest()
+        if row is None:
+            self.sample()
+            row = self.history.latest()
+        sample = {name: row[column] for name, (column, _) in SERIES.items()}
+        sample.update(time=row[TIME], cores=list(row[CORES:]), top=list(self.top))
+        return sample
+
+    def trends(self, minutes: float) -> Dict[str, Tuple[float, float, float]]:
+        """(min, avg, max) per series over the last `minutes`, plus 'samples': n."""
+        if not len(self.history):
+            self.sample()
+        since = time.time() - minutes * 60
+        result = {}
+        for name, (column, _) in SERIES.items():
+            values = self.history.column(column, since)
+            if values:
+                result[name] = (min(values), sum(values) / len(values), max(values))
+        result["samples"] = len(self.history.column(TIME, since))
+        return result
+
+    def _prime(self):
+        psutil.cpu_percent(percpu=True)
+        self._io = (time.time(), psutil.disk_io_counters(), psutil.net_io_counters())
+        # Per-process CPU is also measured from the previous call, so walk the table once
+        self._top_processes()
+
+    @staticmethod
+    def _top_processes() -> List[Tuple[str, float, float]]:
+        processes = []
+        for process in psutil.process_iter(["name", "cpu_percent", "memory_percent"]):
+            info = process.info
+            processes.append((info["name"] or str(process.pid), info["cpu_percent"] or 0.0,
+                              info["memory_percent"] or 0.0))
+        processes.sort(key=lambda p: p[1], reverse=True)
+        return processes[:config.SYSTEM_TOP_PROCESSES]
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sample()
+            except Exception as e:
+                print(f"[System] Sampling failed: {e}")
+
+
+_sampler = None
+_sampler_lock = threading.Lock()
+
+
+def get_sampler() -> SystemSampler:
+    """The shared sampler, started on first use (or at startup with SYSTEM_SAMPLER)."""
+    global _sampler
+    if _sampler is None:
+        with _sampler_lock:
+            if _sampler is None:
+                _sampler = SystemSampler()
+                _sampler.start()
+    return _sampler
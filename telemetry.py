@@ -0,0 +1,388 @@
+import contextvars
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+import config
+
+# Histogram bucket bounds (seconds): from a local command to a slow cloud round trip
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+QUANTILES = (0.5, 0.95, 0.99)
+
+# Span attribute that splits a stage into one series per value (rj_command_seconds{command=...})
+LABELS = {"execute": "command", "llm.request": "provider"}
+
+# Token counters reported by llm.request spans
+TOKEN_KINDS = ("prompt_tokens", "completion_tokens", "cached_tokens")
+
+_current = contextvars.ContextVar("span", default=None)
+_lock = threading.Lock()
+log = logging.getLogger(__name__)
+
+
+def new_trace_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+
+class Span:
+    """
+    One timed stage of an interaction. Spans opened while another is current become
+    its children and share its trace id, so a turn's ASR, LLM, skill and TTS time
+    can be told apart.
+    """
+
+    def __init__(self, name: str, parent: "Span" = None, trace_id: str = None, **attrs):
+        self.name = name
+        self.parent = parent
+        self.trace_id = parent.trace_id if parent else trace_id or new_trace_id()
+        self.span_id = uuid.uuid4().hex[:16]
+        self.attrs = attrs
+        self.status = "ok"
+        self.wall = time.time()
+        self.start = time.perf_counter()
+        self.duration = None
+
+    def set(self, **attrs):
+        self.attrs.update(attrs)
+
+    def add(self, **counters):
+        """Adds to numeric attributes of this span and all its ancestors (token usage per turn)."""
+        with _lock:
+            span = self
+            while span is not None:
+                for key, value in counters.items():
+                    span.attrs[key] = span.attrs.get(key, 0) + value
+                span = span.parent
+
+    def fail(self, error: Exception):
+        self.status = "error"
+        self.attrs["error"] = f"{type(error).__name__}: {error}"[:200]
+
+    def to_dict(self) -> dict:
+        return {"trace": self.trace_id, "span": self.span_id,
+                "parent": self.parent.span_id if self.parent else None,
+                "name": self.name, "start": round(self.wall, 6), "ms": round(self.duration * 1000, 3),
+                "status": self.status, **self.attrs}
+
+
+class _NoopSpan:
+    """Stands in for a Span when telemetry is disabled."""
+    trace_id = None
+
+    def set(self, **attrs):
+        pass
+
+    def add(self, **counters):
+        pass
+
+    def fail(self, error):
+        pass
+
+
+NOOP = _NoopSpan()
+
+
+class LatencyHistogram:
+    """
+    Cumulative Prometheus buckets, plus the samples of the last TELEMETRY_WINDOW
+    seconds for rolling quantiles (so a tail-latency regression shows up right away
+    instead of being averaged into the lifetime totals).
+    """
+
+    def __init__(self):
+        self.buckets = [0] * (len(BUCKETS) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self.errors = 0
+        self.recent = deque(maxlen=config.TELEMETRY_WINDOW_SAMPLES)  # (monotonic time, seconds)
+
+    def observe(self, seconds: float, error: bool = False):
+        self.buckets[bisect_left(BUCKETS, seconds)] += 1
+        self.sum += seconds
+        self.count += 1
+        self.errors += error
+        self.recent.append((time.monotonic(), seconds))
+
+    def window(self) -> list:
+        cutoff = time.monotonic() - config.TELEMETRY_WINDOW
+        while self.recent and self.recent[0][0] < cutoff:
+            self.recent.popleft()
+        return sorted(seconds for _, seconds in self.recent)
+
+    def quantiles(self) -> Tuple[Dict[float, float], list]:
+        """Rolling quantiles and the window's samples."""
+        samples = self.window()
+        if not samples:
+            return {}, samples
+        return {q: samples[min(int(round(q * (len(samples) - 1))), len(samples) - 1)] for q in QUANTILES}, samples
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in labels.items()) + "}"
+
+
+class Metrics:
+    """Latency histograms per stage and per labelled series, and LLM token counters per provider."""
+
+    def __init__(self):
+        self._histograms: Dict[Tuple[str, str, str], LatencyHistogram] = {}
+        self._tokens: Dict[Tuple[str, str, str], int] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, span: Span):
+        keys = [("stage", span.name, None)]
+        label = LABELS.get(span.name)
+        if label and span.attrs.get(label):
+            keys.append((label, span.name, str(span.attrs[label])))
+        with self._lock:
+            for key in keys:
+                histogram = self._histograms.get(key)
+                if histogram is None:
+                    histogram = self._histograms[key] = LatencyHistogram()
+                histogram.observe(span.duration, span.status != "ok")
+            if span.name == "llm.request":
+                for kind in TOKEN_KINDS:
+                    if span.attrs.get(kind):
+                        key = (span.attrs.get("provider", ""), span.attrs.get("model", ""), kind)
+                        self._tokens[key] = self._tokens.get(key, 0) + span.attrs[kind]
+
+    def snapshot(self) -> Dict[str, dict]:
+        """Recent p50/p95/p99 (ms) per series, e.g. {'parse_intent': {...}, 'command:get_time': {...}}."""
+        result = {}
+        with self._lock:
+            for (label, stage, value), histogram in sorted(self._histograms.items(), key=lambda i: str(i[0])):
+                quantiles, samples = histogram.quantiles()
+                if samples:
+                    name = stage if value is None else f"{label}:{value}"
+                    result[name] = {"n": len(samples), **{f"p{int(q * 100)}": round(v * 1000, 1) for q, v in quantiles.items()}}
+        return result
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        families: Dict[str, list] = {}
+        with self._lock:
+            for (label, stage, value), h in sorted(self._histograms.items(), key=lambda i: str(i[0])):
+                name = f"rj_{label}_seconds"
+                labels = {"stage": stage} if value is None else {label: value}
+                lines = families.setdefault(name, [])
+                cumulative = 0
+                for bound, count in zip(BUCKETS + (float("inf"),), h.buckets):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"{name}_bucket{_labels(**labels, le=le)} {cumulative}")
+                lines.append(f"{name}_sum{_labels(**labels)} {h.sum:.6f}")
+                lines.append(f"{name}_count{_labels(**labels)} {h.count}")
+                families.setdefault(f"rj_{label}_errors_total", []).append(
+                    f"rj_{label}_errors_total{_labels(**labels)} {h.errors}")
+                quantiles, samples = h.quantiles()
+                recent = families.setdefault(f"rj_{label}_recent_seconds", [])
+                for q, v in quantiles.items():
+                    recent.append(f"rj_{label}_recent_seconds{_labels(**labels, quantile=q)} {v:.6f}")
+                recent.append(f"rj_{label}_recent_seconds_sum{_labels(**labels)} {sum(samples):.6f}")
+                recent.append(f"rj_{label}_recent_seconds_count{_labels(**labels)} {len(samples)}")
+            tokens = [f"rj_llm_tokens_total{_labels(provider=p, model=m, kind=k)} {v}"
+                      for (p, m, k), v in sorted(self._tokens.items())]
+
+        out = []
+        for name, lines in families.items():
+            if name.endswith("_errors_total"):
+                kind, help_text = "counter", "Failed spans."
+            elif name.endswith("_recent_seconds"):
+                kind, help_text = "summary", f"Span latency over the last {config.TELEMETRY_WINDOW:g}s."
+            else:
+                kind, help_text = "histogram", "Span latency."
+            out += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"] + lines
+        if tokens:
+            out += ["# HELP rj_llm_tokens_total LLM tokens used.", "# TYPE rj_llm_tokens_total counter"] + tokens
+        return "\n".join(out) + "\n"
+
+
+class Exporter:
+    """
+    Background writer, so spans never wait on disk: appends finished spans to the
+    JSONL trace file (rotated at TELEMETRY_TRACE_MAX_BYTES) and rewrites the metrics
+    file every TELEMETRY_METRICS_INTERVAL seconds.
+    """
+
+    def __init__(self, metrics: Metrics):
+        self.metrics = metrics
+        self._queue = queue.Queue()
+        self._thread = None
+        self._server = None
+        self._start_lock = threading.Lock()
+
+    def submit(self, record: dict):
+        if self._thread is None:
+            self.start()
+        self._queue.put(record)
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="telemetry", daemon=True)
+            self._thread.start()
+            if config.TELEMETRY_METRICS_PORT:
+                self.serve(config.TELEMETRY_METRICS_PORT)
+
+    def flush(self, timeout: float = 2.0):
+        """Waits until queued spans are on disk and writes the metrics file."""
+        if self._thread is None:
+            return
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def serve(self, port: int, host: str = "127.0.0.1"):
+        """Serves the metrics at http://host:port/metrics for a Prometheus scraper."""
+        metrics = self.metrics
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                if self.path.split("?")[0] != "/metrics":
+                    self.send_error(404)
+                    return
+                body = metrics.render().encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        try:
+            self._server = ThreadingHTTPServer((host, port), Handler)
+        except OSError as e:
+            print(f"[Telemetry] Metrics endpoint unavailable on port {port}: {e}")
+            return
+        threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+        print(f"[Telemetry] Metrics at http://{host}:{port}/metrics")
+
+    def _run(self):
+        next_write = time.monotonic() + config.TELEMETRY_METRICS_INTERVAL
+        while True:
+            batch, waiters = [], []
+            try:
+                item = self._queue.get(timeout=max(next_write - time.monotonic(), 0.01))
+                while True:
+                    (waiters if isinstance(item, threading.Event) else batch).append(item)
+                    item = self._queue.get_nowait()
+            except queue.Empty:
+                pass
+            try:
+                if batch:
+                    self._write_traces(batch)
+                if waiters or time.monotonic() >= next_write:
+                    self._write_metrics()
+                    next_write = time.monotonic() + config.TELEMETRY_METRICS_INTERVAL
+            except Exception as e:
+                print(f"[Telemetry] Export failed: {e}")
+            for waiter in waiters:
+                waiter.set()
+
+    def _write_traces(self, records: list):
+        path = config.TELEMETRY_TRACE_PATH
+        if not path:
+            return
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        try:
+            if os.path.getsize(path) > config.TELEMETRY_TRACE_MAX_BYTES:
+                os.replace(path, path + ".1")
+        except OSError:
+            pass
+        with open(path, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(r, ensure_ascii=False, default=str) + "\n" for r in records))
+
+    def _write_metrics(self):
+        path = config.TELEMETRY_METRICS_PATH
+        if not path:
+            return
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # Written aside and renamed, so a scraper never reads half a file
+        tmp = path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.metrics.render())
+        os.replace(tmp, path)
+
+
+metrics = Metrics()
+exporter = Exporter(metrics)
+
+
+def current() -> Optional[Span]:
+    return _current.get()
+
+
+def tag(**attrs):
+    """Sets attributes on the current span, if any (e.g. which provider answered)."""
+    s = _current.get()
+    if s is not None:
+        s.set(**attrs)
+
+
+def start_span(name: str, parent: Span = None, trace_id: str = None, **attrs):
+    """
+    A span that is not made current, for work that outlives the caller's frame
+    (a generator, another thread). Finish it with end_span.
+    """
+    if not config.TELEMETRY_ENABLED:
+        return NOOP
+    return Span(name, parent if parent is not None else _current.get(), trace_id, **attrs)
+
+
+def end_span(span, error: Exception = None, end: float = None):
+    if span is NOOP or span.duration is not None:
+        return
+    span.duration = (time.perf_counter() if end is None else end) - span.start
+    if error is not None:
+        span.fail(error)
+    metrics.observe(span)
+    exporter.submit(span.to_dict())
+    if span.parent is None:
+        log.info("%s %.0f ms trace=%s %s", span.name, span.duration * 1000, span.trace_id,
+                 " ".join(f"{k}={v}" for k, v in span.attrs.items()))
+
+
+@contextmanager
+def span(name: str, parent: Span = None, trace_id: str = None, **attrs):
+    """
+    Times the block as a child of the current span (or of `parent`, for work handed
+    over from another thread; or as the root of `trace_id`). Exceptions mark it failed.
+    """
+    s = start_span(name, parent, trace_id, **attrs)
+    if s is NOOP:
+        yield s
+        return
+    token = _current.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        end_span(s, e if isinstance(e, Exception) else None)
+        raise
+    finally:
+        _current.reset(token)
+        end_span(s)
+
+
+def record(name: str, start: float, end: float = None, parent: Span = None, trace_id: str = None, **attrs):
+    """Records a span the caller timed itself (perf_counter values), e.g. a phrase cut by the capture loop."""
+    s = start_span(name, parent, trace_id, **attrs)
+    if s is not NOOP:
+        s.wall -= s.start - start
+        s.start = start
+        end_span(s, end=end)
+    return s
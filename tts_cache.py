@@ -0,0 +1,176 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import wave
+from typing import List, Optional
+import config
+
+try:
+    import pyaudio
+except ImportError:
+    pyaudio = None
+
+PLAYBACK_CHUNK = 1024
+
+
+class TTSCache:
+    """
+    Rendered speech on disk, keyed on (text, voice, rate), with an SQLite index.
+    Also counts how often each text is spoken, so the most frequent responses can be
+    rendered ahead of time. The least recently played files are evicted beyond `max_bytes`,
+    and the least recently spoken counts beyond `max_spoken`.
+    """
+
+    def __init__(self, directory: str = None, max_bytes: int = None, max_spoken: int = None):
+        self.directory = directory or config.TTS_CACHE_DIR
+        self.max_bytes = max_bytes or config.TTS_CACHE_MAX_BYTES
+        self.max_spoken = max_spoken or config.TTS_SPOKEN_MAX_ROWS
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+
+        os.makedirs(self.directory, exist_ok=True)
+        self._db = sqlite3.connect(os.path.join(self.directory, "index.db"), check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS clips ("
+            " key TEXT PRIMARY KEY, text TEXT NOT NULL, file TEXT NOT NULL,"
+            " size INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS spoken ("
+            " text TEXT PRIMARY KEY, count INTEGER NOT NULL, last_spoken REAL NOT NULL)"
+        )
+        # most_spoken reads the first index backwards; pruning walks the second
+        self._db.execute("CREATE INDEX IF NOT EXISTS spoken_rank ON spoken (count, last_spoken)")
+        self._db.execute("CREATE INDEX IF NOT EXISTS spoken_recent ON spoken (last_spoken)")
+        self._db.commit()
+
+    @staticmethod
+    def make_key(text: str, voice: str, rate) -> str:
+        return hashlib.sha1("\x1f".join([text.strip(), str(voice), str(rate)]).encode("utf-8")).hexdigest()
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.wav")
+
+    def has(self, key: str) -> bool:
+        with self._lock:
+            return self._db.execute("SELECT 1 FROM clips WHERE key = ?", (key,)).fetchone() is not None
+
+    def lookup(self, key: str) -> Optional[str]:
+        """Path of the rendered clip, or None if it isn't cached (or the file vanished)."""
+        with self._lock:
+            row = self._db.execute("SELECT file FROM clips WHERE key = ?", (key,)).fetchone()
+            if row and os.path.exists(row[0]):
+                self._db.execute("UPDATE clips SET last_used = ? WHERE key = ?", (time.time(), key))
+                self._db.commit()
+                self.hits += 1
+                return row[0]
+            if row:
+                self._db.execute("DELETE FROM clips WHERE key = ?", (key,))
+                self._db.commit()
+            self.misses += 1
+            return None
+
+    def add(self, key: str, text: str, path: str):
+        if not os.path.exists(path) or not is_playable(path):
+            discard(path)
+            return
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO clips (key, text, file, size, last_used) VALUES (?, ?, ?, ?, ?)",
+                (key, text, path, os.path.getsize(path), time.time())
+            )
+            self._evict()
+            self._db.commit()
+
+    def record(self, text: str) -> int:
+        """Counts one utterance of `text`; returns how often it has been spoken."""
+        with self._lock:
+            self._db.execute(
+                "INSERT INTO spoken (text, count, last_spoken) VALUES (?, 1, ?)"
+                " ON CONFLICT(text) DO UPDATE SET count = count + 1, last_spoken = excluded.last_spoken",
+                (text, time.time())
+            )
+            count = self._db.execute("SELECT count FROM spoken WHERE text = ?", (text,)).fetchone()[0]
+            if count == 1:
+                # Only a new row can push the table past its cap
+                self._db.execute(
+                    "DELETE FROM spoken WHERE text IN"
+                    " (SELECT text FROM spoken ORDER BY last_spoken DESC LIMIT -1 OFFSET ?)",
+                    (self.max_spoken,)
+                )
+            self._db.commit()
+            return count
+
+    def most_spoken(self, n: int) -> List[str]:
+        with self._lock:
+            return [row[0] for row in self._db.execute(
+                "SELECT text FROM spoken ORDER BY count DESC, last_spoken DESC LIMIT ?", (n,)
+            ).fetchall()]
+
+    def stats(self) -> dict:
+        with self._lock:
+            clips, size = self._db.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM clips").fetchone()
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+                "clips": clips, "bytes": size}
+
+    def _evict(self):
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM clips").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, path, size in self._db.execute("SELECT key, file, size FROM clips ORDER BY last_used ASC").fetchall():
+            self._db.execute("DELETE FROM clips WHERE key = ?", (key,))
+            discard(path)
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+
+def is_playable(path: str) -> bool:
+    """Some pyttsx3 drivers write AIFF or empty files; only non-empty PCM WAV is served from the cache."""
+    try:
+        with wave.open(path, "rb") as f:
+            return f.getnframes() > 0
+    except (wave.Error, EOFError, OSError):
+        return False
+
+
+def discard(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+class WavPlayer:
+    """Plays cached clips through PyAudio, checking `interrupt` between chunks for barge-in."""
+
+    def __init__(self):
+        self._audio = pyaudio.PyAudio() if pyaudio else None
+
+    @property
+    def available(self) -> bool:
+        return self._audio is not None
+
+    def play(self, path: str, interrupt: threading.Event) -> bool:
+        """Returns False if the clip couldn't be played (caller falls back to live synthesis)."""
+        try:
+            with wave.open(path, "rb") as f:
+                stream = self._audio.open(format=self._audio.get_format_from_width(f.getsampwidth()),
+                                          channels=f.getnchannels(), rate=f.getframerate(), output=True)
+                try:
+                    data = f.readframes(PLAYBACK_CHUNK)
+                    while data and not interrupt.is_set():
+                        stream.write(data)
+                        data = f.readframes(PLAYBACK_CHUNK)
+                finally:
+                    stream.stop_stream()
+                    stream.close()
+            return True
+        except Exception as e:
+            print(f"[TTS] Cached playback failed: {e}")
+            return False
@@ -0,0 +1,313 @@
+import array
+import math
+import os
+import sys
+import time
+import wave
+from typing import List, Optional, Tuple
+import speech_recognition as sr
+import config
+from audio_capture import frame_rms
+
+try:
+    import webrtcvad
+except ImportError:
+    webrtcvad = None
+
+try:
+    import pocketsphinx  # noqa: F401 (used through speech_recognition)
+except ImportError:
+    pocketsphinx = None
+
+VAD_FRAME_SECONDS = 0.02  # webrtcvad accepts 10, 20 or 30 ms frames
+
+
+def _samples(frame: bytes):
+    samples = array.array("h")
+    samples.frombytes(frame[:len(frame) - len(frame) % 2])
+    if sys.byteorder == "big":
+        samples.byteswap()
+    return samples
+
+
+def _frames(audio: sr.AudioData, seconds: float = VAD_FRAME_SECONDS) -> Tuple[List[bytes], sr.AudioData]:
+    """Splits audio (converted to 16-bit, and to 16 kHz when webrtcvad needs it) into frames."""
+    rate = audio.sample_rate
+    if webrtcvad and rate not in (8000, 16000, 32000, 48000):
+        rate = 16000
+    raw = audio.get_raw_data(convert_rate=rate, convert_width=2)
+    step = int(rate * seconds) * 2
+    frames = [raw[i:i + step] for i in range(0, len(raw) - step + 1, step)]
+    return frames, sr.AudioData(raw, rate, 2)
+
+
+def zero_crossing_rate(samples) -> float:
+    if len(samples) < 2:
+        return 0.0
+    crossings = sum(1 for a, b in zip(samples, samples[1:]) if (a < 0) != (b < 0))
+    return crossings / (len(samples) - 1)
+
+
+class VoiceActivity:
+    """
+    Frame-level voice activity detection over a captured phrase.
+    Uses webrtcvad when installed; otherwise a frame counts as voiced when it is above
+    the energy threshold and its zero-crossing rate is in the range of voiced speech
+    (hiss, fans and clicks cross zero far more often).
+    """
+
+    def __init__(self, aggressiveness: int = 2, min_voiced: float = 0.3, max_zcr: float = 0.25):
+        self.min_voiced = min_voiced
+        self.max_zcr = max_zcr
+        self._vad = webrtcvad.Vad(aggressiveness) if webrtcvad else None
+
+    def voiced_seconds(self, audio: sr.AudioData, threshold: float) -> float:
+        frames, pcm = _frames(audio)
+        voiced = 0
+        for frame in frames:
+            if self._vad:
+                voiced += self._vad.is_speech(frame, pcm.sample_rate)
+            elif frame_rms(frame, 2) > threshold and zero_crossing_rate(_samples(frame)) < self.max_zcr:
+                voiced += 1
+        return voiced * VAD_FRAME_SECONDS
+
+    def is_speech(self, audio: sr.AudioData, threshold: float) -> bool:
+        return self.voiced_seconds(audio, threshold) >= self.min_voiced
+
+
+def features(audio: sr.AudioData) -> List[Tuple[float, float, float]]:
+    """
+    Per-frame (log energy, zero-crossing rate, spectral tilt), with log energy taken
+    relative to the loudest frame so templates match regardless of microphone gain.
+    Tilt is the log ratio of first-difference energy to signal energy (high vs low band).
+    """
+    frames, _ = _frames(audio)
+    rows = []
+    for frame in frames:
+        samples = _samples(frame)
+        energy = frame_rms(frame, 2)
+        diff = math.sqrt(sum((b - a) ** 2 for a, b in zip(samples, samples[1:])) / max(len(samples) - 1, 1))
+        rows.append((math.log10(energy + 1), zero_crossing_rate(samples), math.log10(diff + 1) - math.log10(energy + 1)))
+    if rows:
+        peak = max(row[0] for row in rows)
+        rows = [(energy - peak, zcr * 4, tilt) for energy, zcr, tilt in rows]
+    return rows
+
+
+def _trim(rows: List[tuple], floor: float = -1.5) -> List[tuple]:
+    """Drops leading/trailing frames more than 30x quieter than the peak (template silence)."""
+    loud = [i for i, row in enumerate(rows) if row[0] > floor]
+    return rows[loud[0]:loud[-1] + 1] if loud else rows
+
+
+def subsequence_dtw(template: List[tuple], sequence: List[tuple]) -> float:
+    """
+    Cost of the best alignment of the whole `template` against any stretch of
+    `sequence` (open begin and end), per template frame. O(len(template) * len(sequence)).
+    """
+    if not template or not sequence:
+        return math.inf
+
+    def distance(a, b):
+        return math.sqrt(sum((x - y) ** 2 for x, y in zip(a, b)))
+
+    previous = [distance(template[0], frame) for frame in sequence]
+    for row in template[1:]:
+        current = [0.0] * len(sequence)
+        current[0] = previous[0] + distance(row, sequence[0])
+        for j in range(1, len(sequence)):
+            current[j] = distance(row, sequence[j]) + min(previous[j], current[j - 1], previous[j - 1])
+        previous = current
+    return min(previous) / len(template)
+
+
+class TemplateSpotter:
+    """
+    Matches phrases against a few enrolled recordings of the wake word
+    (WAKE_TEMPLATES_DIR/*.wav) with subsequence DTW over cheap frame features,
+    so the wake word may appear anywhere in the phrase. Only the wake word:
+    WAKE_TRIGGERS ("hey", "can you"...) are not recognized.
+    """
+
+    def __init__(self, directory: str = None, threshold: float = None):
+        self.directory = directory or config.WAKE_TEMPLATES_DIR
+        self.threshold = threshold if threshold is not None else config.WAKE_MATCH_THRESHOLD
+        self.templates = []
+        if os.path.isdir(self.directory):
+            for name in sorted(os.listdir(self.directory)):
+                if name.endswith(".wav"):
+                    with sr.AudioFile(os.path.join(self.directory, name)) as source:
+                        audio = sr.Recognizer().record(source)
+                    self.templates.append(_trim(features(audio)))
+
+    def __bool__(self):
+        return bool(self.templates)
+
+    def score(self, audio: sr.AudioData) -> float:
+        sequence = features(audio)
+        return min((subsequence_dtw(template, sequence) for template in self.templates), default=math.inf)
+
+    def detect(self, audio: sr.AudioData) -> bool:
+        return self.score(audio) <= self.threshold
+
+
+SPHINX_DICTIONARY = os.path.join(os.path.dirname(sr.__file__), "pocketsphinx-data", "en-US",
+                                 "pronounciation-dictionary.dict")
+
+
+def _dictionary(path: str = SPHINX_DICTIONARY) -> Optional[set]:
+    """Words PocketSphinx can pronounce (None if its dictionary isn't where speech_recognition keeps it)."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return {line.split(" ", 1)[0] for line in f if line.strip()}
+    except OSError:
+        return None
+
+
+def sphinx_keywords(phrases: List[str], dictionary: Optional[set] = None) -> List[str]:
+    """
+    Keyphrases PocketSphinx can spot for `phrases`. Sphinx only knows dictionary words,
+    so initials (words without a vowel, like "rj" or "rg") are spelled out as letters,
+    which the dictionary pronounces by name, and phrases with other unknown words are
+    skipped. Without a dictionary every other word is kept.
+    """
+    keywords = []
+    for phrase in phrases:
+        words = []
+        for word in phrase.lower().split():
+            if dictionary is not None and word in dictionary:
+                words.append(word)
+            elif word.isalpha() and not set(word) & set("aeiouy"):
+                words.extend(word)
+            elif dictionary is None and word.isalpha():
+                words.append(word)
+            else:
+                print(f"[WakeGate] PocketSphinx can't spot '{phrase}' ('{word}' isn't in its dictionary).")
+                words = None
+                break
+        if words:
+            keywords.append(" ".join(words))
+    return list(dict.fromkeys(keywords))
+
+
+class SphinxSpotter:
+    """Offline keyword spotting with PocketSphinx for the wake word and its variants."""
+
+    def __init__(self, phrases: List[str] = None, sensitivity: float = 1e-20):
+        self.recognizer = sr.Recognizer()
+        phrases = config.WAKE_WORD_VARIANTS if phrases is None else phrases
+        self.keywords = [(word, sensitivity) for word in sphinx_keywords(phrases, _dictionary())]
+
+    def __bool__(self):
+        return bool(self.keywords)
+
+    def detect(self, audio: sr.AudioData) -> bool:
+        try:
+            return bool(self.recognizer.recognize_sphinx(audio, keyword_entries=self.keywords).strip())
+        except sr.UnknownValueError:
+            return False
+
+
+class AnySpotter:
+    """Passes a phrase when any of its spotters detects something."""
+
+    def __init__(self, *spotters):
+        self.spotters = spotters
+
+    def detect(self, audio: sr.AudioData) -> bool:
+        return any(spotter.detect(audio) for spotter in self.spotters)
+
+
+def make_spotter(mode: str = None):
+    """
+    Keyword spotter for WAKE_GATE: 'template', 'sphinx', 'auto' (the enrolled templates
+    for the wake word plus PocketSphinx for WAKE_TRIGGERS; either alone if the other is
+    missing) or 'off'.
+    """
+    mode = (mode or config.WAKE_GATE).lower()
+    if mode == "off":
+        return None
+    templates = TemplateSpotter() if mode in ("template", "auto") else None
+    if mode == "template" or (templates and pocketsphinx is None):
+        print(f"[WakeGate] Wake-word templates only: phrases starting with {', '.join(config.WAKE_TRIGGERS)} "
+              f"instead of '{config.WAKE_WORD}' are dropped before ASR.")
+        return templates
+    if pocketsphinx is not None:
+        sphinx = SphinxSpotter(config.WAKE_TRIGGERS if templates else None)
+        if templates:
+            return AnySpotter(templates, sphinx) if sphinx else templates
+        if sphinx:
+            return sphinx
+    print("[WakeGate] No wake-word templates or PocketSphinx; only voice activity is checked locally.")
+    return None
+
+
+class WakeGate:
+    """
+    Decides locally whether a captured phrase is worth sending to cloud ASR:
+    it must contain speech (VAD) and the wake word (keyword spotter), unless a
+    follow-up window is open. Echo (a phrase that started over our own speech)
+    always needs the wake word. Spotter errors fail open.
+    """
+
+    def __init__(self, spotter=None, vad: VoiceActivity = None):
+        self.spotter = spotter
+        self.vad = vad or VoiceActivity()
+        self.stats = {"phrases": 0, "no_speech": 0, "no_wake_word": 0, "passed": 0}
+        self._open_until = -math.inf
+
+    def open_window(self, seconds: float = None, now: float = None):
+        """Accepts phrases without the wake word for a while (after the assistant asked "Yes?")."""
+        now = time.monotonic() if now is None else now
+        self._open_until = now + (config.WAKE_FOLLOW_UP if seconds is None else seconds)
+
+    def window_open(self, now: float = None) -> bool:
+        return (time.monotonic() if now is None else now) < self._open_until
+
+    def check(self, audio: sr.AudioData, threshold: float, now: float = None, echo: bool = False) -> bool:
+        now = time.monotonic() if now is None else now
+        self.stats["phrases"] += 1
+
+        if not self.vad.is_speech(audio, threshold):
+            self.stats["no_speech"] += 1
+            return False
+
+        if self.spotter and (echo or not self.window_open(now)):
+            try:
+                heard = self.spotter.detect(audio)
+            except Exception as e:
+                print(f"[WakeGate] Spotter error: {e}")
+                heard = True
+            if not heard:
+                self.stats["no_wake_word"] += 1
+                return False
+
+        self.stats["passed"] += 1
+        return True
+
+    def avoided(self) -> float:
+        """Share of phrases that never reached ASR."""
+        return 1 - self.stats["passed"] / self.stats["phrases"] if self.stats["phrases"] else 0.0
+
+
+def enroll(count: int = 3, device_index: int = None, directory: str = None):
+    """Records `count` samples of the wake word as templates."""
+    directory = directory or config.WAKE_TEMPLATES_DIR
+    os.makedirs(directory, exist_ok=True)
+    recognizer = sr.Recognizer()
+    with sr.Microphone(device_index=device_index) as source:
+        recognizer.adjust_for_ambient_noise(source)
+        for i in range(count):
+            input(f"Press Enter, then say '{config.WAKE_WORD}' once ({i + 1}/{count})...")
+            audio = recognizer.listen(source, timeout=5, phrase_time_limit=2)
+            path = os.path.join(directory, f"wake_{int(time.time())}_{i}.wav")
+            with wave.open(path, "wb") as f:
+                f.setnchannels(1)
+                f.setsampwidth(2)
+                f.setframerate(16000)
+                f.writeframes(audio.get_raw_data(convert_rate=16000, convert_width=2))
+            print(f"Saved {path}")
+
+
+if __name__ == "__main__":
+    enroll(device_index=config.MICROPHONE_INDEX)
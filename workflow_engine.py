@@ -0,0 +1,283 @@
+import contextvars
+import json
+import os
+import re
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Callable, Dict, List, Optional
+import config
+from command_schema import ArgumentError
+from job_executor import CANCELLED, DONE, TIMED_OUT, JobExecutor, jobs
+
+# "${step}" is replaced by a step's output, "${step.key}" by one key of a dict output
+_REF = re.compile(r"\$\{([\w-]+)(?:\.([\w-]+))?\}")
+
+
+class Step:
+    __slots__ = ("id", "command", "args", "after", "timeout", "retries", "backoff")
+
+    def __init__(self, id: str, command: str, args: Dict[str, Any], after: List[str],
+                 timeout: float, retries: int, backoff: float):
+        self.id = id
+        self.command = command
+        self.args = args
+        self.after = after
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+
+
+class Workflow:
+    """A validated step graph; `order` is a topological order of the step ids."""
+
+    def __init__(self, name: str, steps: Dict[str, Step], order: List[str]):
+        self.name = name
+        self.steps = steps
+        self.order = order
+
+    def __len__(self):
+        return len(self.steps)
+
+
+def _references(value) -> List[str]:
+    """Step ids referenced anywhere inside an args value."""
+    if isinstance(value, str):
+        return [match.group(1) for match in _REF.finditer(value)]
+    if isinstance(value, dict):
+        return [ref for item in value.values() for ref in _references(item)]
+    if isinstance(value, list):
+        return [ref for item in value for ref in _references(item)]
+    return []
+
+
+def compile_workflow(name: str, raw: List[Dict[str, Any]], registry=None) -> Workflow:
+    """
+    Builds a Workflow from the saved JSON list of steps:
+        {"id": "news", "command": "get_page_text", "args": {...},
+         "after": ["browser"], "timeout": 20, "retries": 2, "backoff": 1}
+    Only "command" is required. Referencing "${other}" in args implies "after": ["other"].
+    Lists that declare no "id" or "after" at all are old-style procedures: their steps
+    run one after another, except those whose command the `registry` marks independent
+    (lookups like get_page_text), which run alongside the rest.
+    """
+    if not isinstance(raw, list):
+        raise ValueError(f"Workflow '{name}' must be a list of steps.")
+
+    legacy = not any(isinstance(item, dict) and ("id" in item or "after" in item) for item in raw)
+    steps: Dict[str, Step] = {}
+    previous = None
+    for index, item in enumerate(raw):
+        if not isinstance(item, dict) or not item.get("command"):
+            raise ValueError(f"Step {index + 1} of workflow '{name}' has no command.")
+        step_id = str(item.get("id") or f"step{index + 1}")
+        if step_id in steps:
+            raise ValueError(f"Workflow '{name}' has two steps named '{step_id}'.")
+
+        args = item.get("args") or {}
+        if not legacy:
+            after = item.get("after", [])
+        elif registry is not None and registry.is_independent(item["command"]):
+            after = []
+        else:
+            after = [previous] if previous else []
+            previous = step_id
+        if isinstance(after, str):
+            after = [after]
+        after = list(dict.fromkeys(list(after) + _references(args)))
+
+        timeout = item.get("timeout", config.WORKFLOW_STEP_TIMEOUT)
+        steps[step_id] = Step(step_id, item["command"], args, after,
+                              float(timeout) if timeout else 0.0,
+                              int(item.get("retries", config.WORKFLOW_RETRIES)),
+                              float(item.get("backoff", 1.0)))
+
+    for step in steps.values():
+        for dep in step.after:
+            if dep not in steps:
+                raise ValueError(f"Step '{step.id}' of workflow '{name}' depends on unknown step '{dep}'.")
+
+    # Kahn's algorithm, keeping the saved order among steps that are ready together
+    indegree = {step_id: len(step.after) for step_id, step in steps.items()}
+    order = []
+    ready = [step_id for step_id in steps if indegree[step_id] == 0]
+    while ready:
+        current = ready.pop(0)
+        order.append(current)
+        for step_id, step in steps.items():
+            if current in step.after:
+                indegree[step_id] -= 1
+                if indegree[step_id] == 0:
+                    ready.append(step_id)
+    if len(order) != len(steps):
+        cycle = sorted(step_id for step_id in steps if step_id not in order)
+        raise ValueError(f"Workflow '{name}' has a dependency cycle between: {', '.join(cycle)}.")
+
+    return Workflow(name, steps, order)
+
+
+def _resolve(value, outputs: Dict[str, Any]):
+    """Substitutes ${step} / ${step.key} references with earlier outputs."""
+    if isinstance(value, dict):
+        return {key: _resolve(item, outputs) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_resolve(item, outputs) for item in value]
+    if not isinstance(value, str):
+        return value
+
+    def lookup(match):
+        output = outputs[match.group(1)]
+        if match.group(2):
+            output = output.get(match.group(2)) if isinstance(output, dict) else None
+        return output
+
+    whole = _REF.fullmatch(value)
+    if whole:
+        # A lone reference keeps the output's type (lists, dicts, numbers)
+        return lookup(whole)
+    return _REF.sub(lambda match: str(lookup(match)), value)
+
+
+class StepFailed(Exception):
+    def __init__(self, error: Exception, attempts: int, status: str = "failed"):
+        super().__init__(str(error))
+        self.error = error
+        self.attempts = attempts
+        self.status = status
+
+
+class WorkflowEngine:
+    """
+    Runs workflows as dependency graphs: every step whose dependencies succeeded is
+    submitted to a shared thread pool, so a run takes as long as its critical path.
+    Each attempt runs as a job on the job executor, and a step's timeout (covering all
+    attempts) cancels its job. Failed attempts are retried with exponential backoff.
+    Dependents of a failed step are skipped.
+    Compiled workflows are cached per file and recompiled when the file changes.
+    """
+
+    def __init__(self, registry, max_workers: int = None, executor: JobExecutor = None):
+        self.registry = registry
+        self.jobs = executor or (jobs if registry is jobs.registry else JobExecutor(registry))
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or config.WORKFLOW_WORKERS,
+                                            thread_name_prefix="workflow")
+        self._compiled: Dict[str, tuple] = {}
+        self._lock = threading.Lock()
+
+    def load(self, path: str) -> Workflow:
+        mtime = os.path.getmtime(path)
+        with self._lock:
+            cached = self._compiled.get(path)
+            if cached and cached[0] == mtime:
+                return cached[1]
+
+        with open(path, "r") as f:
+            raw = json.load(f)
+        name = os.path.splitext(os.path.basename(path))[0].replace("_", " ")
+        workflow = compile_workflow(name, raw, self.registry)
+        with self._lock:
+            self._compiled[path] = (mtime, workflow)
+        return workflow
+
+    def run(self, workflow: Workflow, confirm: bool = True,
+            on_step: Optional[Callable[[str, dict], None]] = None) -> Dict[str, dict]:
+        """
+        Executes `workflow` and returns {step_id: result} in topological order, where
+        result has "status" (ok, failed, timeout, skipped, cancelled), "output",
+        "error", "attempts" and "elapsed". Unsafe steps are confirmed one by one
+        before anything starts. `on_step(step_id, result)` is called as steps finish.
+        """
+        results: Dict[str, dict] = {}
+
+        def finish(step_id: str, result: dict):
+            results[step_id] = result
+            if on_step:
+                on_step(step_id, result)
+
+        if confirm:
+            for step_id in workflow.order:
+                step = workflow.steps[step_id]
+                if not self.registry.confirm(step.command, step.args):
+                    finish(step_id, {"status": "cancelled", "output": None, "error": "Cancelled by user.",
+                                     "attempts": 0, "elapsed": 0.0})
+
+        running = {}  # future -> (step, started)
+        launched = set(results)
+        outputs: Dict[str, Any] = {}
+
+        while True:
+            for step_id in workflow.order:
+                if step_id in launched:
+                    continue
+                step = workflow.steps[step_id]
+                blocked = [dep for dep in step.after if dep in results and results[dep]["status"] != "ok"]
+                if blocked:
+                    launched.add(step_id)
+                    finish(step_id, {"status": "skipped", "output": None,
+                                     "error": f"Dependency '{blocked[0]}' did not complete.",
+                                     "attempts": 0, "elapsed": 0.0})
+                elif all(dep in outputs for dep in step.after):
+                    launched.add(step_id)
+                    started = time.monotonic()
+                    deadline = started + step.timeout if step.timeout else None
+                    try:
+                        args = _resolve(step.args, outputs)
+                    except Exception as e:
+                        finish(step_id, {"status": "failed", "output": None, "error": f"Bad reference: {e}",
+                                         "attempts": 0, "elapsed": 0.0})
+                        continue
+                    # The step's execute span joins the run's trace
+                    future = self._executor.submit(contextvars.copy_context().run, self._attempt, step, args, deadline)
+                    running[future] = (step, started)
+
+            if not running:
+                break
+
+            # The job executor's watchdog settles a step's job at its deadline
+            done, _ = wait(list(running), return_when=FIRST_COMPLETED)
+
+            now = time.monotonic()
+            for future in done:
+                step, started = running.pop(future)
+                try:
+                    output, attempts = future.result()
+                    outputs[step.id] = output
+                    finish(step.id, {"status": "ok", "output": output, "error": None,
+                                     "attempts": attempts, "elapsed": now - started})
+                except StepFailed as e:
+                    finish(step.id, {"status": e.status, "output": None, "error": str(e.error),
+                                     "attempts": e.attempts, "elapsed": now - started})
+
+        return {step_id: results[step_id] for step_id in workflow.order}
+
+    def _attempt(self, step: Step, args: Dict[str, Any], deadline: Optional[float]):
+        """
+        Runs the step as jobs until one succeeds. Each job gets the time left until the
+        deadline as its timeout, so a step that runs out of time is cancelled
+        (cooperatively, see job_executor) instead of finishing later with its side effects.
+        """
+        attempts = 0
+        while True:
+            attempts += 1
+            timeout = deadline - time.monotonic() if deadline is not None else 0
+            if deadline is not None and timeout <= 0:
+                raise StepFailed(TimeoutError(f"Timed out after {step.timeout:g}s."), attempts - 1, "timeout")
+            try:
+                job = self.jobs.submit(step.command, args, confirm=False, timeout=timeout)
+            except KeyError:
+                raise StepFailed(ValueError(f"Unknown command '{step.command}'."), attempts)
+            except ArgumentError as e:
+                raise StepFailed(e, attempts)  # Retrying won't fix the arguments
+            job.wait()
+            if job.state == DONE:
+                return job.result, attempts
+            if job.state == TIMED_OUT:
+                raise StepFailed(TimeoutError(f"Timed out after {step.timeout:g}s."), attempts, "timeout")
+            if job.state == CANCELLED:
+                raise StepFailed(RuntimeError(job.result), attempts, "cancelled")
+
+            delay = step.backoff * (2 ** (attempts - 1))
+            out_of_time = deadline is not None and time.monotonic() + delay >= deadline
+            if attempts > step.retries or out_of_time:
+                raise StepFailed(RuntimeError(job.result), attempts)
+            time.sleep(delay)